@@ -6,29 +6,267 @@
 
 import numpy as np
 import os
+import sys
 from os import path
 
 import model_utils.load_surrogates as load
 import model_utils.eval_surrogates as eval_sur
-from common_utils import utils, fits
+from common_utils import utils, fits, node_tables, async_api, basis_compression
+from common_utils import array_backend, evaluation_plan, memory_usage, model_state
 import common_utils.nr_calibration as nrcalib
 import common_utils.doc_string as docs
 
-# h5 data directory
-h5_data_dir = os.path.dirname(os.path.abspath(__file__)) + '/../data'
+# h5 data directory; can be changed with the environment variable BHPTNRSUR_DATA_DIR (e.g. to
+# the synthetic files of common_utils.synthetic_data)
+h5_data_dir = os.environ.get('BHPTNRSUR_DATA_DIR',
+                             os.path.dirname(os.path.abspath(__file__)) + '/../data')
 
-# load all fits data
-time, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, \
+# names of the loaded data in a state (see get_state())
+_state_keys = ['time', 'fit_data_dict_1', 'fit_data_dict_2', 'B_dict_1', 'B_dict_2',
+               'alpha_coeffs', 'beta_coeffs']
+
+# load all fits data; the data of a state installed with common_utils.model_state is used
+# instead of the h5 file if there is one
+_state_data = model_state.installed('BHPTNRSur1dq1e4', load.zenodo_hashes['BHPTNRSur1dq1e4.h5'])
+if _state_data is None:
+    time, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, \
                             alpha_coeffs, beta_coeffs = load.load_BHPTNRSur1dq1e4_surrogate(h5_data_dir)
+else:
+    time, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, \
+                            alpha_coeffs, beta_coeffs = [_state_data[key] for key in _state_keys]
 
 print("**** Surrogate loaded: BHPTNRSur1dq1e4 ****")
 
+# tabulated EIM node values; only used after enable_node_table() is called
+node_table = None
+tab_fit_data_dict_1, tab_fit_data_dict_2 = None, None
+
+#----------------------------------------------------------------------------------------------------
+def enable_node_table(tol=1e-10, cache_file=None, rebuild=False):
+    """
+    Tabulates the spline fits of all EIM nodes on a fine log10(q) grid, refined until the 
+    interpolation error is below tol (see common_utils.node_tables). Afterwards,
+    generate_surrogate() obtains the node values by local interpolation of the table 
+    instead of evaluating the splines.
+
+    The table is cached in cache_file (default: BHPTNRSur1dq1e4_node_table.npz in the data 
+    directory) and re-used if it was built from the current h5 file with a tolerance at least
+    as strict as tol, unless rebuild=True.
+
+    Use common_utils.node_tables.node_table_accuracy_report(node_table, fit_data_dict_1, 
+    fit_data_dict_2) to check the accuracy of the table against the spline fits.
+    """
+    global node_table, tab_fit_data_dict_1, tab_fit_data_dict_2
+
+    if cache_file is None:
+        cache_file = h5_data_dir + '/BHPTNRSur1dq1e4_node_table.npz'
+    model_hash = load.zenodo_hashes['BHPTNRSur1dq1e4.h5']
+
+    table = None
+    if path.isfile(cache_file) and not rebuild:
+        table = node_tables.load_node_table(cache_file)
+        if table['model_hash'] != model_hash or table['tol'] > tol:
+            table = None
+    if table is None:
+        table = node_tables.build_node_table(fit_data_dict_1, fit_data_dict_2, list(fit_data_dict_1.keys()),
+                                             np.log10(2.5), np.log10(10000), tol=tol, model_hash=model_hash)
+        node_tables.save_node_table(cache_file, table)
+
+    tab_fit_data_dict_1, tab_fit_data_dict_2 = node_tables.tabulated_fit_data(table, fit_data_dict_1, 
+                                                                              fit_data_dict_2)
+    node_table = table
+
+#----------------------------------------------------------------------------------------------------
+def disable_node_table():
+    """ Goes back to evaluating the spline fits in generate_surrogate() """
+    global node_table, tab_fit_data_dict_1, tab_fit_data_dict_2
+    node_table = None
+    tab_fit_data_dict_1, tab_fit_data_dict_2 = None, None
+
+# compression of the basis matrices (see compress_basis()) : settings (tol, shared, keep_dense)
+# and dense basis matrices, kept aside while compressed ones are used
+basis_compression_settings = None
+dense_B_dicts = None
+
+#----------------------------------------------------------------------------------------------------
+def compress_basis(tol=1e-6, shared=False, keep_dense=True):
+    """
+    Replaces the basis matrices B_dict_1, B_dict_2 used by generate_surrogate() by truncated 
+    SVD factorizations (see common_utils.basis_compression), per mode or with a basis
+    shared by all modes (shared=True). tol is the targeted relative accuracy of the waveform
+    modes.
+    
+    The dense matrices are kept in dense_B_dicts for decompress_basis() and 
+    basis_accuracy_report() unless keep_dense=False, which frees their memory.
+
+    Returns the compression reports {1: report for B_dict_1, 2: report for B_dict_2}
+    """
+    global B_dict_1, B_dict_2, dense_B_dicts, basis_compression_settings
+
+    if dense_B_dicts is None:
+        if isinstance(next(iter(B_dict_1.values())), basis_compression.LowRankBasis):
+            raise ValueError("the dense basis matrices were not kept by the last compression")
+        dense_B_dicts = (B_dict_1, B_dict_2)
+    # the second datapiece of the 22 mode is its phase
+    X_samples = np.linspace(np.log10(2.5), np.log10(10000), 20)
+    weights_2 = {mode: 1.0 for mode in dense_B_dicts[1].keys()}
+    weights_2[(2,2)] = basis_compression.phase_weights({(2,2): fit_data_dict_2[(2,2)]}, 'spline_1d',
+                                                       X_samples)[(2,2)]
+    B_1 = basis_compression.compress_basis_dict(dense_B_dicts[0], tol, shared)
+    B_2 = basis_compression.compress_basis_dict(dense_B_dicts[1], tol, shared, weights_2)
+    reports = {1: basis_compression.compression_report(dense_B_dicts[0], B_1),
+               2: basis_compression.compression_report(dense_B_dicts[1], B_2)}
+
+    B_dict_1, B_dict_2 = B_1, B_2
+    basis_compression_settings = (tol, shared, keep_dense)
+    if not keep_dense:
+        dense_B_dicts = None
+    return reports
+
+#----------------------------------------------------------------------------------------------------
+def decompress_basis():
+    """ Goes back to the dense basis matrices in generate_surrogate() """
+    global B_dict_1, B_dict_2, dense_B_dicts, basis_compression_settings
+    if dense_B_dicts is not None:
+        B_dict_1, B_dict_2 = dense_B_dicts
+        dense_B_dicts = None
+        basis_compression_settings = None
+
+#----------------------------------------------------------------------------------------------------
+def basis_accuracy_report(n_test=100, seed=0):
+    """
+    Compares the datapieces computed with the compressed and the dense basis matrices at 
+    n_test random mass ratios. Returns {1: report for datapiece 1, 2: report for datapiece 2};
+    see basis_compression.datapiece_accuracy_report()
+    """
+    if dense_B_dicts is None:
+        raise ValueError("no compressed basis with the dense matrices kept : call "
+                         "compress_basis(keep_dense=True) first")
+    rng = np.random.default_rng(seed)
+    X_samples = rng.uniform(np.log10(2.5), np.log10(10000), n_test)
+    return {1: basis_compression.datapiece_accuracy_report(dense_B_dicts[0], B_dict_1, 
+                                                           fit_data_dict_1, 'spline_1d', X_samples),
+            2: basis_compression.datapiece_accuracy_report(dense_B_dicts[1], B_dict_2, 
+                                                           fit_data_dict_2, 'spline_1d', X_samples,
+                                                           phase_modes=[(2,2)])}
+
+#----------------------------------------------------------------------------------------------------
+def get_state():
+    """
+    Loaded data of the model as a common_utils.model_state.ModelState, to send the model to
+    worker processes without reading the h5 file again, e.g. 
+    ProcessPoolExecutor(initializer=model_state.install, initargs=(get_state(),)), or to save
+    it with its save() method for memory-mapped loading. The basis matrices are the dense ones
+    (kept by compress_basis() if it was called); the node table is not included.
+    """
+    B_1, B_2 = (B_dict_1, B_dict_2) if dense_B_dicts is None else dense_B_dicts
+    if isinstance(next(iter(B_1.values())), basis_compression.LowRankBasis):
+        raise ValueError("the dense basis matrices were not kept by the last compression")
+    data = dict(zip(_state_keys, [time, model_state.without_caches(fit_data_dict_1),
+                                  model_state.without_caches(fit_data_dict_2), B_1, B_2,
+                                  alpha_coeffs, beta_coeffs]))
+    return model_state.ModelState('BHPTNRSur1dq1e4', data, 
+                                  load.zenodo_hashes['BHPTNRSur1dq1e4.h5'])
+
+#----------------------------------------------------------------------------------------------------
+def _install_state(state):
+    """ replaces the loaded data by that of a state (see common_utils.model_state); the node 
+        table and the basis compression are dropped """
+    global time, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, alpha_coeffs, beta_coeffs
+    global dense_B_dicts, basis_compression_settings
+    disable_node_table()
+    dense_B_dicts = None
+    basis_compression_settings = None
+    time, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, \
+                            alpha_coeffs, beta_coeffs = [state.data[key] for key in _state_keys]
+
+#----------------------------------------------------------------------------------------------------
+def memory_inventory():
+    """
+    Arrays held by the model, per mode : see common_utils.memory_usage.inventory(). The dense
+    basis matrices kept by compress_basis() and the node table of enable_node_table() are
+    reported under 'dense_basis' and 'node_table' if present, and are included in 'bytes'.
+    """
+    seen = set()
+    report = memory_usage.inventory(time, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, seen)
+    if dense_B_dicts is not None:
+        report['dense_basis'] = memory_usage.array_report(dense_B_dicts, seen, 'B')
+        report['bytes'] += report['dense_basis']['bytes']
+    if node_table is not None:
+        report['node_table'] = memory_usage.array_report(node_table['values'], seen, 'values')
+        report['bytes'] += report['node_table']['bytes']
+    return report
+
+#----------------------------------------------------------------------------------------------------
+def working_set(modes=None, M_tot=None, dist_mpc=None, orb_phase=None, inclination=None, 
+                neg_modes=True, mode_sum=False, lmax=5, calibrated=True, q=10.0, **kwargs):
+    """
+    Memory allocated by one call of generate_surrogate() with these options (and any other
+    option of generate_surrogate() given in kwargs), in addition to memory_inventory(), 
+    measured on a probe evaluation at q : see common_utils.memory_usage.probe_working_set()
+    """
+    return memory_usage.probe_working_set(generate_surrogate, q=q, modes=modes, M_tot=M_tot,
+                                dist_mpc=dist_mpc, orb_phase=orb_phase, inclination=inclination,
+                                neg_modes=neg_modes, mode_sum=mode_sum, lmax=lmax,
+                                calibrated=calibrated, **kwargs)
+
+#----------------------------------------------------------------------------------------------------
+def _array_parameterization(xp, q):
+    """ X_sur, X_calib and norm of generate_surrogate() written with the array namespace xp """
+    return xp.log10(q), 1/q, 1/q
+
+#----------------------------------------------------------------------------------------------------
+def make_array_evaluator(modes=None, lmax=5, calibrated=True, backend='numpy'):
+    """
+    Builds an array_backend.ArrayEvaluator of the spline fits, whose evaluate(q) and 
+    waveform(q, inclination=..., orb_phase=..., M_tot=..., dist_mpc=...) methods can be 
+    jit-compiled, vmapped and differentiated with backend='jax'. modes, lmax and calibrated 
+    are as in generate_surrogate().
+    """
+    if modes is None:
+        modes = list(fit_data_dict_1.keys())
+    for mode in modes:
+        if mode not in fit_data_dict_1:
+            raise ValueError("mode %s is not available in BHPTNRSur1dq1e4"%(mode,))
+    modes = [mode for mode in modes if mode[0] <= lmax]
+    kinds = {mode: 'amp_phase' if mode==(2,2) else 'coorbital_re_im' for mode in modes}
+    return array_backend.ArrayEvaluator(time, modes, fit_data_dict_1, fit_data_dict_2, B_dict_1,
+                                        B_dict_2, 'spline_1d', kinds, _array_parameterization,
+                                        alpha_coeffs, beta_coeffs, 
+                                        nrcalib.alpha_beta_BHPTNRSur1dq1e4, calibrated, backend)
+
+#----------------------------------------------------------------------------------------------------
+def plan(modes=None, M_tot=None, dist_mpc=None, orb_phase=None, inclination=None, neg_modes=True,
+         mode_sum=False, lmax=5, calibrated=True):
+    """
+    Resolves the options of generate_surrogate() once and returns an 
+    evaluation_plan.EvaluationPlan : plan(q) then returns the same (t, h) as 
+    generate_surrogate(q, modes=modes, M_tot=M_tot, ...) with less overhead per call. The 
+    node table and basis matrices in use when the plan is built are bound to it.
+    """
+    # node table if enable_node_table() has been called
+    if node_table is None:
+        fit_func, fit_data_1, fit_data_2 = 'spline_1d', fit_data_dict_1, fit_data_dict_2
+    else:
+        fit_func, fit_data_1, fit_data_2 = 'tabulated_1d', tab_fit_data_dict_1, tab_fit_data_dict_2
+    B_1, B_2 = B_dict_1, B_dict_2
+    return evaluation_plan.EvaluationPlan(lambda key: (time, fit_data_1, fit_data_2, B_1, B_2), 
+                                          None, _array_parameterization,
+                                          [[np.log10(2.5)], [np.log10(10000)]], modes, 
+                                          list(fit_data_dict_1.keys()), lmax, fit_func,
+                                          [utils.amp_ph_to_comp, utils.re_im_to_comp], 
+                                          alpha_coeffs, beta_coeffs, 
+                                          nrcalib.alpha_beta_BHPTNRSur1dq1e4, calibrated, M_tot,
+                                          dist_mpc, orb_phase, inclination, neg_modes, mode_sum,
+                                          True)
+
 #----------------------------------------------------------------------------------------------------
 # add docstring from utility
 @docs.copy_doc(docs.generic_doc_for_models,docs.BHPTNRSur1dq1e4_doc)
 def generate_surrogate(q, spin1=None, spin2=None, ecc=None, ano=None, modes=None, M_tot=None, \
                        dist_mpc=None, orb_phase=None, inclination=None, neg_modes=True, \
-                       mode_sum=False, lmax=5, calibrated=True):
+                       mode_sum=False, lmax=5, calibrated=True, profiler=None, mode_tolerance=None,
+                       derivatives=False, sparse_step=None, f_low=None, n_threads=None):
     
     # modes modelled in the surrogate
     modes_available = [(2,2),(2,1),(3,1),(3,2),(3,3),(4,2),(4,3),(4,4),(5,3),(5,4),(5,5),
@@ -63,8 +301,13 @@ def generate_surrogate(q, spin1=None, spin2=None, ecc=None, ano=None, modes=None
     X_max = [np.log10(10000)]
     X_bounds = [X_min, X_max]
     
-    # fit type
-    fit_func = 'spline_1d'
+    # fit type; tabulated node values are used if enable_node_table() has been called
+    if node_table is None:
+        fit_func = 'spline_1d'
+        fit_data_1, fit_data_2 = fit_data_dict_1, fit_data_dict_2
+    else:
+        fit_func = 'tabulated_1d'
+        fit_data_1, fit_data_2 = tab_fit_data_dict_1, tab_fit_data_dict_2
     
     # data decomposition functions for 22 mode and HMs
     decomposition_funcs = [utils.amp_ph_to_comp, utils.re_im_to_comp]
@@ -76,11 +319,28 @@ def generate_surrogate(q, spin1=None, spin2=None, ecc=None, ano=None, modes=None
     # to inertial frame
     CoorbToInert = True
     
-    # generate surrogate waveform
-    t_surrogate, h_surrogate = eval_sur.evaluate_surrogate(X_sur, X_calib, X_bounds, time, modes, 
+    # derivatives of the parameterizations with respect to the waveform parameters
+    param_derivatives = None
+    if derivatives:
+        param_derivatives = {'q': {'X_sur': 1/(q*np.log(10)), 'X_calib': -1/q**2, 'norm': -1/q**2}}
+    
+    # generate surrogate waveform (t, h) or (t, h, dh) if the derivatives are requested
+    surrogate_output = eval_sur.evaluate_surrogate(X_sur, X_calib, X_bounds, time, modes, 
                                         modes_available, alpha_coeffs,  beta_coeffs, alpha_beta_functional_form,\
-                                        calibrated, M_tot, dist_mpc, orb_phase, inclination, fit_data_dict_1, \
-                                        fit_data_dict_2, B_dict_1, B_dict_2, fit_func, decomposition_funcs,\
-                                        norm, mode_sum, neg_modes, lmax, CoorbToInert)
+                                        calibrated, M_tot, dist_mpc, orb_phase, inclination, fit_data_1, \
+                                        fit_data_2, B_dict_1, B_dict_2, fit_func, decomposition_funcs,\
+                                        norm, mode_sum, neg_modes, lmax, CoorbToInert, profiler,\
+                                        mode_tolerance, param_derivatives, sparse_step, f_low, n_threads)
     
-    return t_surrogate, h_surrogate
+    return surrogate_output
+
+#---------------------------------------------------------------------------------------------------- 
+async def generate_surrogate_async(*args, **kwargs):
+    """
+    asyncio counterpart of generate_surrogate(), with the same arguments and outputs.
+    The evaluation runs in the default executor of the event loop; identical concurrent
+    calls are evaluated only once (see common_utils.async_api). Use
+    async_api.AsyncSurrogate directly to control the executor and the concurrency
+    or to import the model without blocking the event loop.
+    """
+    return await async_api.get_async_surrogate(sys.modules[__name__]).generate(*args, **kwargs)
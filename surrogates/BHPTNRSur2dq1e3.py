@@ -10,30 +10,367 @@ import matplotlib.pyplot as plt
 import h5py
 from gwtools import gwtools as _gwtools
 import os
+import sys
 from os import path
 import subprocess
+import threading
 
 import model_utils.load_surrogates as load
 import model_utils.eval_surrogates as eval_sur
-from common_utils import utils, fits
+from common_utils import utils, fits, async_api, basis_compression, array_backend
+from common_utils import evaluation_plan, memory_usage, gpr_uncertainty, local_emulator
+from common_utils import model_state
 import common_utils.nr_calibration as nrcalib
 import common_utils.doc_string as docs
 
-# h5 data directory
-h5_data_dir = os.path.dirname(os.path.abspath(__file__)) + '/../data'
+# h5 data directory; can be changed with the environment variable BHPTNRSUR_DATA_DIR (e.g. to
+# the synthetic files of common_utils.synthetic_data)
+h5_data_dir = os.environ.get('BHPTNRSUR_DATA_DIR',
+                             os.path.dirname(os.path.abspath(__file__)) + '/../data')
 
-# load all fits data
-# Here each of the data file are contains two separate spins
-times_dict, fit_data_dict_1_sign, fit_data_dict_2_sign, B_dict_1_sign, B_dict_2_sign, \
-    alpha_coeffs, beta_coeffs = load.load_BHPTNRSur2dq1e3_surrogate(h5_data_dir)
+# names of the loaded data in a state (see get_state())
+_state_keys = ['times_dict', 'fit_data_dict_1_sign', 'fit_data_dict_2_sign', 'B_dict_1_sign',
+               'B_dict_2_sign', 'alpha_coeffs', 'beta_coeffs']
+
+# the data of a state installed with common_utils.model_state is used instead of the h5 file if
+# there is one (sub-surrogates that are not in the state are loaded from the h5 file)
+_state_data = model_state.installed('BHPTNRSur2dq1e3', load.zenodo_hashes['BHPTNRSur2dq1e3.h5'])
+if _state_data is None:
+    # check the data file and load the nr calibration info
+    # Here each of the data file are contains two separate spins; the fits for each of them
+    # are only loaded the first time a waveform with that spin sign is requested
+    times_dict, fit_data_dict_1_sign, fit_data_dict_2_sign, B_dict_1_sign, B_dict_2_sign, \
+        alpha_coeffs, beta_coeffs = load.load_BHPTNRSur2dq1e3_surrogate(h5_data_dir, spin_signs=[])
+else:
+    times_dict, fit_data_dict_1_sign, fit_data_dict_2_sign, B_dict_1_sign, B_dict_2_sign, \
+        alpha_coeffs, beta_coeffs = [dict(_state_data[key]) if isinstance(_state_data[key], dict)
+                                     else _state_data[key] for key in _state_keys]
 
 print("**** Surrogate loaded: BHPTNRSur2dq1e3 ****")
 
+# serializes the loading of the sub-surrogates when called from several threads
+_spin_branch_lock = threading.Lock()
+
+#---------------------------------------------------------------------------------------------------- 
+def load_spin_branch(spin_sign):
+    """
+    Loads the fits of one sub-surrogate ('negative_spin' or 'positive_spin') if they are not
+    loaded yet. This is done automatically by generate_surrogate(); call it directly to
+    pay the loading cost upfront, e.g. when starting a worker that only samples one spin sign.
+    """
+    if spin_sign in times_dict:
+        return
+    with _spin_branch_lock:
+        if spin_sign in times_dict:
+            return
+        times, fit_data_1, fit_data_2, B_1, B_2, _, _ = load.load_BHPTNRSur2dq1e3_surrogate(
+                                                h5_data_dir, spin_signs=[spin_sign], check_hash=False)
+        fit_data_dict_1_sign.update(fit_data_1)
+        fit_data_dict_2_sign.update(fit_data_2)
+        if basis_compression_settings is not None:
+            _compress_spin_branch(spin_sign, B_1[spin_sign], B_2[spin_sign])
+        else:
+            B_dict_1_sign.update(B_1)
+            B_dict_2_sign.update(B_2)
+        # times is updated last as it flags the sub-surrogate as loaded
+        times_dict.update(times)
+        print("**** Sub-surrogate loaded: BHPTNRSur2dq1e3 (%s) ****"%spin_sign)
+
+# compression of the basis matrices (see compress_basis()); the dense matrices are kept aside
+# in dense_B_dicts_sign
+basis_compression_settings = None
+dense_B_dicts_sign = {}
+
+#---------------------------------------------------------------------------------------------------- 
+def _compress_spin_branch(spin_sign, B_1, B_2):
+    """ compresses the basis matrices of a sub-surrogate with basis_compression_settings """
+    tol, shared, keep_dense = basis_compression_settings
+    # the second datapiece is the phase
+    chi_range = (-0.8, 0.0) if spin_sign == 'negative_spin' else (0.0, 0.8)
+    X_samples = [[log10_q, chi] for log10_q in np.linspace(np.log10(3), np.log10(1000), 5)
+                 for chi in np.linspace(*chi_range, 3)]
+    weights_2 = basis_compression.phase_weights(fit_data_dict_2_sign[spin_sign], 'GPR_fits', 
+                                                X_samples)
+    B_dict_1_sign[spin_sign] = basis_compression.compress_basis_dict(B_1, tol, shared)
+    B_dict_2_sign[spin_sign] = basis_compression.compress_basis_dict(B_2, tol, shared, weights_2)
+    if keep_dense:
+        dense_B_dicts_sign[spin_sign] = (B_1, B_2)
+    return {1: basis_compression.compression_report(B_1, B_dict_1_sign[spin_sign]),
+            2: basis_compression.compression_report(B_2, B_dict_2_sign[spin_sign])}
+
+#---------------------------------------------------------------------------------------------------- 
+def compress_basis(tol=1e-6, shared=False, keep_dense=True):
+    """
+    Replaces the basis matrices used by generate_surrogate() by truncated SVD factorizations
+    (see common_utils.basis_compression), per mode or with a basis shared by all the modes of
+    a sub-surrogate (shared=True). tol is the targeted relative accuracy of the waveform modes.
+    Sub-surrogates loaded later are compressed as they are loaded.
+
+    The dense matrices are kept in dense_B_dicts_sign for decompress_basis() and 
+    basis_accuracy_report() unless keep_dense=False, which frees their memory.
+
+    Returns the compression reports {spin_sign: {1: report, 2: report}} of the loaded 
+    sub-surrogates
+    """
+    global basis_compression_settings
+
+    with _spin_branch_lock:
+        dense = {}
+        for spin_sign in times_dict.keys():
+            if spin_sign in dense_B_dicts_sign:
+                dense[spin_sign] = dense_B_dicts_sign[spin_sign]
+            elif basis_compression_settings is not None:
+                raise ValueError("the dense basis matrices were not kept by the last compression")
+            else:
+                dense[spin_sign] = (B_dict_1_sign[spin_sign], B_dict_2_sign[spin_sign])
+
+        basis_compression_settings = (tol, shared, keep_dense)
+        dense_B_dicts_sign.clear()
+        return {spin_sign: _compress_spin_branch(spin_sign, *dense[spin_sign]) for spin_sign in dense}
+
+#---------------------------------------------------------------------------------------------------- 
+def decompress_basis():
+    """ Goes back to the dense basis matrices in generate_surrogate() """
+    global basis_compression_settings
+
+    with _spin_branch_lock:
+        for spin_sign, (B_1, B_2) in dense_B_dicts_sign.items():
+            B_dict_1_sign[spin_sign] = B_1
+            B_dict_2_sign[spin_sign] = B_2
+        dense_B_dicts_sign.clear()
+        basis_compression_settings = None
+
+#---------------------------------------------------------------------------------------------------- 
+def basis_accuracy_report(n_test=100, seed=0):
+    """
+    Compares the datapieces computed with the compressed and the dense basis matrices at 
+    n_test random (q, spin1) points of each loaded sub-surrogate. 
+    Returns {spin_sign: {1: report for the amplitude, 2: report for the phase}}; see 
+    basis_compression.datapiece_accuracy_report()
+    """
+    if not dense_B_dicts_sign:
+        raise ValueError("no compressed basis with the dense matrices kept : call "
+                         "compress_basis(keep_dense=True) first")
+    rng = np.random.default_rng(seed)
+    reports = {}
+    for spin_sign, (B_1, B_2) in dense_B_dicts_sign.items():
+        chi_range = (-0.8, 0.0) if spin_sign == 'negative_spin' else (0.0, 0.8)
+        X_samples = [[rng.uniform(np.log10(3), np.log10(1000)), rng.uniform(*chi_range)] 
+                     for i in range(n_test)]
+        reports[spin_sign] = {
+            1: basis_compression.datapiece_accuracy_report(B_1, B_dict_1_sign[spin_sign], 
+                                        fit_data_dict_1_sign[spin_sign], 'GPR_fits', X_samples),
+            2: basis_compression.datapiece_accuracy_report(B_2, B_dict_2_sign[spin_sign], 
+                                        fit_data_dict_2_sign[spin_sign], 'GPR_fits', X_samples,
+                                        phase_modes=list(B_2.keys()))}
+    return reports
+
+# local emulation of the GPR node fits (see enable_local_emulator()) : settings and emulated
+# fit data {spin_sign: (fit_data_dict_1, fit_data_dict_2)}, built for each sub-surrogate on
+# first use
+local_emulator_settings = None
+emulated_fit_data_sign = {}
+
+#----------------------------------------------------------------------------------------------------
+def enable_local_emulator(trust_radius=0.01, max_anchors=32, check_every=100, tol=1e-4):
+    """
+    Afterwards, generate_surrogate() obtains the node values of the GPR fits by a Taylor step 
+    from a recent evaluation within trust_radius (measured in units of the widths of the domain
+    in log10(q) and spin1), and only computes the basis products; see 
+    common_utils.local_emulator. Every check_every-th Taylor step is checked against the GPR
+    fits, halving the trust radius of the datapiece if the absolute error of the node values 
+    (amplitude or phase in radians) exceeds tol; it grows back after a run of passed checks. Meant for MCMC chains, whose proposals are mostly close to previous points. 
+    local_emulator_stats() reports how many evaluations were emulated.
+    """
+    global local_emulator_settings
+    with _spin_branch_lock:
+        local_emulator_settings = (trust_radius, max_anchors, check_every, tol)
+        emulated_fit_data_sign.clear()
+
+#----------------------------------------------------------------------------------------------------
+def disable_local_emulator():
+    """ Goes back to evaluating the GPR fits for every waveform in generate_surrogate() """
+    global local_emulator_settings
+    with _spin_branch_lock:
+        local_emulator_settings = None
+        emulated_fit_data_sign.clear()
+
+#----------------------------------------------------------------------------------------------------
+def _emulated_branch(spin_sign):
+    """ emulated fit data of a sub-surrogate, built on first use """
+    if spin_sign not in emulated_fit_data_sign:
+        with _spin_branch_lock:
+            if spin_sign not in emulated_fit_data_sign:
+                trust_radius, max_anchors, check_every, tol = local_emulator_settings
+                scales = [np.log10(1000) - np.log10(3), 1.6]
+                emulated_fit_data_sign[spin_sign] = tuple(
+                    local_emulator.emulated_fit_data(fit_data_sign[spin_sign], 'GPR_fits',
+                                                     trust_radius, scales, max_anchors,
+                                                     check_every, tol)
+                    for fit_data_sign in (fit_data_dict_1_sign, fit_data_dict_2_sign))
+    return emulated_fit_data_sign[spin_sign]
+
+#----------------------------------------------------------------------------------------------------
+def local_emulator_stats():
+    """ numbers of Taylor steps, full evaluations and checks of the local emulation of the node
+        fits since enable_local_emulator(), per sub-surrogate; see local_emulator.emulator_stats() """
+    return {spin_sign: local_emulator.emulator_stats(*fit_data_dicts)
+            for spin_sign, fit_data_dicts in emulated_fit_data_sign.items()}
+
+#----------------------------------------------------------------------------------------------------
+def get_state():
+    """
+    Loaded data of the model (the sub-surrogates loaded so far) as a 
+    common_utils.model_state.ModelState, to send the model to worker processes without reading
+    the h5 file again, e.g. ProcessPoolExecutor(initializer=model_state.install, 
+    initargs=(get_state(),)), or to save it with its save() method for memory-mapped loading.
+    Call load_spin_branch() first to include both sub-surrogates. The basis matrices are the 
+    dense ones (kept by compress_basis() if it was called).
+    """
+    with _spin_branch_lock:
+        spin_signs = list(times_dict.keys())
+        B_1, B_2 = {}, {}
+        for spin_sign in spin_signs:
+            if spin_sign in dense_B_dicts_sign:
+                B_1[spin_sign], B_2[spin_sign] = dense_B_dicts_sign[spin_sign]
+            elif basis_compression_settings is not None:
+                raise ValueError("the dense basis matrices were not kept by the last compression")
+            else:
+                B_1[spin_sign], B_2[spin_sign] = B_dict_1_sign[spin_sign], B_dict_2_sign[spin_sign]
+        data = dict(zip(_state_keys, [{s: times_dict[s] for s in spin_signs},
+                                      {s: model_state.without_caches(fit_data_dict_1_sign[s])
+                                       for s in spin_signs},
+                                      {s: model_state.without_caches(fit_data_dict_2_sign[s])
+                                       for s in spin_signs},
+                                      B_1, B_2, alpha_coeffs, beta_coeffs]))
+    return model_state.ModelState('BHPTNRSur2dq1e3', data, 
+                                  load.zenodo_hashes['BHPTNRSur2dq1e3.h5'])
+
+#----------------------------------------------------------------------------------------------------
+def _install_state(state):
+    """ replaces the loaded data by that of a state (see common_utils.model_state); the basis 
+        compression and the local emulation are dropped """
+    global alpha_coeffs, beta_coeffs, basis_compression_settings, local_emulator_settings
+    with _spin_branch_lock:
+        basis_compression_settings = None
+        local_emulator_settings = None
+        dense_B_dicts_sign.clear()
+        emulated_fit_data_sign.clear()
+        # times_dict is updated last as it flags the sub-surrogates as loaded
+        times_dict.clear()
+        for name in _state_keys[1:5]:
+            globals()[name].clear()
+            globals()[name].update(state.data[name])
+        alpha_coeffs, beta_coeffs = state.data['alpha_coeffs'], state.data['beta_coeffs']
+        times_dict.update(state.data['times_dict'])
+
+#----------------------------------------------------------------------------------------------------
+def memory_inventory():
+    """
+    Arrays held by the model, per loaded sub-surrogate and mode : returns {'branches': 
+    {spin_sign: report of common_utils.memory_usage.inventory()}, 'count', 'bytes'}. The
+    sub-surrogates that are not loaded yet are not listed. The dense basis matrices kept by 
+    compress_basis() are reported under 'dense_basis' if present, and are included in 'bytes'.
+    """
+    seen = set()
+    report = {'branches': {}}
+    for spin_sign in list(times_dict.keys()):
+        report['branches'][spin_sign] = memory_usage.inventory(times_dict[spin_sign],
+                                                fit_data_dict_1_sign[spin_sign], 
+                                                fit_data_dict_2_sign[spin_sign],
+                                                B_dict_1_sign[spin_sign], B_dict_2_sign[spin_sign],
+                                                seen)
+    report['count'] = sum(r['count'] for r in report['branches'].values())
+    report['bytes'] = sum(r['bytes'] for r in report['branches'].values())
+    if dense_B_dicts_sign:
+        report['dense_basis'] = memory_usage.array_report(dense_B_dicts_sign, seen, 'B')
+        report['bytes'] += report['dense_basis']['bytes']
+    return report
+
+#----------------------------------------------------------------------------------------------------
+def working_set(spin_sign='positive_spin', modes=None, M_tot=None, dist_mpc=None, orb_phase=None,
+                inclination=None, neg_modes=True, mode_sum=False, lmax=4, calibrated=True, q=10.0,
+                **kwargs):
+    """
+    Memory allocated by one call of generate_surrogate() with these options (and any other
+    option of generate_surrogate() given in kwargs) and a spin of sign spin_sign, in addition
+    to memory_inventory(), measured on a probe evaluation at q and spin1=+-0.4 : see 
+    common_utils.memory_usage.probe_working_set()
+    """
+    spin1 = -0.4 if spin_sign == 'negative_spin' else 0.4
+    return memory_usage.probe_working_set(generate_surrogate, q=q, spin1=spin1, modes=modes,
+                                M_tot=M_tot, dist_mpc=dist_mpc, orb_phase=orb_phase,
+                                inclination=inclination, neg_modes=neg_modes, mode_sum=mode_sum,
+                                lmax=lmax, calibrated=calibrated, **kwargs)
+
+#----------------------------------------------------------------------------------------------------
+def _array_parameterization(xp, q, spin1):
+    """ X_sur, X_calib and norm of generate_surrogate() written with the array namespace xp """
+    return xp.stack([xp.log10(q), xp.asarray(spin1, dtype=float)]), [q, spin1], 1/q
+
+#----------------------------------------------------------------------------------------------------
+def make_array_evaluator(spin_sign='positive_spin', modes=None, lmax=4, calibrated=True, 
+                         backend='numpy'):
+    """
+    Builds an array_backend.ArrayEvaluator of the GPR fits of one sub-surrogate 
+    ('positive_spin' or 'negative_spin'), whose evaluate(q, spin1) and waveform(q, spin1, 
+    inclination=..., orb_phase=..., M_tot=..., dist_mpc=...) methods can be jit-compiled, 
+    vmapped and differentiated with backend='jax'. The sub-surrogate is fixed when the 
+    evaluator is built : generate_surrogate() uses 'negative_spin' for spin1 < 0. modes, lmax
+    and calibrated are as in generate_surrogate().
+    """
+    load_spin_branch(spin_sign)
+    fit_data_dict_1 = fit_data_dict_1_sign[spin_sign]
+    if modes is None:
+        modes = list(fit_data_dict_1.keys())
+    for mode in modes:
+        if mode not in fit_data_dict_1:
+            raise ValueError("mode %s is not available in BHPTNRSur2dq1e3"%(mode,))
+    modes = [mode for mode in modes if mode[0] <= lmax]
+    kinds = {mode: 'amp_phase' for mode in modes}
+    return array_backend.ArrayEvaluator(times_dict[spin_sign], modes, fit_data_dict_1, 
+                                        fit_data_dict_2_sign[spin_sign], B_dict_1_sign[spin_sign],
+                                        B_dict_2_sign[spin_sign], 'GPR_fits', kinds, 
+                                        _array_parameterization, alpha_coeffs, beta_coeffs,
+                                        nrcalib.alpha_beta_BHPTNRSur2dq1e3, calibrated, backend)
+
+#----------------------------------------------------------------------------------------------------
+def _plan_branch(spin_sign):
+    """ time, fit data and basis matrices of a sub-surrogate, for plan() """
+    load_spin_branch(spin_sign)
+    return times_dict[spin_sign], fit_data_dict_1_sign[spin_sign], \
+           fit_data_dict_2_sign[spin_sign], B_dict_1_sign[spin_sign], B_dict_2_sign[spin_sign]
+
+#----------------------------------------------------------------------------------------------------
+def plan(modes=None, M_tot=None, dist_mpc=None, orb_phase=None, inclination=None, neg_modes=True,
+         mode_sum=False, lmax=4, calibrated=True):
+    """
+    Resolves the options of generate_surrogate() once and returns an 
+    evaluation_plan.EvaluationPlan : plan(q, spin1) then returns the same (t, h) as 
+    generate_surrogate(q, spin1, modes=modes, M_tot=M_tot, ...) with less overhead per call. 
+    Each sub-surrogate ('positive_spin', 'negative_spin') is bound the first time a spin of its
+    sign is evaluated.
+    """
+    return evaluation_plan.EvaluationPlan(_plan_branch, 
+                                          lambda q, spin1: 'negative_spin' if spin1 < 0.0
+                                                           else 'positive_spin',
+                                          _array_parameterization, 
+                                          [[np.log10(3), -0.8], [np.log10(1000), 0.8]], modes,
+                                          [(2,2),(2,1),(3,1),(3,2),(3,3),(4,2),(4,3),(4,4)], lmax,
+                                          'GPR_fits', [utils.amp_ph_to_comp, utils.amp_ph_to_comp],
+                                          alpha_coeffs, beta_coeffs, 
+                                          nrcalib.alpha_beta_BHPTNRSur2dq1e3, calibrated, M_tot, 
+                                          dist_mpc, orb_phase, inclination, neg_modes, mode_sum,
+                                          False)
+
 #---------------------------------------------------------------------------------------------------- 
 # add docstring from utility
 @docs.copy_doc(docs.generic_doc_for_models,docs.BHPTNRSur2dq1e3_doc)
 def generate_surrogate(q, spin1=0.0, spin2=None, ecc=None, ano=None, modes=None, M_tot=None, dist_mpc=None, 
-                       orb_phase=None, inclination=None, neg_modes=True, mode_sum=False, lmax=4, calibrated=True):
+                       orb_phase=None, inclination=None, neg_modes=True, mode_sum=False, lmax=4, calibrated=True,
+                       profiler=None, mode_tolerance=None,
+                       derivatives=False, sparse_step=None, f_low=None, n_threads=None,
+                       uncertainty=False):
 
     # list the modes modelled in BHPTNRSur2dq1e3
     modes_available = [(2,2),(2,1),(3,1),(3,2),(3,3),(4,2),(4,3),(4,4)]
@@ -51,17 +388,15 @@ def generate_surrogate(q, spin1=0.0, spin2=None, ecc=None, ano=None, modes=None,
     # this model provide fits for the positive spin and negative spin cases differently
     # choose appropriate fit params here depending on the input spin value
     if spin1 < 0.0:
-        times = times_dict['negative_spin']
-        fit_data_dict_1 = fit_data_dict_1_sign['negative_spin']
-        fit_data_dict_2 = fit_data_dict_2_sign['negative_spin']
-        B_dict_1 = B_dict_1_sign['negative_spin']
-        B_dict_2 = B_dict_2_sign['negative_spin']
+        spin_sign = 'negative_spin'
     else:
-        times = times_dict['positive_spin']
-        fit_data_dict_1 = fit_data_dict_1_sign['positive_spin']
-        fit_data_dict_2 = fit_data_dict_2_sign['positive_spin']
-        B_dict_1 = B_dict_1_sign['positive_spin']
-        B_dict_2 = B_dict_2_sign['positive_spin']
+        spin_sign = 'positive_spin'
+    load_spin_branch(spin_sign)
+    times = times_dict[spin_sign]
+    fit_data_dict_1 = fit_data_dict_1_sign[spin_sign]
+    fit_data_dict_2 = fit_data_dict_2_sign[spin_sign]
+    B_dict_1 = B_dict_1_sign[spin_sign]
+    B_dict_2 = B_dict_2_sign[spin_sign]
 
     # define the parameterization for surrogate
     X_sur = [np.log10(q), spin1]
@@ -79,8 +414,11 @@ def generate_surrogate(q, spin1=0.0, spin2=None, ecc=None, ano=None, modes=None,
     X_max_chi = 0.8
     X_bounds = [[X_min_q, X_min_chi],[X_max_q, X_max_chi]]
     
-    # fit type
-    fit_func = 'GPR_fits'
+    # fit type; the node values are emulated if enable_local_emulator() has been called
+    fit_func, fit_data_1, fit_data_2 = 'GPR_fits', fit_data_dict_1, fit_data_dict_2
+    if local_emulator_settings is not None:
+        fit_func = 'local_linear'
+        fit_data_1, fit_data_2 = _emulated_branch(spin_sign)
     
     # data decomposition functions for each mode
     decomposition_funcs = [utils.amp_ph_to_comp, utils.amp_ph_to_comp]
@@ -92,11 +430,49 @@ def generate_surrogate(q, spin1=0.0, spin2=None, ecc=None, ano=None, modes=None,
     # to inertial frame
     CoorbToInert = False
     
-    # generate surrogate waveform
-    t_surrogate, h_surrogate = eval_sur.evaluate_surrogate(X_sur, X_calib, X_bounds, times, modes,\
+    # derivatives of the parameterizations with respect to the waveform parameters
+    param_derivatives = None
+    if derivatives:
+        param_derivatives = {'q': {'X_sur': [1/(q*np.log(10)), 0.0], 'X_calib': [1.0, 0.0], 
+                                   'norm': -1/q**2},
+                             'spin1': {'X_sur': [0.0, 1.0], 'X_calib': [0.0, 1.0], 'norm': 0.0}}
+    
+    # the error envelopes reuse the node values of the waveform
+    eim_values = None
+    if uncertainty:
+        if derivatives or sparse_step is not None:
+            raise ValueError("uncertainty cannot be combined with derivatives or sparse_step")
+        eim_values = {}
+
+    # generate surrogate waveform (t, h) or (t, h, dh) if the derivatives are requested
+    surrogate_output = eval_sur.evaluate_surrogate(X_sur, X_calib, X_bounds, times, modes,\
             modes_available, alpha_coeffs,  beta_coeffs, alpha_beta_functional_form,\
-            calibrated, M_tot, dist_mpc, orb_phase, inclination, fit_data_dict_1,\
-            fit_data_dict_2, B_dict_1, B_dict_2, fit_func, decomposition_funcs,\
-            norm, mode_sum, neg_modes, lmax, CoorbToInert)
+            calibrated, M_tot, dist_mpc, orb_phase, inclination, fit_data_1,\
+            fit_data_2, B_dict_1, B_dict_2, fit_func, decomposition_funcs,\
+            norm, mode_sum, neg_modes, lmax, CoorbToInert, profiler,\
+            mode_tolerance, param_derivatives, sparse_step, f_low, n_threads, eim_values)
+
+    # error envelopes from the GPR predictive uncertainty
+    if uncertainty:
+        t_surrogate, h_surrogate = surrogate_output
+        # f_low drops the first time samples
+        start = len(times) - len(t_surrogate)
+        h_err = gpr_uncertainty.error_envelopes(X_sur, X_calib, modes, fit_data_dict_1, 
+                        fit_data_dict_2, B_dict_1, B_dict_2, {mode: 'amp_phase' for mode in modes},
+                        norm, alpha_coeffs, alpha_beta_functional_form, calibrated, M_tot, 
+                        dist_mpc, orb_phase, inclination, neg_modes, mode_sum, lmax, eim_values,
+                        start)
+        return t_surrogate, h_surrogate, h_err
 
-    return t_surrogate, h_surrogate
+    return surrogate_output
+
+#---------------------------------------------------------------------------------------------------- 
+async def generate_surrogate_async(*args, **kwargs):
+    """
+    asyncio counterpart of generate_surrogate(), with the same arguments and outputs.
+    The evaluation runs in the default executor of the event loop; identical concurrent
+    calls are evaluated only once (see common_utils.async_api). Use
+    async_api.AsyncSurrogate directly to control the executor and the concurrency
+    or to import the model without blocking the event loop.
+    """
+    return await async_api.get_async_surrogate(sys.modules[__name__]).generate(*args, **kwargs)
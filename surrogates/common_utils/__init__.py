@@ -5,4 +5,11 @@ from . import check_inputs
 from . import doc_string
 from . import load_splines
 from . import filehash
+from . import download
+from . import locking
+from . import profiling
+from . import node_tables
+from . import async_api
+from . import detectors
+from . import overlaps
 from .eval_pysur import evaluate_fit
\ No newline at end of file
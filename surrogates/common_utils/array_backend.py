@@ -0,0 +1,263 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : array backend (NumPy or JAX) evaluation of the surrogate models
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+The evaluation chain of fits.all_modes_surrogate() and utils.obtain_processed_output() written
+with array operations only, on a numpy or jax.numpy namespace, so that it can be jit-compiled,
+vmapped and differentiated with jax:
+
+    evaluator = BHPTNRSur1dq1e4.make_array_evaluator(backend='jax')
+    t_batch, h_batch = jax.jit(jax.vmap(evaluator.evaluate))(q_array)
+"""
+
+import numpy as np
+from math import factorial, comb, pi
+from . import utils
+from . import gpr_fits
+from . import nr_calibration as nrcalib
+from . import basis_compression
+
+#----------------------------------------------------------------------------------------------------
+def get_backend(name='numpy'):
+    """ array namespace of a backend : 'numpy' or 'jax' (jax.numpy) """
+    if name == 'numpy':
+        return np
+    elif name == 'jax':
+        try:
+            import jax
+            import jax.numpy as jnp
+        except ImportError:
+            raise ImportError("the 'jax' backend needs jax : pip install jax")
+        jax.config.update('jax_enable_x64', True)
+        return jnp
+    raise ValueError("unknown backend %s; options : 'numpy' or 'jax'"%name)
+
+#----------------------------------------------------------------------------------------------------
+def pack_splines(fit_data_list):
+    """
+    Stacks the spline fits of the EIM nodes of several modes (a list of fit data [h_eim_spline,
+    eim_indicies]) into padded arrays of knots (n_nodes, n_knots_max) and coefficients, the
+    number of coefficients of each spline and the common degree
+    """
+    tcks = [tck for fit_data in fit_data_list for tck in fit_data[0][:len(fit_data[1])]]
+    degrees = set(int(tck[2]) for tck in tcks)
+    if len(degrees) != 1:
+        raise ValueError("all the splines of a datapiece must have the same degree")
+    n_knots = max(len(tck[0]) for tck in tcks)
+    knots = np.empty((len(tcks), n_knots))
+    coefs = np.zeros((len(tcks), n_knots))
+    for i, (t, c, k) in enumerate(tcks):
+        # padded knots repeat the last knot; the interval search is clipped before them
+        knots[i,:len(t)] = t
+        knots[i,len(t):] = t[-1]
+        coefs[i,:len(t)] = np.ravel(c)[:len(t)]
+    n_coefs = np.array([len(tck[0]) - int(tck[2]) - 1 for tck in tcks])
+    return knots, coefs, n_coefs, degrees.pop()
+
+#----------------------------------------------------------------------------------------------------
+def spline_values(xp, x, knots, coefs, n_coefs, k):
+    """ de Boor evaluation of all splines at x, extrapolating as scipy.interpolate.splev """
+    rows = np.arange(knots.shape[0])
+    # knot interval t[l] <= x < t[l+1] of each spline, with k <= l <= n_coefs - 1
+    l = xp.sum(knots <= x, axis=1) - 1
+    l = xp.minimum(xp.maximum(l, k), n_coefs - 1)
+    d = [coefs[rows, l - k + j] for j in range(k + 1)]
+    for r in range(1, k + 1):
+        for j in range(k, r - 1, -1):
+            left = knots[rows, l - k + j]
+            right = knots[rows, l + 1 + j - r]
+            alpha = (x - left)/(right - left)
+            d[j] = (1.0 - alpha)*d[j - 1] + alpha*d[j]
+    return d[k]
+
+#----------------------------------------------------------------------------------------------------
+def pack_gprs(fit_data_list):
+    """
+    Stacks the GPR fits of the EIM nodes of several modes (a list of fit data [h_eim_gpr_mode,
+    eim_indicies]) into arrays; the training points are zero padded (with alpha = 0)
+    """
+    nodes = [gpr_fits.node_arrays(fit_data[0]['node%s'%i])
+             for fit_data in fit_data_list for i in range(len(fit_data[1]))]
+    n_train = max(len(node['alpha']) for node in nodes)
+    n_dim = nodes[0]['X_train'].shape[1]
+    packed = {'X_train': np.zeros((len(nodes), n_train, n_dim)),
+              'alpha': np.zeros((len(nodes), n_train))}
+    for i, node in enumerate(nodes):
+        packed['X_train'][i,:len(node['alpha'])] = node['X_train']
+        packed['alpha'][i,:len(node['alpha'])] = node['alpha']
+    for key in ['inv_length_scale', 'coef']:
+        packed[key] = np.array([node[key] for node in nodes])
+    for key in ['constant', 'y_mean', 'y_std', 'data_mean', 'data_std', 'intercept']:
+        packed[key] = np.array([node[key] for node in nodes])
+    return packed
+
+#----------------------------------------------------------------------------------------------------
+def gpr_values(xp, x, packed):
+    """ all GPR fits at x (same expression as gpr_fits.evaluate_node()) """
+    x = xp.asarray(x)
+    diff = (x - packed['X_train'])*packed['inv_length_scale'][:,None,:]
+    k = xp.exp(-0.5*xp.sum(diff*diff, axis=-1))
+    y_norm = packed['constant']*xp.sum(k*packed['alpha'], axis=1)*packed['y_std'] + packed['y_mean']
+    return y_norm*packed['data_std'] + packed['data_mean'] + packed['coef'] @ x + packed['intercept']
+
+#----------------------------------------------------------------------------------------------------
+def pack_bases(B_list):
+    """ stacks basis matrices (n_nodes, n_times) of several modes into an array (n_modes,
+        n_nodes_max, n_times) zero padded along the nodes, and the gather indices (n_modes,
+        n_nodes_max) placing the flat node values of all modes (plus a trailing 0) in it """
+    B_list = [B.to_dense() if isinstance(B, basis_compression.LowRankBasis) else np.asarray(B)
+              for B in B_list]
+    n_nodes = [B.shape[0] for B in B_list]
+    stacked = np.zeros((len(B_list), max(n_nodes), B_list[0].shape[1]))
+    gather = np.full((len(B_list), max(n_nodes)), sum(n_nodes))
+    start = 0
+    for i, B in enumerate(B_list):
+        stacked[i,:n_nodes[i]] = B
+        gather[i,:n_nodes[i]] = np.arange(start, start + n_nodes[i])
+        start += n_nodes[i]
+    return stacked, gather
+
+#----------------------------------------------------------------------------------------------------
+def sYlm(xp, s, l, m, theta, phi):
+    """ spin-weighted spherical harmonic sYlm (same convention as gwtools.harmonics.sYlm) from
+        its closed form sum over powers of cos(theta/2) and sin(theta/2) """
+    cos_half, sin_half = xp.cos(theta/2), xp.sin(theta/2)
+    prefactor = (-1)**m*np.sqrt((2*l + 1)*factorial(l + m)*factorial(l - m)
+                                /(4*pi*factorial(l + s)*factorial(l - s)))
+    total = 0.0
+    for r in range(max(0, m - s), min(l - s, l + m) + 1):
+        total = total + comb(l - s, r)*comb(l + s, r + s - m)*(-1)**(l - r - s) \
+                *cos_half**(2*r + s - m)*sin_half**(2*l - 2*r - s + m)
+    return prefactor*total*xp.exp(1j*m*phi)
+
+#----------------------------------------------------------------------------------------------------
+class ArrayEvaluator:
+    """
+    Surrogate evaluation with array operations of a backend (see the top of this module).
+    Built by the make_array_evaluator() function of the models.
+
+    Inputs
+    ======
+        time : time samples of the surrogate
+        modes : modes (m>0) to evaluate
+        fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, fit_func : as in
+                            fits.all_modes_surrogate(); fit_func is 'spline_1d' or 'GPR_fits'
+        kinds : dictionary {mode: 'amp_phase' or 'coorbital_re_im'} as in
+                sparse_output.SparseWaveform
+        parameterization : function (xp, *params) returning X_sur, X_calib and norm
+        alpha_coeffs, beta_coeffs, alpha_beta_functional_form, calibrated : NR calibration as
+                            in utils.obtain_processed_output()
+        backend : 'numpy' or 'jax'
+
+    Attributes
+    ==========
+        modes : order of the modes along the first axis of the outputs of evaluate()
+        xp : array namespace of the backend
+    """
+
+    def __init__(self, time, modes, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2,
+                 fit_func, kinds, parameterization, alpha_coeffs, beta_coeffs,
+                 alpha_beta_functional_form, calibrated=True, backend='numpy'):
+        if fit_func not in ('spline_1d', 'GPR_fits'):
+            raise ValueError("array evaluation is only available for 'spline_1d' and 'GPR_fits'")
+        if 'coorbital_re_im' in kinds.values() and (2,2) not in modes:
+            raise ValueError("the (2,2) mode is needed to transform the coorbital modes")
+        self.xp = get_backend(backend)
+        self.backend = backend
+        self.fit_func = fit_func
+        self.parameterization = parameterization
+        self.alpha_coeffs = alpha_coeffs
+        self.beta_coeffs = beta_coeffs
+        self.alpha_beta_functional_form = alpha_beta_functional_form
+        self.calibrated = calibrated
+
+        # amplitude/phase modes first, then the coorbital ones (which need the (2,2) phase)
+        self.modes = [mode for mode in modes if kinds[mode] == 'amp_phase'] \
+                     + [mode for mode in modes if kinds[mode] == 'coorbital_re_im']
+        self._n_amp_phase = sum(kinds[mode] == 'amp_phase' for mode in modes)
+        self._m_coorbital = np.array([m for (l,m) in self.modes[self._n_amp_phase:]], dtype=float)
+        self._index_22 = self.modes.index((2,2)) if (2,2) in self.modes else None
+
+        xp = self.xp
+        self.time = xp.asarray(np.asarray(time, dtype=float))
+        self._datapieces = []
+        for fit_data_dict, B_dict in [(fit_data_dict_1, B_dict_1), (fit_data_dict_2, B_dict_2)]:
+            fit_data_list = [fit_data_dict[mode] for mode in self.modes]
+            if fit_func == 'spline_1d':
+                knots, coefs, n_coefs, degree = pack_splines(fit_data_list)
+                fits = {'knots': xp.asarray(knots), 'coefs': xp.asarray(coefs),
+                        'n_coefs': xp.asarray(n_coefs), 'degree': degree}
+            else:
+                fits = {key: xp.asarray(value) for key, value in pack_gprs(fit_data_list).items()}
+            B, gather = pack_bases([B_dict[mode] for mode in self.modes])
+            self._datapieces.append((fits, xp.asarray(B), xp.asarray(gather)))
+
+    def _node_values(self, X_sur, fits):
+        if self.fit_func == 'spline_1d':
+            return spline_values(self.xp, X_sur, fits['knots'], fits['coefs'], fits['n_coefs'],
+                                 fits['degree'])
+        return gpr_values(self.xp, X_sur, fits)
+
+    def _datapiece(self, X_sur, i):
+        """ datapiece i (0 or 1) of all modes, array (n_modes, n_times) """
+        xp = self.xp
+        fits, B, gather = self._datapieces[i]
+        values = xp.concatenate([self._node_values(X_sur, fits), xp.zeros(1)])
+        return xp.einsum('mn,mnt->mt', values[gather], B)
+
+    def evaluate(self, *params):
+        """
+        Modes m>0 of the surrogate, NR calibrated if requested, in geometric units
+
+        Inputs
+        ======
+            params : model parameters (q for BHPTNRSur1dq1e4, q, spin1 for BHPTNRSur2dq1e3)
+
+        Outputs
+        =======
+            t : array (n_times,) of times
+            h : complex array (n_modes, n_times), modes ordered as self.modes
+        """
+        xp = self.xp
+        X_sur, X_calib, norm = self.parameterization(xp, *params)
+        d_1, d_2 = self._datapiece(X_sur, 0), self._datapiece(X_sur, 1)
+
+        n = self._n_amp_phase
+        # conj(decomposition)*norm as in fits._combine_datapieces()
+        h = d_1[:n]*xp.exp(-1j*d_2[:n])
+        if n < len(self.modes):
+            # the orbital phase is half the phase of h22, unwrapped from its first sample
+            phase_22 = d_2[self._index_22]
+            offset = xp.angle(xp.exp(-1j*phase_22[0])) + phase_22[0]
+            orbital_phase = (offset - phase_22)/2
+            h_coorbital = (d_1[n:] - 1j*d_2[n:])*xp.exp(1j*self._m_coorbital[:,None]*orbital_phase)
+            h = xp.concatenate([h, h_coorbital])
+        h = h*norm
+
+        if not self.calibrated:
+            return self.time, h
+        alpha = xp.stack([xp.asarray(nrcalib.evaluate_alpha(X_calib, l, self.alpha_coeffs,
+                                                            self.alpha_beta_functional_form))
+                          for (l,m) in self.modes])
+        beta = nrcalib.evaluate_beta(X_calib, self.beta_coeffs, self.alpha_beta_functional_form)
+        return self.time*beta, h*alpha[:,None]
+
+    def waveform(self, *params, inclination, orb_phase, M_tot=None, dist_mpc=None):
+        """
+        Mode-summed waveform on the sphere (including the m<0 modes), as generate_surrogate(...,
+        mode_sum=True). Returns t, h; in SI units if M_tot and dist_mpc are given.
+        """
+        xp = self.xp
+        t, h = self.evaluate(*params)
+        harmonics = xp.stack([sYlm(xp, -2, l, m, inclination, orb_phase) for (l,m) in self.modes])
+        harmonics_neg = xp.stack([(-1)**l*sYlm(xp, -2, l, -m, inclination, orb_phase)
+                                  for (l,m) in self.modes])
+        h_sum = xp.sum(harmonics[:,None]*h + harmonics_neg[:,None]*xp.conj(h), axis=0)
+        if M_tot is not None and dist_mpc is not None:
+            # geo_to_SI() scales the time with M_tot and the strain with M_tot/dist_mpc
+            t_unit, h_unit = utils.geo_to_SI_units(1.0, 1.0)
+            return t*t_unit*M_tot, h_sum*h_unit*M_tot/dist_mpc
+        return t, h_sum
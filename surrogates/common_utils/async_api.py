@@ -0,0 +1,211 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : asyncio interface to the surrogate models
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+asyncio front-ends evaluating the waveforms in an executor, so that the event loop is never
+blocked. Identical requests waiting at the same time are evaluated once and their callers
+share the same (t, h) objects, which must not be modified in place.
+
+    sur = async_api.AsyncSurrogate('BHPTNRSur1dq1e4', max_concurrency=2)
+    results = await asyncio.gather(*[sur.generate(q=q, modes=[(2,2)]) for q in qs])
+    t, h = await BHPTNRSur1dq1e4.generate_surrogate_async(q=8)
+"""
+
+import asyncio
+import inspect
+import importlib
+import threading
+import weakref
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+#----------------------------------------------------------------------------------------------------
+def _freeze(value):
+    """ hashable representation of an argument, used to find identical requests """
+    if isinstance(value, np.ndarray):
+        return ('ndarray', value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return ('dict',) + tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (int, float, complex, str, bool, type(None))):
+        return value
+    # other objects (e.g. a profiler) are only identical to themselves
+    return ('object', id(value))
+
+#----------------------------------------------------------------------------------------------------
+class _Request:
+    """ one distinct request : its arguments, the future shared by its callers and their number """
+
+    def __init__(self, key, kwargs, future):
+        self.key = key
+        self.kwargs = kwargs
+        self.future = future
+        self.waiters = 0
+        # read by the executor thread; once set, the request is skipped if not started yet
+        self.cancelled = threading.Event()
+
+#----------------------------------------------------------------------------------------------------
+def _evaluate(generate_surrogate, request):
+    """ Evaluates a request (in an executor thread), unless it was cancelled meanwhile """
+    if request.cancelled.is_set():
+        raise asyncio.CancelledError()
+    return generate_surrogate(**request.kwargs)
+
+#----------------------------------------------------------------------------------------------------
+class AsyncSurrogate:
+    """
+    asyncio front-end of a surrogate model
+
+    Inputs
+    ======
+        model : model module (e.g. BHPTNRSur1dq1e4) or its name; a name is imported in the
+                executor by load() or by the first call of generate()
+        executor : concurrent.futures executor used for the evaluations, or 'loop' for the
+                   default executor of the event loop (shut down with the loop). Default: None,
+                   in which case a ThreadPoolExecutor with max_workers threads is created and
+                   shut down by close()
+        max_workers : number of threads of the executor created when executor is None
+        max_concurrency : maximum number of requests evaluated at the same time.
+                          Default: None (limited by the executor only)
+
+    Cancelling a call of generate() stops waiting for the result. The evaluation itself is
+    skipped if no other caller waits for the same request and it has not started yet; an
+    evaluation which is already running in the executor runs to completion.
+    """
+
+    def __init__(self, model, executor=None, max_workers=None, max_concurrency=None):
+        if isinstance(model, str):
+            self.model_name, self._module = model, None
+        else:
+            self.model_name, self._module = model.__name__, model
+        self._own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers,
+                                          thread_name_prefix='BHPTNRSur-%s'%self.model_name)
+        elif executor == 'loop':
+            # run_in_executor(None, ...) uses the default executor of the loop
+            executor = None
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self._reset_loop_state(None)
+
+    def _reset_loop_state(self, loop):
+        """ asyncio primitives are bound to the event loop they are used from """
+        self._loop = loop
+        self._requests = {}
+        self._load_lock = asyncio.Lock() if loop is not None else None
+        self._semaphore = None
+        if loop is not None and self.max_concurrency is not None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _get_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            if self._requests:
+                raise RuntimeError("AsyncSurrogate is in use by another event loop")
+            self._reset_loop_state(loop)
+        return loop
+
+    async def load(self):
+        """ imports the model in the executor (if needed) and returns the module """
+        loop = self._get_loop()
+        if self._module is None:
+            async with self._load_lock:
+                if self._module is None:
+                    self._module = await loop.run_in_executor(self.executor, importlib.import_module,
+                                                              self.model_name)
+        return self._module
+
+    async def generate(self, *args, **kwargs):
+        """
+        Same arguments and outputs as generate_surrogate() of the model
+        """
+        module = await self.load()
+        loop = self._get_loop()
+
+        # bind positional arguments so that equivalent calls are recognised as identical
+        bound = inspect.signature(module.generate_surrogate).bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = _freeze(bound.arguments)
+
+        request = self._requests.get(key)
+        if request is None:
+            request = _Request(key, dict(bound.arguments), loop.create_future())
+            self._requests[key] = request
+            loop.create_task(self._run(request))
+
+        request.waiters += 1
+        try:
+            # the future is shared by all callers : shield it from the cancellation of one of them
+            return await asyncio.shield(request.future)
+        except asyncio.CancelledError:
+            if request.waiters == 1 and not request.future.done():
+                request.cancelled.set()
+                self._requests.pop(key, None)
+            raise
+        finally:
+            request.waiters -= 1
+
+    async def _run(self, request):
+        """ evaluates a request in the executor and sets the future of its callers """
+        result, err = None, None
+        try:
+            if self._semaphore is not None:
+                async with self._semaphore:
+                    result = await self._loop.run_in_executor(self.executor, _evaluate,
+                                                              self._module.generate_surrogate,
+                                                              request)
+            else:
+                result = await self._loop.run_in_executor(self.executor, _evaluate,
+                                                          self._module.generate_surrogate, request)
+        except BaseException as error:
+            err = error
+
+        if self._requests.get(request.key) is request:
+            del self._requests[request.key]
+        if request.future.done():
+            return
+        if err is None:
+            request.future.set_result(result)
+        elif isinstance(err, asyncio.CancelledError):
+            request.future.cancel()
+        else:
+            request.future.set_exception(err)
+
+    def close(self, wait=True):
+        """ shuts down the executor if it was created by this object """
+        if self._own_executor:
+            self.executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        await self.load()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close(wait=False)
+        return False
+
+#----------------------------------------------------------------------------------------------------
+# default front-end of each model module, per event loop. They run on the default executor of
+# their loop, which closes it; as they refer to their loop, the entries of closed loops are
+# removed by get_async_surrogate()
+_default_surrogates = weakref.WeakKeyDictionary()
+_default_lock = threading.Lock()
+
+#----------------------------------------------------------------------------------------------------
+def get_async_surrogate(module):
+    """ returns the default AsyncSurrogate of a model module for the running event loop """
+    loop = asyncio.get_running_loop()
+    with _default_lock:
+        for closed_loop in [other for other in _default_surrogates.keys() if other.is_closed()]:
+            del _default_surrogates[closed_loop]
+        surrogates = _default_surrogates.setdefault(loop, {})
+        if module.__name__ not in surrogates:
+            surrogates[module.__name__] = AsyncSurrogate(module, executor='loop')
+        return surrogates[module.__name__]
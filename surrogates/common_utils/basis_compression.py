@@ -0,0 +1,184 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : low-rank compression of the EIM basis matrices
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Low-rank (truncated SVD) compression of the basis matrices: B ~ left @ right, so that a
+datapiece B^T e is evaluated as right^T (left^T e) at rank*(n_nodes + n_times) cost.
+
+The rank keeps |B - left @ right|_2 below tol |B|_2/weight, where the weight of a datapiece
+is 1 for amplitudes and real/imaginary parts and the largest phase node value for phases.
+With shared=True the weighted basis matrices of all modes of a datapiece are compressed
+together and share one right factor; as the basis matrices usually have full rank, this is
+where the compression pays off. fits.all_modes_surrogate() accepts LowRankBasis objects.
+"""
+
+import numpy as np
+from . import fits
+
+#----------------------------------------------------------------------------------------------------
+class LowRankBasis:
+    """
+    Low-rank factorization B ~ left @ right of a basis matrix
+
+    Inputs
+    ======
+        left : array (n_nodes, rank)
+        right : array (rank, n_times); may be shared between several LowRankBasis objects
+    """
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+    @property
+    def shape(self):
+        return (self.left.shape[0], self.right.shape[1])
+
+    @property
+    def rank(self):
+        return self.left.shape[1]
+
+    @property
+    def nbytes(self):
+        """ bytes of the left factor and of the right factor """
+        return self.left.nbytes + self.right.nbytes
+
+    def transpose_dot(self, eim_vals):
+        """ B^T @ eim_vals for eim_vals of shape (n_nodes,) or (n_nodes, k) """
+        return np.dot(self.right.T, np.dot(self.left.T, eim_vals))
+
+    def to_dense(self):
+        return np.dot(self.left, self.right)
+
+#----------------------------------------------------------------------------------------------------
+def _truncation_rank(singular_values, threshold):
+    """ smallest rank for which the largest discarded singular value is below threshold """
+    return max(1, int(np.sum(singular_values > threshold)))
+
+#----------------------------------------------------------------------------------------------------
+def compress_basis(B, tol=1e-6, weight=1.0):
+    """
+    Truncated SVD of a basis matrix (n_nodes, n_times) such that |B - B_compressed|_2 <= 
+    tol |B|_2/weight. Returns a LowRankBasis, or B itself if the factorization would not be
+    smaller than B.
+    """
+    U, S, Vt = np.linalg.svd(B, full_matrices=False)
+    rank = _truncation_rank(S, tol*S[0]/weight)
+    if rank*(B.shape[0] + B.shape[1]) >= B.size:
+        return B
+    return LowRankBasis(U[:,:rank]*S[:rank], np.ascontiguousarray(Vt[:rank]))
+
+#----------------------------------------------------------------------------------------------------
+def compress_basis_dict(B_dict, tol=1e-6, shared=False, weights=None):
+    """
+    Compresses the basis matrices of all modes (a dictionary {mode: B}) of one datapiece.
+
+    Inputs
+    ======
+        B_dict : dictionary of dense basis matrices (n_nodes, n_times), all on the same time grid
+                 if shared=True
+        tol : tolerance on the relative error of the waveform
+        shared : if True, a single right factor is shared by all modes
+        weights : dictionary {mode: weight}, see the description at the top of this module.
+                  Default: None (weight 1 for all modes)
+
+    Outputs
+    =======
+        dictionary {mode: LowRankBasis (or B if compression does not pay off)}
+    """
+    if weights is None:
+        weights = {mode: 1.0 for mode in B_dict.keys()}
+    if not shared:
+        return {mode: compress_basis(B, tol, weights[mode]) for mode, B in B_dict.items()}
+
+    # |w_m (B_m - B_m compressed)|_2 is below the largest discarded singular value of the 
+    # stacked matrix, which must then be below tol |B_m|_2 for every mode
+    modes = list(B_dict.keys())
+    stacked = np.vstack([weights[mode]*B_dict[mode] for mode in modes])
+    _, S, Vt = np.linalg.svd(stacked, full_matrices=False)
+    threshold = tol*min(np.linalg.norm(B_dict[mode], 2) for mode in modes)
+    right = np.ascontiguousarray(Vt[:_truncation_rank(S, threshold)])
+    # the left factors are the projections of each B on the shared right singular vectors
+    return {mode: LowRankBasis(np.dot(B_dict[mode], right.T), right) for mode in modes}
+
+#----------------------------------------------------------------------------------------------------
+def phase_weights(fit_data_dict, fit_func, X_samples):
+    """ weights of phase datapieces : largest absolute phase at the EIM nodes of each mode
+        over the surrogate parameters X_samples """
+    return {mode: max(np.max(np.abs(fits._evaluate_EIM_nodes(X, fit_data, fit_func)))
+                      for X in X_samples)
+            for mode, fit_data in fit_data_dict.items()}
+
+#----------------------------------------------------------------------------------------------------
+def basis_nbytes(B_dict):
+    """ memory of a dictionary of (dense or compressed) basis matrices; shared factors are
+        counted once """
+    seen, nbytes = set(), 0
+    for B in B_dict.values():
+        arrays = [B.left, B.right] if isinstance(B, LowRankBasis) else [B]
+        for array in arrays:
+            if id(array) not in seen:
+                seen.add(id(array))
+                nbytes += array.nbytes
+    return nbytes
+
+#----------------------------------------------------------------------------------------------------
+def compression_report(B_dict, B_dict_compressed):
+    """
+    Compares compressed basis matrices with the original ones
+
+    Outputs
+    =======
+        report : dictionary {mode: {'rank', 'n_nodes', 'rel_err'}} where rel_err is
+                 |B - B_compressed|_2/|B|_2, plus the keys 'bytes' and 'bytes_compressed'
+    """
+    report = {}
+    for mode, B in B_dict.items():
+        B_compressed = B_dict_compressed[mode]
+        if isinstance(B_compressed, LowRankBasis):
+            rank = B_compressed.rank
+            rel_err = np.linalg.norm(B - B_compressed.to_dense(), 2)/np.linalg.norm(B, 2)
+        else:
+            rank, rel_err = B.shape[0], 0.0
+        report[mode] = {'rank': rank, 'n_nodes': B.shape[0], 'rel_err': rel_err}
+    report['bytes'] = basis_nbytes(B_dict)
+    report['bytes_compressed'] = basis_nbytes(B_dict_compressed)
+    return report
+
+#----------------------------------------------------------------------------------------------------
+def datapiece_accuracy_report(B_dict, B_dict_compressed, fit_data_dict, fit_func, X_samples,
+                              phase_modes=()):
+    """
+    Compares the datapieces obtained with the compressed and the original basis matrices
+    at the surrogate parameters X_samples
+
+    Inputs
+    ======
+        B_dict, B_dict_compressed : original and compressed basis matrices of one datapiece
+        fit_data_dict : fit data of the same datapiece (see fits.all_modes_surrogate())
+        fit_func : 'spline_1d', 'GPR_fits' or 'tabulated_1d'
+        X_samples : list of surrogate parameters
+        phase_modes : modes for which the datapiece is a phase
+
+    Outputs
+    =======
+        report : dictionary {mode: error} plus the key 'max_err' with the largest error. 
+                 The error of a mode is the maximum over X_samples of max|d - d_compressed|, 
+                 divided by max|d| unless the datapiece is a phase. In both cases it estimates
+                 the relative error of the waveform.
+    """
+    report = {}
+    for mode, B in B_dict.items():
+        errors = []
+        for X in X_samples:
+            eim = fits._evaluate_EIM_nodes(X, fit_data_dict[mode], fit_func)
+            exact = fits._EIM_B_to__waveform_datapiece(B, eim)
+            approx = fits._EIM_B_to__waveform_datapiece(B_dict_compressed[mode], eim)
+            error = np.max(np.abs(approx - exact))
+            errors.append(error if mode in phase_modes else error/np.max(np.abs(exact)))
+        report[mode] = max(errors)
+    report['max_err'] = max(report.values())
+    return report
@@ -0,0 +1,148 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : projection of waveforms onto ground-based detectors
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Projects h = h_plus - i h_cross (utils.sum_modes()) onto detectors for arrays of sky
+positions, polarization angles and GPS times, s(t) = F_plus h_plus(t - dt) + F_cross h_cross(t - dt),
+with the antenna patterns and delays of LAL (XLALComputeDetAMResponse(),
+XLALTimeDelayFromEarthCenter(), LALDetectors.h). The delays are phase ramps applied to one
+zero padded FFT of the waveform, which must be sampled uniformly (and preferably tapered).
+"""
+
+import numpy as np
+
+# speed of light in m/s
+_c_SI = 299792458.0
+
+# vertex (m) and unit vectors along the x and y arms in Earth-fixed coordinates (LALDetectors.h)
+detectors = {
+    'H1': {'vertex': np.array([-2.16141492636e+06, -3.83469517889e+06, 4.60035022664e+06]),
+           'x_arm': np.array([-0.22389266154, 0.79983062746, 0.55690487831]),
+           'y_arm': np.array([-0.91397818574, 0.02609403989, -0.40492342125])},
+    'L1': {'vertex': np.array([-7.42760447238e+04, -5.49628371971e+06, 3.22425701744e+06]),
+           'x_arm': np.array([-0.95457412153, -0.14158077340, -0.26218911324]),
+           'y_arm': np.array([0.29774156894, -0.48791033647, -0.82054461286])},
+    'V1': {'vertex': np.array([4.54637409900e+06, 8.42989697626e+05, 4.37857696241e+06]),
+           'x_arm': np.array([-0.70045821479, 0.20848948619, 0.68256166277]),
+           'y_arm': np.array([-0.05379255368, -0.96908180549, 0.24080451708])},
+}
+
+# GPS times at which a leap second was inserted; GPS - UTC is the number of entries passed
+_leap_seconds_gps = np.array([46828800, 78364801, 109900802, 173059203, 252028804, 315187205,
+                              346723206, 393984007, 425520008, 457056009, 504489610, 551750411,
+                              599184012, 820108813, 914803214, 1025136015, 1119744016,
+                              1167264017])
+
+#----------------------------------------------------------------------------------------------------
+def detector_tensor(detector):
+    """ response tensor (x x - y y)/2 of a detector given as a name or as a dictionary with the
+        keys 'vertex', 'x_arm' and 'y_arm' """
+    if isinstance(detector, str):
+        detector = detectors[detector]
+    x, y = np.asarray(detector['x_arm']), np.asarray(detector['y_arm'])
+    return 0.5*(np.outer(x, x) - np.outer(y, y))
+
+#----------------------------------------------------------------------------------------------------
+def gmst(t_gps):
+    """ Greenwich mean sidereal time (rad) at the GPS times t_gps, taking UT1 = UTC """
+    t_gps = np.asarray(t_gps, dtype=float)
+    t_utc = t_gps - np.searchsorted(_leap_seconds_gps, t_gps, side='right')
+    # Julian centuries since J2000 (the GPS epoch is JD 2444244.5)
+    T = (2444244.5 + t_utc/86400.0 - 2451545.0)/36525.0
+    gmst_seconds = 67310.54841 + (876600.0*3600.0 + 8640184.812866)*T + 0.093104*T**2 \
+                   - 6.2e-6*T**3
+    return np.mod(gmst_seconds, 86400.0)*2*np.pi/86400.0
+
+#----------------------------------------------------------------------------------------------------
+def antenna_patterns(detector, ra, dec, psi, t_gps):
+    """
+    Antenna patterns of a detector for arrays of sky positions and times
+
+    Inputs
+    ======
+        detector : name ('H1', 'L1', 'V1') or dictionary with the keys 'vertex', 'x_arm', 'y_arm'
+        ra, dec : right ascension and declination (rad)
+        psi : polarization angle (rad)
+        t_gps : GPS time at the geocenter
+
+    Outputs
+    =======
+        F_plus, F_cross : arrays of the broadcast shape of the inputs
+    """
+    D = detector_tensor(detector)
+    ra, dec, psi, t_gps = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                                for x in (ra, dec, psi, t_gps)])
+    gha = gmst(t_gps) - ra
+    cos_gha, sin_gha = np.cos(gha), np.sin(gha)
+    cos_dec, sin_dec = np.cos(dec), np.sin(dec)
+    cos_psi, sin_psi = np.cos(psi), np.sin(psi)
+
+    X = np.stack([-cos_psi*sin_gha - sin_psi*cos_gha*sin_dec,
+                  -cos_psi*cos_gha + sin_psi*sin_gha*sin_dec,
+                  sin_psi*cos_dec], axis=-1)
+    Y = np.stack([sin_psi*sin_gha - cos_psi*cos_gha*sin_dec,
+                  sin_psi*cos_gha + cos_psi*sin_gha*sin_dec,
+                  cos_psi*cos_dec], axis=-1)
+    DX, DY = X @ D, Y @ D
+    F_plus = np.einsum('...i,...i->...', X, DX) - np.einsum('...i,...i->...', Y, DY)
+    F_cross = np.einsum('...i,...i->...', X, DY) + np.einsum('...i,...i->...', Y, DX)
+    return F_plus, F_cross
+
+#----------------------------------------------------------------------------------------------------
+def time_delay(detector, ra, dec, t_gps):
+    """ arrival time at the detector minus arrival time at the geocenter (s) """
+    if isinstance(detector, str):
+        detector = detectors[detector]
+    ra, dec, t_gps = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (ra, dec, t_gps)])
+    gha = gmst(t_gps) - ra
+    # unit vector towards the source in Earth-fixed coordinates
+    n = np.stack([np.cos(dec)*np.cos(gha), -np.cos(dec)*np.sin(gha), np.sin(dec)], axis=-1)
+    return -(n @ np.asarray(detector['vertex']))/_c_SI
+
+#----------------------------------------------------------------------------------------------------
+def project(t, h, ra, dec, psi, t_gps, detector_names=('H1', 'L1', 'V1')):
+    """
+    Projects one waveform onto detectors for many sky positions
+
+    Inputs
+    ======
+        t : uniformly sampled times (s) of the waveform, relative to the geocentric time t_gps
+        h : complex mode-summed waveform h_plus - i h_cross, e.g. from generate_surrogate(...,
+            mode_sum=True) in physical units
+        ra, dec, psi, t_gps : scalars or arrays (broadcast together) of right ascension,
+                              declination, polarization angle (rad) and geocentric GPS time
+        detector_names : names of detectors in detectors, or dictionaries defining detectors
+
+    Outputs
+    =======
+        strain : dictionary {detector: array (..., len(t))} of the detector strain at the
+                 geocentric times t_gps + t, with the leading dimensions of the broadcast
+                 parameters. Detector dictionaries are keyed by their index.
+    """
+    t = np.asarray(t, dtype=float)
+    dt = t[1] - t[0]
+    if not np.allclose(np.diff(t), dt, rtol=1e-6, atol=0):
+        raise ValueError("the waveform must be uniformly sampled to be projected")
+    ra, dec, psi, t_gps = np.broadcast_arrays(*[np.asarray(x, dtype=float)
+                                                for x in (ra, dec, psi, t_gps)])
+
+    # one FFT of each polarization, zero padded by at least the largest delay (Earth diameter/c)
+    n = len(t)
+    n_pad = n + int(np.ceil(0.05/dt))
+    n_fft = 1 << int(np.ceil(np.log2(n_pad)))
+    h_plus_f = np.fft.rfft(np.real(h), n_fft)
+    h_cross_f = np.fft.rfft(-np.imag(h), n_fft)
+    freqs = np.fft.rfftfreq(n_fft, dt)
+
+    strain = {}
+    for i, detector in enumerate(detector_names):
+        key = detector if isinstance(detector, str) else i
+        F_plus, F_cross = antenna_patterns(detector, ra, dec, psi, t_gps)
+        delay = time_delay(detector, ra, dec, t_gps)
+        signal_f = (F_plus[...,None]*h_plus_f + F_cross[...,None]*h_cross_f) \
+                   *np.exp(-2j*np.pi*freqs*delay[...,None])
+        strain[key] = np.fft.irfft(signal_f, n_fft, axis=-1)[...,:n]
+    return strain
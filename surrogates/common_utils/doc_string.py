@@ -82,6 +82,49 @@ def generic_doc_for_models() -> None:
                  how modes are calibrated to NR.
                  If set to False, the raw (uncalibrated) ppBHPT waveforms are returned.
                  Default: True
+
+    profiler:  Optional common_utils.profiling.StageProfiler instance. When given, the
+               wall time (and allocated bytes if track_memory=True) of each evaluation 
+               stage is recorded per stage and per mode, and can be exported with
+               profiler.to_dict() or profiler.to_json().
+               Default: None (no instrumentation)
+
+    mode_tolerance: Only used with mode_sum=True. Modes whose estimated contribution to 
+               the waveform at the given inclination (peak amplitude at the EIM nodes 
+               times |-2Y_lm|) is below mode_tolerance times that of the (2,2) mode 
+               (or of the largest mode if (2,2) is not requested) are not evaluated. 
+               That mode is always kept.
+               Default: None (all modes up to lmax are evaluated)
+
+    derivatives: If True, the derivatives of the waveform with respect to the model
+               parameters (q for BHPTNRSur1dq1e4, q and spin1 for BHPTNRSur2dq1e3) are
+               computed in the same pass from the exact derivatives of the spline / 
+               GPR fits, and t, h, dh are returned. dh is a dictionary with the 
+               parameter names as keys and values of the same form as h. They are 
+               the derivatives of h(t) at fixed time t, evaluated at the output times 
+               (the NR calibration rescales the time samples with the parameters).
+               Default: False
+
+    sparse_step: If given, the amplitude and phase of the modes (real and imaginary parts
+               in the coorbital frame for the higher modes of BHPTNRSur1dq1e4) are only
+               evaluated every sparse_step-th time sample and a SparseWaveform (see
+               common_utils.sparse_output) is returned instead of t, h. Its method
+               dense(times) interpolates them and returns t, h at any times, by
+               default on the full time grid with the other arguments given here.
+               Default: None
+
+    f_low:     Starting frequency of the (2,2) mode, in Hz for physical waveforms (M_tot
+               and dist_mpc given) and in units of 1/M otherwise. The start time is found
+               from the (2,2) phase evaluated on a coarse time grid, and only the samples
+               from there on are evaluated.
+               Default: None (full waveform)
+
+    n_threads: If > 1, the modes are evaluated and processed on a persistent pool of 
+               n_threads threads, which lowers the wall time of a single waveform with
+               many modes (see common_utils.mode_parallel). BLAS is limited to one
+               thread meanwhile if threadpoolctl is installed. Not used with 
+               derivatives or sparse_step.
+               Default: None (serial evaluation)
                  
     Output
     ======
@@ -107,6 +150,26 @@ def generic_doc_for_models() -> None:
     6. to obtain mode-summed NR calibrated physical waveform on a sphere
             t, h = generate_surrogate(q=8, M_tot=60, dist_mpc=100, orb_phase=np.pi/3, 
                                       inclination=np.pi/4, lmax=3, mode_sum=True)
+    7. to record the time spent in each evaluation stage
+            prof = profiling.StageProfiler(track_memory=True)
+            t, h = generate_surrogate(q=8, profiler=prof)
+            print(prof.to_json())
+    8. to skip the modes contributing less than 1e-3 of the (2,2) mode
+            t, h = generate_surrogate(q=8, M_tot=60, dist_mpc=100, orb_phase=np.pi/3, 
+                                      inclination=np.pi/4, mode_sum=True, mode_tolerance=1e-3)
+    9. to obtain the derivatives dh/dq e.g. for Fisher matrices
+            t, h, dh = generate_surrogate(q=8, modes=[(2,2)], derivatives=True)
+            dh_dq = dh['q'][(2,2)]
+    10. to generate waveforms from asyncio code without blocking the event loop
+            results = await asyncio.gather(*[generate_surrogate_async(q=q) for q in [8,9,10]])
+    11. to evaluate the modes every 10th time sample and reconstruct them on demand
+            sparse = generate_surrogate(q=8, sparse_step=10)
+            amp_22, phase_22 = sparse.amp_phase((2,2))
+            t, h = sparse.dense(times=np.linspace(-1000, 50, 20000))
+    12. to obtain the physical waveform from a starting frequency of 20 Hz
+            t, h = generate_surrogate(q=8, M_tot=60, dist_mpc=100, f_low=20)
+    13. to evaluate the modes of one waveform on 4 threads
+            t, h = generate_surrogate(q=8, n_threads=4)
               
     """
     return
@@ -129,6 +192,10 @@ def BHPTNRSur1dq1e4_doc() -> None:
                          (5,4),(5,5),(6,4),(6,5),(6,6),(7,5),(7,6),(7,7),(8,6),
                          (8,7),(8,8),(9,7),(9,8),(9,9),(10,8),(10,9)].                     
     The m<0 modes are deduced from the m>0 modes. 
+
+    After enable_node_table(), the spline fits of the EIM nodes are replaced by a dense
+    table in log10(q) (interpolation error below 1e-10 by default), which is cached in the
+    data directory. disable_node_table() goes back to the spline fits.
     
     Model details can be found in Islam et al. 2022, arXiv:2204.01972.      
     """
@@ -151,6 +218,15 @@ def BHPTNRSur2dq1e3_doc() -> None:
     
     Available modes are: (2,1),(2,2),(3,1),(3,2),(3,3),(4,2),(4,3),(4,4)].                     
     The m<0 modes are deduced from the m>0 modes. 
+
+    The model consists of two sub-surrogates, for chi1<0 and chi1>=0. Each of them is
+    loaded the first time a waveform with the corresponding spin sign is requested; use
+    load_spin_branch('negative_spin') or load_spin_branch('positive_spin') to load one
+    in advance.
+
+    With uncertainty=True, generate_surrogate() returns t, h, h_err where h_err are
+    error envelopes of the modes (or of the mode-summed waveform) from the predictive
+    standard deviations of the GPR fits; see common_utils.gpr_uncertainty.
     
     Model details can be found in arXiv:2407.18319. 
     """
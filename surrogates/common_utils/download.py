@@ -0,0 +1,132 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : resumable, verified download of the surrogate data files
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+import os
+import time
+import socket
+import hashlib
+import http.client
+import urllib.error
+import urllib.request
+from .locking import FileLock
+
+# errors after which the download is resumed
+_retry_errors = (urllib.error.URLError, socket.timeout, ConnectionError, http.client.HTTPException)
+
+#----------------------------------------------------------------------------------------------------
+def file_md5(fname, chunk_size=1024*1024):
+    """ md5 hash of a file, read in chunks of chunk_size bytes """
+    hash_md5 = hashlib.md5()
+    with open(fname, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hash_md5.update(chunk)
+    return hash_md5
+
+#----------------------------------------------------------------------------------------------------
+def _stream_to_part_file(url, part_file, chunk_size, timeout):
+    """
+    Downloads url into part_file, resuming from the end of part_file if it exists
+    and the server accepts HTTP range requests.
+    Returns the md5 hash object of the full content of part_file.
+    """
+    offset = os.path.getsize(part_file) if os.path.isfile(part_file) else 0
+    request = urllib.request.Request(url)
+    if offset > 0:
+        request.add_header('Range', 'bytes=%d-'%offset)
+
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as err:
+        # the partial file already holds the full content
+        if err.code == 416 and offset > 0:
+            return file_md5(part_file, chunk_size)
+        raise
+
+    with response:
+        if offset > 0 and response.status == 206:
+            # resume : hash what is already on disk and append
+            hash_md5 = file_md5(part_file, chunk_size)
+            mode = 'ab'
+        else:
+            # range not supported (or fresh download) : start from scratch
+            hash_md5 = hashlib.md5()
+            mode = 'wb'
+            offset = 0
+
+        content_length = response.headers.get('Content-Length')
+        expected_size = offset + int(content_length) if content_length is not None else None
+
+        with open(part_file, mode) as f:
+            for chunk in iter(lambda: response.read(chunk_size), b""):
+                f.write(chunk)
+                hash_md5.update(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+    if expected_size is not None and os.path.getsize(part_file) != expected_size:
+        raise ConnectionError("incomplete download of %s : %d of %d bytes"
+                              %(url, os.path.getsize(part_file), expected_size))
+    return hash_md5
+
+#----------------------------------------------------------------------------------------------------
+def download_file(url, dest, expected_md5=None, chunk_size=8*1024*1024, retries=5, timeout=60,
+                  backoff=2.0, lock_timeout=None):
+    """
+    Downloads url to the file dest and returns its md5 hash.
+
+    The content is streamed to dest + '.part' in chunks of chunk_size bytes while the md5 hash
+    is computed. Interrupted downloads are resumed with HTTP range requests (also across runs,
+    since the partial file is kept). The partial file is only renamed to dest, atomically, once
+    the download is complete and its hash matches expected_md5. A lock on dest + '.lock' makes
+    sure that concurrent processes do not download the same file at the same time; processes
+    waiting for the lock use the file downloaded by the first one.
+
+    Inputs
+    ======
+        url : url of the file
+        dest : path of the downloaded file
+        expected_md5 : md5 hex digest the downloaded file must have. Default: None (not checked)
+        chunk_size : size in bytes of the chunks read from the network
+        retries : number of attempts before giving up
+        timeout : timeout in seconds of the network operations
+        backoff : base of the exponential waiting time (in seconds) between attempts
+        lock_timeout : maximum time in seconds to wait for another process downloading
+                       the same file. Default: None (wait forever)
+
+    Outputs
+    =======
+        md5 hex digest of dest
+    """
+    part_file = dest + '.part'
+
+    with FileLock(dest + '.lock', timeout=lock_timeout):
+
+        # another process may have completed the download while we were waiting
+        if os.path.isfile(dest):
+            file_hash = file_md5(dest, chunk_size).hexdigest()
+            if expected_md5 is None or file_hash == expected_md5:
+                return file_hash
+
+        for attempt in range(retries):
+            try:
+                file_hash = _stream_to_part_file(url, part_file, chunk_size, timeout).hexdigest()
+            except _retry_errors as err:
+                if isinstance(err, urllib.error.HTTPError) and err.code < 500:
+                    raise
+                print('... download interrupted (%s), retrying'%err)
+                time.sleep(backoff**attempt)
+                continue
+
+            if expected_md5 is not None and file_hash != expected_md5:
+                # corrupted content : discard it and download again from scratch
+                print('... md5 of the downloaded file does not match, downloading again')
+                os.remove(part_file)
+                continue
+
+            os.replace(part_file, dest)
+            return file_hash
+
+    raise RuntimeError("failed to download %s after %d attempts"%(url, retries))
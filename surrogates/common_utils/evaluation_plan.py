@@ -0,0 +1,165 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : precompiled evaluation plan of a model for fixed options
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+An EvaluationPlan resolves the options of generate_surrogate() (modes, decomposition
+functions, NR calibration, units and harmonics) once, for sampling loops in which only the
+binary parameters change:
+
+    plan = BHPTNRSur1dq1e4.plan(modes=[(2,2),(3,3)], M_tot=60, dist_mpc=100, orb_phase=0.0,
+                                inclination=np.pi/3, mode_sum=True)
+    t, h = plan(q)          # same output as generate_surrogate(q, modes=..., ...)
+
+A plan uses the fit data and basis matrices of the model when it is built : build a new plan
+after enable_node_table(), compress_basis() and their counterparts.
+"""
+
+import numpy as np
+from . import utils
+from . import fits
+from . import check_inputs as checks
+
+# node fits of each fit type, resolved once
+_node_evaluators = {'spline_1d': fits._evaluate_splines_at_EIM_nodes,
+                    'GPR_fits': fits._evaluate_GPR_at_EIM_nodes,
+                    'tabulated_1d': fits._evaluate_table_at_EIM_nodes}
+
+#----------------------------------------------------------------------------------------------------
+class EvaluationPlan:
+    """
+    Evaluation of a model for fixed options; see the description at the top of this module.
+    Calling the plan with the binary parameters returns (t, h) as generate_surrogate().
+
+    Inputs
+    ======
+        branch_data : function of a branch key returning (time, fit_data_dict_1,
+                      fit_data_dict_2, B_dict_1, B_dict_2) of the (sub-)surrogate
+        branch_of : function of the parameters returning the branch key (e.g. the sign of the
+                    spin), or None for models with a single surrogate
+        parameterization : function (xp, *params) returning X_sur, X_calib and norm, as the
+                           _array_parameterization() of the models
+        X_bounds : domain of validity of X_sur
+        modes, modes_available, lmax : requested and available modes, maximum value of l
+        fit_func, decomposition_funcs, alpha_coeffs, beta_coeffs, alpha_beta_functional_form,
+        calibrated, M_tot, dist_mpc, orb_phase, inclination, neg_modes, mode_sum,
+        CoorbToInert : as in model_utils.eval_surrogates.evaluate_surrogate()
+    """
+
+    def __init__(self, branch_data, branch_of, parameterization, X_bounds, modes, modes_available,
+                 lmax, fit_func, decomposition_funcs, alpha_coeffs, beta_coeffs,
+                 alpha_beta_functional_form, calibrated, M_tot, dist_mpc, orb_phase, inclination,
+                 neg_modes, mode_sum, CoorbToInert):
+
+        if modes is None:
+            modes = modes_available
+        checks.check_extrinsic_params(M_tot, dist_mpc, orb_phase, inclination, mode_sum)
+        checks.check_input_modes(modes, modes_available)
+        on_sphere = M_tot is not None and orb_phase is not None
+        if mode_sum and not on_sphere:
+            raise ValueError("mode_sum=True needs M_tot, dist_mpc, orb_phase and inclination")
+
+        self.modes = [mode for mode in modes if mode[0] <= lmax]
+        if CoorbToInert and (2,2) not in self.modes:
+            raise ValueError("the (2,2) mode is needed to transform the other modes to the "
+                             "inertial frame")
+        if CoorbToInert:
+            # the orbital phase comes from the (2,2) mode
+            self.modes.remove((2,2))
+            self.modes.insert(0, (2,2))
+        self._branch_data = branch_data
+        self._branch_of = branch_of
+        self._branches = {}
+        self._parameterization = parameterization
+        self._X_bounds = X_bounds
+        self._evaluate_nodes = _node_evaluators[fit_func]
+        self._decomposition_funcs = {mode: decomposition_funcs[0] if mode==(2,2)
+                                     else decomposition_funcs[1] for mode in self.modes}
+        self._CoorbToInert = CoorbToInert
+        self._neg_modes = neg_modes
+        self._mode_sum = mode_sum
+
+        # NR calibration : coefficients of alpha of each mode (None for alpha = 1) and of beta
+        self._alpha_beta_functional_form = alpha_beta_functional_form
+        self._calibrated = calibrated
+        if calibrated:
+            lmax_nrcalib = max([l for (l,m) in alpha_coeffs.keys()])
+            self._alpha_coeffs = {mode: alpha_coeffs[(mode[0],mode[0])]
+                                  if mode[0] <= lmax_nrcalib else None for mode in self.modes}
+            self._beta_coeffs = beta_coeffs
+            if lmax > 5:
+                print('**** warning **** : only modes up to \ell=5 are NR calibrated')
+        else:
+            print('**** warning **** : modes are NOT NR calibrated - waveforms only have 0PA '
+                  'contribution')
+
+        # units and spherical harmonics : h_lm is multiplied by factors[(l,m)] and, for the
+        # m<0 modes h_l-m = (-1)^l conj(h_lm), by neg_factors[(l,m)]
+        t_unit, h_unit = 1.0, 1.0
+        if M_tot is not None:
+            t_unit, h_unit = utils.geo_to_SI_units(M_tot, dist_mpc)
+        self._t_unit = t_unit
+        self._factors, self._neg_factors = {}, {}
+        for (l,m) in self.modes:
+            if on_sphere:
+                self._factors[(l,m)] = h_unit*utils._sYlm(-2, ll=l, mm=m, theta=inclination,
+                                                         phi=orb_phase)
+                self._neg_factors[(l,m)] = (-1)**l*h_unit*utils._sYlm(-2, ll=l, mm=-m,
+                                                    theta=inclination, phi=orb_phase)
+            else:
+                self._factors[(l,m)] = h_unit
+                self._neg_factors[(l,m)] = (-1)**l*h_unit
+
+    def _bind(self, key):
+        """ time and per-mode (fit data, basis matrices) of a branch, bound on first use """
+        if key not in self._branches:
+            time, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2 = self._branch_data(key)
+            self._branches[key] = (np.array(time),
+                                   [(mode, fit_data_dict_1[mode], fit_data_dict_2[mode],
+                                     B_dict_1[mode], B_dict_2[mode], self._decomposition_funcs[mode])
+                                    for mode in self.modes])
+        return self._branches[key]
+
+    def __call__(self, *params):
+        key = None if self._branch_of is None else self._branch_of(*params)
+        time, bound_modes = self._bind(key)
+        X_sur, X_calib, norm = self._parameterization(np, *params)
+        checks.check_domain_of_validity(X_sur, self._X_bounds)
+
+        # raw modes in the frame in which they were modelled
+        h_dict = {}
+        for mode, fit_data_1, fit_data_2, B_1, B_2, decomposition_func in bound_modes:
+            h_1 = fits._EIM_B_to__waveform_datapiece(B_1, self._evaluate_nodes(X_sur, fit_data_1))
+            h_2 = fits._EIM_B_to__waveform_datapiece(B_2, self._evaluate_nodes(X_sur, fit_data_2))
+            h_dict[mode] = np.conj(decomposition_func(h_1, h_2))*norm
+
+        if self._CoorbToInert:
+            orbital_phase = np.unwrap(np.angle(h_dict[(2,2)]))/2
+            for (l,m) in self.modes[1:]:
+                h_dict[(l,m)] = h_dict[(l,m)]*np.exp(1j*m*orbital_phase)
+
+        t = time
+        if self._calibrated:
+            form = self._alpha_beta_functional_form
+            for mode, coeffs in self._alpha_coeffs.items():
+                if coeffs is not None:
+                    h_dict[mode] = h_dict[mode]*form(X_calib, *coeffs)
+            t = time*form(X_calib, *self._beta_coeffs)
+        t = t*self._t_unit
+
+        if self._mode_sum:
+            h = np.zeros(len(t), dtype=complex)
+            for mode, h_mode in h_dict.items():
+                h += self._factors[mode]*h_mode
+                if self._neg_modes:
+                    h += self._neg_factors[mode]*np.conj(h_mode)
+            return t, h
+
+        h_out = {}
+        for (l,m), h_mode in h_dict.items():
+            h_out[(l,m)] = self._factors[(l,m)]*h_mode
+            if self._neg_modes:
+                h_out[(l,-m)] = self._neg_factors[(l,m)]*np.conj(h_mode)
+        return t, h_out
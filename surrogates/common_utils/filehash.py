@@ -8,25 +8,28 @@ import numpy as np
 import os
 from os import path
 import hashlib
+from . import download
 
 #----------------------------------------------------------------------------------------------------
-def md5(fname, h5_data_dir, zenodo_ID):
+def md5(fname, h5_data_dir, zenodo_ID, expected_hash=None):
     """ Compute hash from file. code taken from 
-    https://stackoverflow.com/questions/3431825/generating-an-md5-checksum-of-a-file"""
+    https://stackoverflow.com/questions/3431825/generating-an-md5-checksum-of-a-file
+    
+    If the file does not exist in h5_data_dir, it is downloaded from zenodo; the hash is 
+    then computed during the download and the file is only moved into h5_data_dir if its
+    hash matches expected_hash (when given)."""
     
     # download file if not already there
     if path.isfile('%s/%s'%(h5_data_dir,fname))==False:
         print('%s file is not found in the directory - PATH-TO/BHPTNRSurrogate/data/'%(fname))
         print('... downloading h5 file from zenodo')
         print('... this might take some time')
-        os.system('wget https://zenodo.org/record/%s/files/%s -P %s'%(zenodo_ID, fname, h5_data_dir))
+        url = 'https://zenodo.org/record/%s/files/%s'%(zenodo_ID, fname)
+        file_hash = download.download_file(url, '%s/%s'%(h5_data_dir,fname), expected_md5=expected_hash)
         print('... downloaded')
+        return file_hash
     
-    hash_md5 = hashlib.md5()
-    with open('%s/%s'%(h5_data_dir,fname), "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+    return download.file_md5('%s/%s'%(h5_data_dir,fname)).hexdigest()
 
 #----------------------------------------------------------------------------------------------------
 def check_current_hash(file_hash, zenodo_current_hash, url, fname):
@@ -9,6 +9,11 @@ import numpy as np
 import scipy
 from scipy.interpolate import splrep, splev
 from . import utils
+from . import profiling
+from . import node_tables
+from . import gpr_fits
+from . import basis_compression
+from . import mode_parallel
 from .eval_pysur import evaluate_fit as evaluate_GPR
 
 #----------------------------------------------------------------------------------------------------
@@ -36,62 +41,213 @@ def _evaluate_splines_at_EIM_nodes(X, fit_data):
     return np.array([splev(X, h_eim_spline[j]) for j in range(len(eim_indicies))])
 
 
+#----------------------------------------------------------------------------------------------------
+def _evaluate_table_at_EIM_nodes(X, fit_data):
+    """ Interpolate the tabulated node values (see common_utils.node_tables) at all EIM nodes 
+        Falls back to the spline fits outside of the tabulated range
+        For information on the inputs, please look at all_modes_surrogate()
+    """
+
+    [node_values, (X_min, dX, X_max), spline_fit_data] = fit_data
+    if X < X_min or X > X_max:
+        return _evaluate_splines_at_EIM_nodes(X, spline_fit_data)
+    return node_tables.interpolate_table(node_values, X_min, dX, X)
+
+
 #----------------------------------------------------------------------------------------------------
 def _EIM_B_to__waveform_datapiece(B, eim_vals):
     """ Compute the interpolated waveform for a single mode 
         For information on the inputs, please look at all_modes_surrogate()
     """
     
+    # compressed basis (see common_utils.basis_compression)
+    if isinstance(B, basis_compression.LowRankBasis):
+        return B.transpose_dot(eim_vals)
     approx_datapiece = np.dot(B.transpose(), eim_vals)
     return approx_datapiece
 
 
 #----------------------------------------------------------------------------------------------------
-def _evaluate_datapiece(X, fit_data, B, fit_func):
-    """ Compute the datapiece for the input parameters 
+def _evaluate_EIM_nodes(X, fit_data, fit_func):
+    """ Evaluate the fits of one datapiece at its EIM nodes 
         For information on the inputs, please look at all_modes_surrogate()
     """
-    
+
     # evaluates spline fits at eim nodes
     if fit_func == 'spline_1d':
-        h_eim_datapiece = _evaluate_splines_at_EIM_nodes(X, fit_data)
+        return _evaluate_splines_at_EIM_nodes(X, fit_data)
     # evaluates GPR fits at eim nodes
     elif fit_func == 'GPR_fits':
-        h_eim_datapiece = _evaluate_GPR_at_EIM_nodes(X, fit_data)
+        return _evaluate_GPR_at_EIM_nodes(X, fit_data)
+    # interpolates tabulated spline fits at eim nodes
+    elif fit_func == 'tabulated_1d':
+        return _evaluate_table_at_EIM_nodes(X, fit_data)
+    # Taylor steps from nearby evaluations (see common_utils.local_emulator)
+    elif fit_func == 'local_linear':
+        return fit_data(X)
+
+
+#----------------------------------------------------------------------------------------------------
+def _evaluate_EIM_nodes_jacobian(X, fit_data, fit_func):
+    """ Evaluate the derivatives of the fits of one datapiece at its EIM nodes with respect
+        to the surrogate parameters X; returns an array of shape (n_nodes, len(X))
+        For information on the inputs, please look at all_modes_surrogate()
+    """
+
+    # exact derivatives of the splines
+    if fit_func == 'spline_1d':
+        [h_eim_spline, eim_indicies] = fit_data
+        return np.array([[splev(X, h_eim_spline[j], der=1)] for j in range(len(eim_indicies))])
+    # closed form gradients of the GPR fits
+    elif fit_func == 'GPR_fits':
+        return gpr_fits.evaluate_nodes_gradient(X, fit_data)[1]
+    # the table is differentiated through the splines it was built from
+    elif fit_func == 'tabulated_1d':
+        return _evaluate_EIM_nodes_jacobian(X, fit_data[2], 'spline_1d')
+    # exact derivatives of the emulated fits
+    elif fit_func == 'local_linear':
+        return _evaluate_EIM_nodes_jacobian(X, fit_data.fit_data, fit_data.fit_func)
+
+
+#----------------------------------------------------------------------------------------------------
+def _evaluate_EIM_nodes_and_jacobian(X, fit_data, fit_func):
+    """ Evaluate the fits of one datapiece at its EIM nodes and their derivatives in one pass;
+        returns the values (n_nodes,) and the jacobian (n_nodes, len(X))
+        For information on the inputs, please look at all_modes_surrogate()
+    """
+
+    # the GPR kernel values are shared by the fits and their gradients
+    if fit_func == 'GPR_fits':
+        return gpr_fits.evaluate_nodes_gradient(X, fit_data)
+    return np.asarray(_evaluate_EIM_nodes(X, fit_data, fit_func)), \
+           _evaluate_EIM_nodes_jacobian(X, fit_data, fit_func)
+
+
+#----------------------------------------------------------------------------------------------------
+def _decomposition_derivative(decomposition_func, h_approx, h_approx_datapiece_1, 
+                              h_approx_datapiece_2, dh_datapiece_1, dh_datapiece_2):
+    """ Derivative of decomposition_func(datapiece_1, datapiece_2) = h_approx given the
+        derivatives of the datapieces
+    """
+
+    if decomposition_func is utils.amp_ph_to_comp:
+        # d(A exp(i phi)) = dA exp(i phi) + i dphi A exp(i phi)
+        return utils.amp_ph_to_comp(dh_datapiece_1, h_approx_datapiece_2) + 1j*dh_datapiece_2*h_approx
+    elif decomposition_func is utils.re_im_to_comp:
+        return utils.re_im_to_comp(dh_datapiece_1, dh_datapiece_2)
+    raise ValueError("no derivative available for the decomposition function %s"
+                     %decomposition_func.__name__)
+
+
+#----------------------------------------------------------------------------------------------------
+def _evaluate_datapiece(X, fit_data, B, fit_func, profiler=profiling.NULL_PROFILER, mode=None):
+    """ Compute the datapiece for the input parameters 
+        For information on the inputs, please look at all_modes_surrogate()
+    """
+    
+    with profiler.stage('fits', mode):
+        h_eim_datapiece = _evaluate_EIM_nodes(X, fit_data, fit_func)
     # combine h_eim and  eim basis matrix to give full datapiece
-    h_approx_datapiece = _EIM_B_to__waveform_datapiece(B, h_eim_datapiece) 
+    with profiler.stage('matmul', mode):
+        h_approx_datapiece = _EIM_B_to__waveform_datapiece(B, h_eim_datapiece) 
     
     return h_approx_datapiece
 
 
+#----------------------------------------------------------------------------------------------------
+def _combine_datapieces(h_approx_datapiece_1, h_approx_datapiece_2, decomposition_func, norm,
+                        profiler=profiling.NULL_PROFILER, mode=None):
+    """ Combine the two datapieces of a mode into the complex mode 
+        For information on the inputs, please look at all_modes_surrogate()
+    """
+
+    with profiler.stage('decomposition', mode):
+        # combine datapieces to obtain full wf either in the inertial frame or in the
+        # coorbital frame; at this stage, the waveforms are returned in their respective
+        # frames where models have been built e.g. inertial for 22 or coorbital for HMs
+        # in case of BHPTNRSur1dq1e4
+        h_approx =  decomposition_func(h_approx_datapiece_1, h_approx_datapiece_2)
+        
+        # needed to match convention of other surrogate models
+        # multiply surrogate amplitude with overall normalization factor
+        h_approx = np.conj(np.array(h_approx))*norm
+    
+    return h_approx
+
+
 #----------------------------------------------------------------------------------------------------
 def _evaluate_surrogate_mode(X, fit_data_1, fit_data_2, B_datapiece_1, B_datapiece_2, 
-                            fit_func, decomposition_func, norm):
+                            fit_func, decomposition_func, norm, profiler=profiling.NULL_PROFILER,
+                            mode=None):
     """ Compute the interpolated waveform for a single mode 
         For information on the inputs, please look at all_modes_surrogate()
     """
     
     # evaluate first datapiece e.g amplitude / real part of wf
-    h_approx_datapiece_1 = _evaluate_datapiece(X,  fit_data_1, B_datapiece_1, fit_func)
+    h_approx_datapiece_1 = _evaluate_datapiece(X,  fit_data_1, B_datapiece_1, fit_func, profiler, mode)
     # evaluate second datapiece e.g phase / imag part of wf
-    h_approx_datapiece_2 = _evaluate_datapiece(X,  fit_data_2, B_datapiece_2, fit_func)
-    
-    # combine datapieces to obtain full wf either in the inertial frame or in the
-    # coorbital frame; at this stage, the waveforms are returned in their respective
-    # frames where models have been built e.g. inertial for 22 or coorbital for HMs
-    # in case of BHPTNRSur1dq1e4
-    h_approx =  decomposition_func(h_approx_datapiece_1, h_approx_datapiece_2)
+    h_approx_datapiece_2 = _evaluate_datapiece(X,  fit_data_2, B_datapiece_2, fit_func, profiler, mode)
     
-    # needed to match convention of other surrogate models
-    # multiply surrogate amplitude with overall normalization factor
-    h_approx = np.conj(np.array(h_approx))*norm
-    
-    return h_approx
+    return _combine_datapieces(h_approx_datapiece_1, h_approx_datapiece_2, decomposition_func, 
+                               norm, profiler, mode)
+
+
+#----------------------------------------------------------------------------------------------------
+def _estimate_mode_amplitude(eim_1, eim_2, decomposition_func):
+    """ Cheap estimate of the peak amplitude of a mode from its EIM node values 
+        (the nodes sample the datapieces at a few times, including close to their peaks)
+    """
+
+    if decomposition_func is utils.amp_ph_to_comp:
+        return np.max(np.abs(eim_1))
+    # real and imaginary parts : |h| <= sqrt(max(re^2) + max(im^2))
+    return np.sqrt(np.max(np.abs(eim_1))**2 + np.max(np.abs(eim_2))**2)
+
+
+#----------------------------------------------------------------------------------------------------
+def prune_modes(eim_values, decomposition_funcs, inclination, mode_tolerance, neg_modes=True):
+    """ Select the modes whose contribution to the mode-summed waveform at the given inclination
+        is above mode_tolerance times the contribution of the 22 mode, or of the largest mode if
+        the 22 mode is not among the modes. The contribution of a mode is estimated as its peak
+        amplitude (from the EIM node values) times |-2Y_lm| (+ |-2Y_l-m| if the m<0 modes are
+        included). The reference mode is always kept.
+
+    Inputs
+    ======
+        eim_values : dictionary {mode: [EIM node values of datapiece 1, of datapiece 2]}
+        decomposition_funcs : see all_modes_surrogate()
+        inclination : inclination angle wrt the observer
+        mode_tolerance : relative threshold
+        neg_modes : whether the m<0 modes are added to the waveform
+
+    Outputs
+    =======
+        kept_modes : list of the modes to evaluate
+    """
+
+    contributions = {}
+    for mode, (eim_1, eim_2) in eim_values.items():
+        (l,m) = mode
+        decomposition_func = decomposition_funcs[0] if mode==(2,2) else decomposition_funcs[1]
+        angular_weight = np.abs(utils._sYlm(-2, ll=l, mm=m, theta=inclination, phi=0.0))
+        if neg_modes:
+            angular_weight += np.abs(utils._sYlm(-2, ll=l, mm=-m, theta=inclination, phi=0.0))
+        contributions[mode] = _estimate_mode_amplitude(eim_1, eim_2, decomposition_func)*angular_weight
+
+    if (2,2) in contributions:
+        reference_mode = (2,2)
+    else:
+        reference_mode = max(contributions, key=contributions.get)
+    reference = contributions[reference_mode]
+    return [mode for mode in eim_values.keys()
+            if mode==reference_mode or contributions[mode] >= mode_tolerance*reference]
 
 
 #----------------------------------------------------------------------------------------------------
 def all_modes_surrogate(modes, X_input, fit_data_dict_1, fit_data_dict_2, \
-                        B_dict_1, B_dict_2, lmax, fit_func, decomposition_funcs, norm):
+                        B_dict_1, B_dict_2, lmax, fit_func, decomposition_funcs, norm,
+                        profiler=None, mode_tolerance=None, inclination=None, neg_modes=True,
+                        param_derivatives=None, n_threads=None, eim_values_out=None):
 
     """ Takes the fit data (either from splines or GPR), matrix B and computes the 
         interpolated waveform for all modes 
@@ -119,9 +275,13 @@ def all_modes_surrogate(modes, X_input, fit_data_dict_1, fit_data_dict_2, \
                                            this if necessary.
 
         B_dict_1, B_dict_2 : dictionary of the basis matrices obtained from h5 file.
-                             Modes used as keys.
+                             Modes used as keys. The matrices can be replaced by their
+                             compressed form (basis_compression.LowRankBasis).
 
-        fit_func : form of fitting function. options : 'spline_1d' or 'GPR_fits'
+        fit_func : form of fitting function. options : 'spline_1d', 'GPR_fits', 'tabulated_1d'
+                   or 'local_linear' ('tabulated_1d' uses the fit data from 
+                   node_tables.tabulated_fit_data(), 'local_linear' the fit data from
+                   local_emulator.emulated_fit_data())
 
         decomposition_funcs : form of data decomposition function to combine datapieces for 22 and
                               higher modes respectively. e.g. Amp/Phase to full or real/imag to full
@@ -129,39 +289,130 @@ def all_modes_surrogate(modes, X_input, fit_data_dict_1, fit_data_dict_2, \
 
         norm : overall normalization factor to be multiplied to final waveform. This depends on the 
               way the surrogate have been constructed. Mostly norm=1/q or norm=1. 
+
+        profiler : optional common_utils.profiling.StageProfiler recording the time spent in the
+                   'fits', 'matmul' and 'decomposition' stages of each mode. Default: None
+
+        mode_tolerance : if given together with inclination, the modes whose estimated contribution
+                         at this inclination is below mode_tolerance times that of the 22 mode
+                         are skipped (see prune_modes()). Only the node fits of the skipped modes 
+                         are evaluated. Default: None (all modes are evaluated)
+
+        inclination : inclination angle wrt the observer, used with mode_tolerance
+
+        neg_modes : whether the m<0 modes will be added, used with mode_tolerance
+
+        param_derivatives : dictionary {parameter name: {'X_sur': dX_input/dparameter, 
+                            'norm': dnorm/dparameter, ...}}. If given, the derivatives of the
+                            modes with respect to these parameters are computed in the same
+                            pass, using exact derivatives of the node fits and one matmul with
+                            the basis per datapiece for the values and all the derivatives. 
+                            Default: None
+
+        n_threads : if > 1, the node fits and the basis products of the modes are evaluated on
+                    a persistent pool of n_threads threads (see common_utils.mode_parallel). 
+                    Not used with param_derivatives. Default: None (serial evaluation)
+
+        eim_values_out : optional dictionary, filled with {mode: [EIM node values of datapiece 1,
+                         of datapiece 2]} for all the modes up to lmax, e.g. to compute the
+                         error envelopes (common_utils.gpr_uncertainty) without evaluating the
+                         fits again. Default: None
     
     Outputs
     =======
     
-        t_surrogate : time array
         h_surrogate : dictionary of modes  
+        dh_surrogate : dictionary {parameter name: dictionary of mode derivatives}; only 
+                       returned if param_derivatives is given
         
     """
     
+    profiler = profiling.get_profiler(profiler)
+    # load modes only upto l=lmax
+    modes = [mode for mode in modes if mode[0]<=lmax]
+
+    # evaluate the fits of both the datapieces at the eim nodes
+    def evaluate_nodes(mode):
+        with profiler.stage('fits', mode):
+            return [_evaluate_EIM_nodes(X_input, fit_data_dict_1[mode], fit_func),
+                    _evaluate_EIM_nodes(X_input, fit_data_dict_2[mode], fit_func)]
+    eim_values = mode_parallel.map_modes(evaluate_nodes, modes, n_threads)
+    if eim_values_out is not None:
+        eim_values_out.update(eim_values)
+
+    # skip the modes with a negligible contribution
+    if mode_tolerance is not None and inclination is not None:
+        with profiler.stage('pruning'):
+            modes = prune_modes(eim_values, decomposition_funcs, inclination, mode_tolerance,
+                                neg_modes)
+
+    if param_derivatives is not None:
+        return _all_modes_derivatives(modes, X_input, eim_values, fit_data_dict_1, fit_data_dict_2,
+                                      B_dict_1, B_dict_2, fit_func, decomposition_funcs, norm, 
+                                      profiler, param_derivatives)
+
+    def evaluate_mode(mode):
+        # read the decomposition function for the modes; special treatment for the
+        # 22 mode and higher order modes
+        if mode==(2,2):
+            decomposition_func = decomposition_funcs[0]
+        else:
+            decomposition_func = decomposition_funcs[1]
+
+        # combine h_eim and eim basis matrices to give the full datapieces
+        with profiler.stage('matmul', mode):
+            h_approx_datapiece_1 = _EIM_B_to__waveform_datapiece(B_dict_1[mode], eim_values[mode][0])
+            h_approx_datapiece_2 = _EIM_B_to__waveform_datapiece(B_dict_2[mode], eim_values[mode][1])
+
+        # return surrogate modes in coordinate frame it has been modelled.
+        # e.g. for models using the co-orbital frame, the modes are still in the 
+        # co-oorbital frame at this point.
+        return _combine_datapieces(h_approx_datapiece_1, h_approx_datapiece_2,
+                                   decomposition_func, norm, profiler, mode)
+
     # dictionary to save waveform
-    h_approx_dict={}
-    # evaluate all the modes     
-    for mode in modes:
-        (l,m) = mode
-        # load modes only upto l=lmax
-        if l<=lmax:
-            # get the fit data for specific mode for both the datapieces
-            fit_data_1 = fit_data_dict_1[mode]
-            fit_data_2 = fit_data_dict_2[mode]
-            
-            # read the decomposition function for the modes; special treatment for the
-            # 22 mode and higher order modes
-            if mode==(2,2):
-                decomposition_func = decomposition_funcs[0]
-            else:
-                decomposition_func = decomposition_funcs[1]
-    
-            # evaluate surrogate modes
-            # return surrogate modes in coordinate frame it has been modelled.
-            # e.g. for models using the co-orbital frame, the modes are still in the 
-            # co-oorbital frame at this point.
-            h_approx_dict[(mode)] = _evaluate_surrogate_mode(X_input, fit_data_1, fit_data_2, 
-                                                            B_dict_1[(mode)], B_dict_2[(mode)], 
-                                                            fit_func, decomposition_func, norm)
+    h_approx_dict = mode_parallel.map_modes(evaluate_mode, modes, n_threads)
                 
     return h_approx_dict
+
+
+#----------------------------------------------------------------------------------------------------
+def _all_modes_derivatives(modes, X_input, eim_values, fit_data_dict_1, fit_data_dict_2, 
+                           B_dict_1, B_dict_2, fit_func, decomposition_funcs, norm, profiler,
+                           param_derivatives):
+    """ Modes and their derivatives with respect to the parameters of param_derivatives 
+        For information on the inputs, please look at all_modes_surrogate()
+    """
+
+    params = list(param_derivatives.keys())
+    # derivatives of the surrogate parameterization, shape (len(X_input), n_params)
+    dX = np.array([np.atleast_1d(param_derivatives[p]['X_sur']) for p in params]).T
+
+    h_approx_dict = {}
+    dh_approx_dict = {p: {} for p in params}
+    for mode in modes:
+        decomposition_func = decomposition_funcs[0] if mode==(2,2) else decomposition_funcs[1]
+
+        datapieces = []
+        for fit_data, B, eim in [(fit_data_dict_1[mode], B_dict_1[mode], eim_values[mode][0]),
+                                 (fit_data_dict_2[mode], B_dict_2[mode], eim_values[mode][1])]:
+            with profiler.stage('fits', mode):
+                eim_jacobian = _evaluate_EIM_nodes_jacobian(X_input, fit_data, fit_func)
+                # node values and their derivatives along each parameter, (n_nodes, 1+n_params)
+                eim_all = np.column_stack([eim, eim_jacobian @ dX])
+            # a single matmul gives the datapiece and all its derivatives
+            with profiler.stage('matmul', mode):
+                datapieces.append(_EIM_B_to__waveform_datapiece(B, eim_all))
+        [datapiece_1, datapiece_2] = datapieces
+
+        with profiler.stage('decomposition', mode):
+            h_approx = decomposition_func(datapiece_1[:,0], datapiece_2[:,0])
+            h_approx_dict[mode] = np.conj(np.array(h_approx))*norm
+            for i, p in enumerate(params):
+                dh_approx = _decomposition_derivative(decomposition_func, h_approx, datapiece_1[:,0],
+                                                      datapiece_2[:,0], datapiece_1[:,i+1], 
+                                                      datapiece_2[:,i+1])
+                dh_approx_dict[p][mode] = np.conj(dh_approx)*norm \
+                                          + np.conj(h_approx)*param_derivatives[p]['norm']
+
+    return h_approx_dict, dh_approx_dict
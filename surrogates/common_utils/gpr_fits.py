@@ -0,0 +1,83 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : numpy evaluation of the GPR node fits (values and gradients)
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Direct evaluation of the GPR fits of BHPTNRSur2dq1e3 (ConstantKernel*RBF + WhiteKernel on
+normalized data, plus a linear model) from the arrays of load_GPRs.read_gpr_fits(), with the
+gradient with respect to the parameters in closed form.
+"""
+
+import numpy as np
+
+#----------------------------------------------------------------------------------------------------
+def node_arrays(node):
+    """
+    Returns the arrays needed to evaluate the GPR fit of one EIM node as a dictionary with keys
+    X_train, alpha, constant, inv_length_scale, noise_level, y_mean, y_std, data_mean, data_std,
+    coef and intercept. They are computed once and kept in node['_arrays'].
+    """
+    if '_arrays' in node:
+        return node['_arrays']
+
+    gpr_params = node['GPR_params']
+    kernel = gpr_params['kernel_']
+    X_train = np.atleast_2d(gpr_params['X_train_'])
+    n_dim = X_train.shape[1]
+    inv_length_scale = 1.0/np.broadcast_to(np.asarray(kernel['k1__k2__length_scale'], dtype=float),
+                                           (n_dim,))
+    arrays = {'X_train': X_train,
+              'alpha': np.ravel(gpr_params['alpha_']),
+              'constant': float(kernel['k1__k1__constant_value']),
+              'inv_length_scale': inv_length_scale,
+              'noise_level': float(kernel['k2__noise_level']),
+              'y_mean': float(np.ravel(gpr_params['_y_train_mean'])[0]),
+              'y_std': float(np.ravel(gpr_params.get('_y_train_std', 1.0))[0]),
+              'data_mean': float(node['data_mean']),
+              'data_std': float(node['data_std']),
+              'coef': np.ravel(node['lin_reg_params']['coef_']),
+              'intercept': float(np.ravel(node['lin_reg_params']['intercept_'])[0])}
+    node['_arrays'] = arrays
+    return arrays
+
+#----------------------------------------------------------------------------------------------------
+def _rbf(x, arrays):
+    """ scaled differences (n_train, n_dim) and RBF kernel vector (n_train,) at x """
+    diff = (np.asarray(x, dtype=float) - arrays['X_train'])*arrays['inv_length_scale']
+    return diff, np.exp(-0.5*np.einsum('ij,ij->i', diff, diff))
+
+#----------------------------------------------------------------------------------------------------
+def evaluate_node(x, node):
+    """ GPR fit of one EIM node at the parameters x """
+    arrays = node_arrays(node)
+    _, k = _rbf(x, arrays)
+    y_norm = arrays['constant']*(k @ arrays['alpha'])*arrays['y_std'] + arrays['y_mean']
+    return y_norm*arrays['data_std'] + arrays['data_mean'] + np.dot(x, arrays['coef']) \
+        + arrays['intercept']
+
+#----------------------------------------------------------------------------------------------------
+def evaluate_node_gradient(x, node):
+    """ GPR fit of one EIM node and its gradient with respect to x (shape (n_dim,)) """
+    arrays = node_arrays(node)
+    diff, k = _rbf(x, arrays)
+    scale = arrays['constant']*arrays['y_std']*arrays['data_std']
+    weighted = k*arrays['alpha']
+    y = scale*np.sum(weighted) + arrays['y_mean']*arrays['data_std'] + arrays['data_mean'] \
+        + np.dot(x, arrays['coef']) + arrays['intercept']
+    # d/dx exp(-|(x - X_i)/ls|^2/2) = -exp(...) (x - X_i)/ls^2
+    gradient = -scale*(weighted @ diff)*arrays['inv_length_scale'] + arrays['coef']
+    return y, gradient
+
+#----------------------------------------------------------------------------------------------------
+def evaluate_nodes_gradient(x, fit_data):
+    """
+    GPR fits of all EIM nodes of a datapiece and their gradients
+    fit_data : [h_eim_gpr_mode, eim_indicies] as in fits.all_modes_surrogate()
+    Returns the values (n_nodes,) and the gradients (n_nodes, n_dim)
+    """
+    [h_eim_gpr_mode, eim_indicies] = fit_data
+    values, gradients = zip(*[evaluate_node_gradient(x, h_eim_gpr_mode['node%s'%i])
+                              for i in range(len(eim_indicies))])
+    return np.array(values), np.array(gradients)
@@ -0,0 +1,154 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : GPR predictive uncertainty of the node fits and waveform error envelopes
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Predictive standard deviation of the GPR node fits and its propagation to an error envelope
+of the waveform modes (generate_surrogate(..., uncertainty=True) of BHPTNRSur2dq1e3).
+
+The node variance is c + noise - |L^-1 k(x)|^2 (as GaussianProcessRegressor.predict with
+return_std=True); the inverses L^-1 of all nodes of a datapiece are stacked once, zero padded
+to the largest training set. Node errors are treated as independent : the standard deviation
+of a datapiece is sqrt(B^2 sigma^2), evaluated from the factors for a compressed basis. Modes
+combine as sqrt(sigma_A^2 + A^2 sigma_phi^2) (amplitude/phase) or sqrt(sigma_re^2 + sigma_im^2),
+and mode sums add the envelopes of the modes (an upper bound).
+"""
+
+import numpy as np
+from scipy.linalg import solve_triangular
+from . import gpr_fits
+from . import basis_compression
+from . import nr_calibration as nrcalib
+from . import utils
+from . import fits
+from . import start_frequency
+
+#----------------------------------------------------------------------------------------------------
+def _node_stack(fit_data):
+    """ stacked arrays of all the nodes of a datapiece, computed once and kept in the fit
+        data under '_std_stack' """
+    [h_eim_gpr_mode, eim_indicies] = fit_data
+    if '_std_stack' in h_eim_gpr_mode:
+        return h_eim_gpr_mode['_std_stack']
+
+    nodes = [h_eim_gpr_mode['node%s'%i] for i in range(len(eim_indicies))]
+    arrays = [gpr_fits.node_arrays(node) for node in nodes]
+    n_nodes = len(nodes)
+    n_train = max(len(a['X_train']) for a in arrays)
+    n_dim = arrays[0]['X_train'].shape[1]
+
+    X_train = np.zeros((n_nodes, n_train, n_dim))
+    L_inv = np.zeros((n_nodes, n_train, n_train))
+    for i, (node, a) in enumerate(zip(nodes, arrays)):
+        n = len(a['X_train'])
+        X_train[i,:n] = a['X_train']
+        L = np.asarray(node['GPR_params']['L_'], dtype=float)
+        # padded rows and columns of L^-1 are zero, so padded training points do not contribute
+        L_inv[i,:n,:n] = solve_triangular(L, np.eye(n), lower=True)
+    stack = {'X_train': X_train,
+             'inv_length_scale': np.array([a['inv_length_scale'] for a in arrays]),
+             'L_inv': L_inv,
+             'constant': np.array([a['constant'] for a in arrays]),
+             'prior_var': np.array([a['constant'] + a['noise_level'] for a in arrays]),
+             'scale': np.array([a['y_std']*a['data_std'] for a in arrays])}
+    h_eim_gpr_mode['_std_stack'] = stack
+    return stack
+
+#----------------------------------------------------------------------------------------------------
+def node_std(X, fit_data):
+    """
+    Predictive standard deviations (n_nodes,) of the GPR fits of all the EIM nodes of a
+    datapiece at the surrogate parameters X
+
+    fit_data : [h_eim_gpr_mode, eim_indicies] as in fits.all_modes_surrogate()
+    """
+    stack = _node_stack(fit_data)
+    diff = (np.asarray(X, dtype=float) - stack['X_train'])*stack['inv_length_scale'][:,None,:]
+    k = stack['constant'][:,None]*np.exp(-0.5*np.einsum('nij,nij->ni', diff, diff))
+    v = np.einsum('nij,nj->ni', stack['L_inv'], k)
+    var = np.maximum(stack['prior_var'] - np.einsum('ni,ni->n', v, v), 0.0)
+    return np.sqrt(var)*stack['scale']
+
+#----------------------------------------------------------------------------------------------------
+def _squared_basis(fit_data, B):
+    """ element-wise square of a dense basis matrix, computed once and kept in the fit data
+        (recomputed if the basis matrix is replaced) """
+    h_eim_gpr_mode = fit_data[0]
+    cached = h_eim_gpr_mode.get('_B_squared')
+    if cached is None or cached[0] is not B:
+        cached = (B, np.asarray(B)**2)
+        h_eim_gpr_mode['_B_squared'] = cached
+    return cached[1]
+
+#----------------------------------------------------------------------------------------------------
+def datapiece_std(X, fit_data, B, start=0):
+    """ standard deviation of a datapiece at the time samples from index start on, from the
+        node standard deviations assumed independent """
+    variance = node_std(X, fit_data)**2
+    if isinstance(B, basis_compression.LowRankBasis):
+        right = B.right[:,start:]
+        weighted = np.dot(B.left.T*variance, B.left)
+        return np.sqrt(np.maximum(np.sum(right*np.dot(weighted, right), axis=0), 0.0))
+    return np.sqrt(np.dot(_squared_basis(fit_data, B)[:,start:].T, variance))
+
+#----------------------------------------------------------------------------------------------------
+def error_envelopes(X_sur, X_calib, modes, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2,
+                    kinds, norm, alpha_coeffs, alpha_beta_functional_form, calibrated, M_tot,
+                    dist_mpc, orb_phase, inclination, neg_modes, mode_sum, lmax, eim_values,
+                    start=0):
+    """
+    Error envelopes of the waveform modes from the GPR predictive uncertainty; see the
+    description at the top of this module
+
+    Inputs
+    ======
+        X_sur, X_calib, modes, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, norm,
+        alpha_coeffs, alpha_beta_functional_form, calibrated, M_tot, dist_mpc, orb_phase,
+        inclination, neg_modes, mode_sum, lmax : as in model_utils.eval_surrogates.evaluate_surrogate()
+        kinds : dictionary {mode: 'amp_phase' or 'coorbital_re_im'} giving the datapieces of
+                each mode
+        eim_values : dictionary {mode: [EIM node values of datapiece 1, of datapiece 2]} of the
+                     waveform, see fits.all_modes_surrogate()
+        start : index of the first time sample of the waveform (e.g. with f_low). Default: 0
+
+    Outputs
+    =======
+        h_err : dictionary {mode: envelope} with the keys of the waveform modes, or the
+                envelope of the mode-summed waveform; envelopes are real arrays on the time
+                grid of the surrogate from index start on
+    """
+    modes = [mode for mode in modes if mode[0] <= lmax]
+    on_sphere = M_tot is not None and dist_mpc is not None and orb_phase is not None \
+                and inclination is not None
+    h_unit = utils.geo_to_SI_units(M_tot, dist_mpc)[1] if M_tot is not None else 1.0
+
+    h_err = {}
+    for mode in modes:
+        (l,m) = mode
+        sigma_1 = datapiece_std(X_sur, fit_data_dict_1[mode], B_dict_1[mode], start)
+        sigma_2 = datapiece_std(X_sur, fit_data_dict_2[mode], B_dict_2[mode], start)
+        if kinds[mode] == 'amp_phase':
+            amp = fits._EIM_B_to__waveform_datapiece(
+                        start_frequency._basis_columns(B_dict_1[mode], start), eim_values[mode][0])
+            error = np.sqrt(sigma_1**2 + (amp*sigma_2)**2)
+        else:
+            error = np.sqrt(sigma_1**2 + sigma_2**2)
+
+        scale = np.abs(norm)*h_unit
+        if calibrated:
+            scale *= np.abs(nrcalib.evaluate_alpha(X_calib, l, alpha_coeffs,
+                                                   alpha_beta_functional_form))
+        weights = {(l,m): 1.0}
+        if neg_modes:
+            weights[(l,-m)] = 1.0
+        if on_sphere:
+            weights = {(ll,mm): np.abs(utils._sYlm(-2, ll=ll, mm=mm, theta=inclination,
+                                                   phi=orb_phase)) for (ll,mm) in weights}
+        for key, weight in weights.items():
+            h_err[key] = scale*weight*error
+
+    if mode_sum and on_sphere:
+        return sum(h_err.values())
+    return h_err
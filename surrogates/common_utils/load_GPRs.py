@@ -19,16 +19,17 @@ from . import load_splines
 from . import utils
 
 #----------------------------------------------------------------------------------------------------
-def read_times(file):
+def read_times(file, spin_signs=['negative_spin', 'positive_spin']):
     """
     Read fit info / time keeping in mind that there are two sub-surrogates
     for the negative spin and positive spin cases
     file: h5file opened in h5py with read mode
+    spin_signs: sub-surrogates to read the times for
     """
     times = {}
-    for spin_sign in ['negative_spin', 'positive_spin']:
+    for spin_sign in spin_signs:
         # same times for all modes
-        times[spin_sign] = copy.deepcopy(file[spin_sign]["l2_m2"]["times"][()])
+        times[spin_sign] = file[spin_sign]["l2_m2"]["times"][()]
     return times
 
 #----------------------------------------------------------------------------------------------------
@@ -115,26 +116,93 @@ def extract_h5filegprsettings_to_emptydict(h_gpr, h_file, nnodes):
                         
 
 #----------------------------------------------------------------------------------------------------
-def load_surrogate(h5_data_dir, fname, wf_modes, nrcalib_modes):
+# datasets read for every EIM node; the same settings are copied by 
+# extract_h5filegprsettings_to_emptydict()
+_kernel_k1_keys = ['name', 'k1__constant_value', 'k1__constant_value_bounds', 'k2__length_scale', 
+                   'k2__length_scale_bounds']
+_gpr_node_datasets = ['data_mean', 'data_std'] \
+    + ['lin_reg_params/%s'%key for key in ['coef_', 'intercept_']] \
+    + ['GPR_params/%s'%key for key in ['X_train_', 'alpha_', '_y_train_mean', 'L_']] \
+    + ['GPR_params/kernel_/%s'%key for key in ['name', 'k2__noise_level', 'k2__noise_level_bounds', 
+                                               'k1__k2__length_scale', 'k1__k2__length_scale_bounds', 
+                                               'k1__k1__constant_value', 'k1__k1__constant_value_bounds']] \
+    + ['GPR_params/kernel_/k1/%s'%key for key in _kernel_k1_keys] \
+    + ['GPR_params/kernel_/%s/%s'%(kernel, key) for kernel in ['k1/k1', 'k1__k1'] 
+       for key in ['name', 'constant_value', 'constant_value_bounds']] \
+    + ['GPR_params/kernel_/%s/%s'%(kernel, key) for kernel in ['k1/k2', 'k1__k2'] 
+       for key in ['name', 'length_scale', 'length_scale_bounds']] \
+    + ['GPR_params/kernel_/k2/%s'%key for key in ['name', 'noise_level', 'noise_level_bounds']]
+_gpr_node_datasets = set(_gpr_node_datasets)
+
+#----------------------------------------------------------------------------------------------------
+def _read_dataset(group_id, name):
+    """
+    Reads a dataset with the low level h5py interface, bypassing the (costly for thousands
+    of tiny datasets) high level Dataset objects. Returns the same as group[name][()].
+    """
+    dataset_id = h5py.h5d.open(group_id, name)
+    data = np.empty(dataset_id.shape, dtype=dataset_id.dtype)
+    dataset_id.read(h5py.h5s.ALL, h5py.h5s.ALL, data)
+    return data[()]
+
+#----------------------------------------------------------------------------------------------------
+def read_gpr_fits(h_file):
+    """
+    Bulk read of the GPR settings of all nodes of an amplitude/phase fit group.
+    Equivalent to calling extract_h5filegprsettings_to_emptydict() for all nodes, but the 
+    group is traversed once (without opening the intermediate groups), freshly read arrays
+    are not copied again and strings are decoded vectorially.
+    h_file: group in the h5 file containing all GPR settings (e.g. f_mode['gpr_amp'])
+    Returns the dictionary {'node0': {...}, 'node1': {...}, ...}
+    """
+    fit_type = utils.chars_to_string(h_file['fitType'][()])
+    group_id = h_file.id
+    h_gpr = {}
+
+    def copy_dataset(name, info):
+        if info.type != h5py.h5o.TYPE_DATASET:
+            return
+        node, _, key = name.decode().partition('/')
+        if key not in _gpr_node_datasets:
+            return
+        # walk down the nested dictionaries of the node
+        target = h_gpr.setdefault(node, {'fitType': fit_type})
+        *groups, dataset = key.split('/')
+        for group in groups:
+            target = target.setdefault(group, {})
+        data = _read_dataset(group_id, name)
+        if dataset == 'name':
+            target[dataset] = utils.chars_to_string(data)
+        else:
+            target[dataset] = data
+
+    h5py.h5o.visit(group_id, copy_dataset, info=True)
+    return h_gpr
+
+#----------------------------------------------------------------------------------------------------
+def load_surrogate(h5_data_dir, fname, wf_modes, nrcalib_modes, 
+                   spin_signs=['negative_spin', 'positive_spin']):
     """ Loads all GPR interpolation data
             - Included modes = [(2,1),(3,1),(2,2),(3,2),(4,2),(3,3),(4,3),(4,4)]
             - NOTE: Requires h5 file to be in the same directory as this script.
+            - spin_signs: sub-surrogates to load; each of them can be loaded independently
+                          e.g. spin_signs=['positive_spin'] only reads the positive spin fits
             - Returns:
                 - times, eim_indicies_amp, eim_indicies_ph, b_amp, b_ph, h_amp_gpr, h_ph_gpr
-                - NOTE: times is dictionary with times.keys() = ['negative_spin', 'positive_spin']
+                - NOTE: times is dictionary with times.keys() = spin_signs
     """
     
     with h5py.File('%s/%s'%(h5_data_dir,fname), 'r') as file:
         
         # obtain training time values
-        times = read_times(file)
+        times = read_times(file, spin_signs)
         
         # dicts to copy .h5 file data into (needed for surrogate generation)
         # Now for 2d surrogae each of dictionary will contain data for positive and negative spins 
         B_dict_amp, B_dict_ph = {}, {}
         fit_data_dict_amp, fit_data_dict_ph = {}, {}
         
-        for spin_sign in ['negative_spin', 'positive_spin']:
+        for spin_sign in spin_signs:
             
             # empty dictionaries for holding basis vectors, EIM info and GPR settings
             B_dict_amp[spin_sign] = {}
@@ -147,21 +215,18 @@ def load_surrogate(h5_data_dir, fname, wf_modes, nrcalib_modes):
                 
                 # splice out the relevant dictionary from h5 file for each mode
                 f_mode = file[spin_sign]['l%s_m%s'%(mode[0], mode[1])]
-                # obtain data groups for the amplitude and phases
-                h_amp_file, h_ph_file = dict(f_mode['gpr_amp']), dict(f_mode['gpr_phase'])
 
                 # basis matrix
-                B_dict_amp[spin_sign][mode] = copy.deepcopy(f_mode["B_amp"][()])
-                B_dict_ph[spin_sign][mode] = copy.deepcopy(f_mode["B_phase"][()])
+                B_dict_amp[spin_sign][mode] = f_mode["B_amp"][()]
+                B_dict_ph[spin_sign][mode] = f_mode["B_phase"][()]
                 
                 # EIM indicies
-                eim_indicies_amp = copy.deepcopy(f_mode["eim_indicies_amp"][()])
-                eim_indicies_ph = copy.deepcopy(f_mode["eim_indicies_phase"][()])
+                eim_indicies_amp = f_mode["eim_indicies_amp"][()]
+                eim_indicies_ph = f_mode["eim_indicies_phase"][()]
                 
                 # GPR settings
-                h_eim_gpr_amp, h_eim_gpr_ph = {}, {}
-                extract_h5filegprsettings_to_emptydict(h_eim_gpr_amp, h_amp_file, len(eim_indicies_amp))
-                extract_h5filegprsettings_to_emptydict(h_eim_gpr_ph, h_ph_file, len(eim_indicies_ph))
+                h_eim_gpr_amp = read_gpr_fits(f_mode['gpr_amp'])
+                h_eim_gpr_ph = read_gpr_fits(f_mode['gpr_phase'])
                         
                 # construct fit data for each mode
                 fit_data_dict_amp[spin_sign][mode] = [h_eim_gpr_amp, eim_indicies_amp]
@@ -0,0 +1,133 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : local linearised emulation of the EIM node fits for MCMC sampling
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Local Taylor emulation of the EIM node values for MCMC chains : a LocalNodeEmulator keeps the
+most recent full evaluations (anchors) with their node values and jacobians, and within the
+trust radius of an anchor uses v(X) = v(X_a) + J(X_a) (X - X_a). Every check_every-th step is
+checked against a full evaluation; a failed check (absolute node error above tol) halves the
+trust radius, recover_after passed checks in a row double it again. Used through
+fit_func='local_linear', e.g. BHPTNRSur2dq1e3.enable_local_emulator().
+"""
+
+import threading
+import numpy as np
+from . import fits
+
+#----------------------------------------------------------------------------------------------------
+class LocalNodeEmulator:
+    """
+    Local linearised emulation of the node fits of one datapiece; see the description at the
+    top of this module
+
+    Inputs
+    ======
+        fit_data, fit_func : fit data and fit type of the datapiece, as in
+                             fits.all_modes_surrogate()
+        trust_radius : largest scaled distance to an anchor for a Taylor step
+        scales : scales of the parameters X (default: 1)
+        max_anchors : number of anchors kept (the oldest are dropped)
+        check_every : a Taylor step out of check_every is checked (None or 0: no checks)
+        tol : tolerance on the absolute error of the checked node values
+        recover_after : number of passed checks in a row after which a halved trust radius is
+                        doubled
+    """
+
+    def __init__(self, fit_data, fit_func, trust_radius, scales=None, max_anchors=32,
+                 check_every=100, tol=1e-4, recover_after=10):
+        self.fit_data = fit_data
+        self.fit_func = fit_func
+        self.trust_radius = trust_radius
+        self.max_trust_radius = trust_radius
+        self.recover_after = recover_after
+        self.scales = None if scales is None else np.asarray(scales, dtype=float)
+        self.max_anchors = max_anchors
+        self.check_every = check_every
+        self.tol = tol
+        self.stats = {'taylor': 0, 'full': 0, 'checks': 0, 'failed_checks': 0,
+                      'max_checked_error': 0.0}
+        self._X = []
+        self._values = []
+        self._jacobians = []
+        self._passed_checks = 0
+        self._lock = threading.Lock()
+
+    def _scaled(self, X):
+        X = np.atleast_1d(np.asarray(X, dtype=float))
+        return X if self.scales is None else X/self.scales
+
+    def _full(self, X):
+        """ full evaluation of the node values and their derivatives at X, kept as the most
+            recent anchor """
+        values, jacobian = fits._evaluate_EIM_nodes_and_jacobian(X, self.fit_data, self.fit_func)
+        values = np.asarray(values, dtype=float)
+        self._X.append(self._scaled(X))
+        self._values.append(values)
+        self._jacobians.append(np.asarray(jacobian, dtype=float).reshape(len(values), -1))
+        if len(self._X) > self.max_anchors:
+            del self._X[0], self._values[0], self._jacobians[0]
+        self.stats['full'] += 1
+        return values
+
+    def __call__(self, X):
+        """ node values of the datapiece at X """
+        x = self._scaled(X)
+        with self._lock:
+            if not self._X:
+                return self._full(X)
+            distances = np.linalg.norm(np.array(self._X) - x, axis=1)
+            a = int(np.argmin(distances))
+            if distances[a] > self.trust_radius:
+                return self._full(X)
+
+            dX = (x - self._X[a]) if self.scales is None else (x - self._X[a])*self.scales
+            values = self._values[a] + self._jacobians[a] @ dX
+            self.stats['taylor'] += 1
+            if self.check_every and self.stats['taylor'] % self.check_every == 0:
+                exact = np.asarray(fits._evaluate_EIM_nodes(X, self.fit_data, self.fit_func))
+                error = np.max(np.abs(values - exact))
+                self.stats['checks'] += 1
+                self.stats['max_checked_error'] = max(self.stats['max_checked_error'], error)
+                if error > self.tol:
+                    self.stats['failed_checks'] += 1
+                    self.trust_radius /= 2
+                    self._passed_checks = 0
+                    # the point becomes an anchor (counted as a full evaluation)
+                    return self._full(X)
+                self._passed_checks += 1
+                if self._passed_checks >= self.recover_after \
+                   and self.trust_radius < self.max_trust_radius:
+                    self.trust_radius = min(2*self.trust_radius, self.max_trust_radius)
+                    self._passed_checks = 0
+            return values
+
+    def reset(self):
+        """ drops the anchors (e.g. after the fit data was changed) """
+        with self._lock:
+            self._X, self._values, self._jacobians = [], [], []
+
+#----------------------------------------------------------------------------------------------------
+def emulated_fit_data(fit_data_dict, fit_func, trust_radius, scales=None, max_anchors=32,
+                      check_every=100, tol=1e-4, recover_after=10):
+    """ fit data {mode: LocalNodeEmulator} of one datapiece of all the modes, to be used with
+        fit_func='local_linear'; the other inputs are those of LocalNodeEmulator """
+    return {mode: LocalNodeEmulator(fit_data, fit_func, trust_radius, scales, max_anchors,
+                                    check_every, tol, recover_after)
+            for mode, fit_data in fit_data_dict.items()}
+
+#----------------------------------------------------------------------------------------------------
+def emulator_stats(*fit_data_dicts):
+    """ stats of the emulators of the given emulated fit data, added over the datapieces and
+        modes (the largest checked error is the largest over all of them) """
+    total = {'taylor': 0, 'full': 0, 'checks': 0, 'failed_checks': 0, 'max_checked_error': 0.0}
+    for fit_data_dict in fit_data_dicts:
+        for emulator in fit_data_dict.values():
+            for key, value in emulator.stats.items():
+                if key == 'max_checked_error':
+                    total[key] = max(total[key], value)
+                else:
+                    total[key] += value
+    return total
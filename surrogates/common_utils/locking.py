@@ -0,0 +1,77 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : inter-process file locks
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+    import msvcrt
+
+#----------------------------------------------------------------------------------------------------
+class FileLock:
+    """
+    Exclusive advisory lock on a lock file, shared between processes (and threads using
+    different FileLock objects). Used as a context manager :
+
+        with FileLock('/path/to/file.lock'):
+            ...
+
+    Inputs
+    ======
+        lock_file : path of the lock file; created if it does not exist and never removed
+        timeout : maximum time in seconds to wait for the lock; None waits forever
+        poll_interval : time in seconds between two attempts to take the lock
+    """
+
+    def __init__(self, lock_file, timeout=None, poll_interval=0.1):
+        self.lock_file = lock_file
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd = None
+
+    def _try_lock(self, fd):
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def acquire(self):
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        t_start = time.monotonic()
+        while not self._try_lock(fd):
+            if self.timeout is not None and time.monotonic() - t_start > self.timeout:
+                os.close(fd)
+                raise TimeoutError("could not acquire the lock %s within %s seconds"
+                                   %(self.lock_file, self.timeout))
+            time.sleep(self.poll_interval)
+        self._fd = fd
+
+    def release(self):
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
@@ -0,0 +1,147 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : memory footprint of the loaded models and of a waveform evaluation
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Memory held by a loaded model (arrays per mode) and used while evaluating one waveform
+(measured with tracemalloc on a probe evaluation), to size the memory of workers:
+
+    report = BHPTNRSur1dq1e4.memory_inventory()
+    BHPTNRSur1dq1e4.working_set(M_tot=60, dist_mpc=100, orb_phase=0, inclination=1, mode_sum=True)
+
+Shared buffers and views are counted once; Python objects other than arrays are not counted.
+"""
+
+import tracemalloc
+import numpy as np
+from . import basis_compression
+
+#----------------------------------------------------------------------------------------------------
+def _arrays(obj, name):
+    """ yields (name, array) of the numpy arrays in nested dictionaries, lists, tuples and
+        compressed bases; name is the key of the array or of its closest named container """
+    if isinstance(obj, np.ndarray):
+        yield name, obj
+    elif isinstance(obj, basis_compression.LowRankBasis):
+        yield 'left', obj.left
+        yield 'right', obj.right
+    elif isinstance(obj, dict):
+        for key, value in obj.items():
+            yield from _arrays(value, key if isinstance(key, str) else name)
+    elif isinstance(obj, tuple) and len(obj) == 3 and isinstance(obj[2], (int, np.integer)):
+        # (knots, coefficients, degree) of a scipy spline
+        yield 'knots', np.asarray(obj[0])
+        yield 'coefficients', np.asarray(obj[1])
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            yield from _arrays(value, name)
+
+#----------------------------------------------------------------------------------------------------
+def _buffer(array):
+    """ identifies the memory of an array : address of its first element and size """
+    return (array.__array_interface__['data'][0], array.nbytes)
+
+#----------------------------------------------------------------------------------------------------
+def array_report(obj, seen=None, name='array'):
+    """
+    Arrays held by an object (array, compressed basis, fit data, ...)
+
+    Inputs
+    ======
+        obj : object to inspect
+        seen : set of the buffers already counted (updated), to count shared arrays once
+        name : name of the arrays that are not stored under a key
+
+    Outputs
+    =======
+        report : dictionary {'count': number of arrays, 'bytes': bytes not counted before,
+                 'arrays': list of {'name', 'shape', 'dtype', 'count', 'bytes'} grouping the
+                 arrays of the same name, shape and dtype}
+    """
+    if seen is None:
+        seen = set()
+    groups = {}
+    count, nbytes = 0, 0
+    for name, array in _arrays(obj, name):
+        buffer = _buffer(array)
+        new_bytes = 0 if buffer in seen else array.nbytes
+        seen.add(buffer)
+        group = groups.setdefault((name, array.shape, array.dtype.str),
+                                  {'name': name, 'shape': array.shape, 'dtype': str(array.dtype),
+                                   'count': 0, 'bytes': 0})
+        group['count'] += 1
+        group['bytes'] += new_bytes
+        count += 1
+        nbytes += new_bytes
+    return {'count': count, 'bytes': nbytes, 'arrays': list(groups.values())}
+
+#----------------------------------------------------------------------------------------------------
+def inventory(time, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, seen=None):
+    """
+    Arrays of a (sub-)surrogate, per mode
+
+    Inputs
+    ======
+        time, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2 : data of the surrogate as
+                                                                     loaded by the models
+        seen : set of the buffers already counted (updated)
+
+    Outputs
+    =======
+        report : dictionary {'modes': {mode: {'fits_1', 'fits_2', 'basis_1', 'basis_2', 'count',
+                 'bytes'}}, 'time': report of the time array, 'count', 'bytes'} where the
+                 entries of the modes are reports of array_report()
+    """
+    if seen is None:
+        seen = set()
+    report = {'modes': {}, 'time': array_report(np.asarray(time), seen, 'time')}
+    for mode in fit_data_dict_1.keys():
+        mode_report = {'fits_1': array_report(fit_data_dict_1[mode], seen),
+                       'fits_2': array_report(fit_data_dict_2[mode], seen),
+                       'basis_1': array_report(B_dict_1[mode], seen, 'B'),
+                       'basis_2': array_report(B_dict_2[mode], seen, 'B')}
+        parts = list(mode_report.values())
+        mode_report['count'] = sum(r['count'] for r in parts)
+        mode_report['bytes'] = sum(r['bytes'] for r in parts)
+        report['modes'][mode] = mode_report
+    report['count'] = report['time']['count'] + sum(r['count'] for r in report['modes'].values())
+    report['bytes'] = report['time']['bytes'] + sum(r['bytes'] for r in report['modes'].values())
+    return report
+
+#----------------------------------------------------------------------------------------------------
+def measure_working_set(func, *args, **kwargs):
+    """ largest memory allocated (tracemalloc) while calling func(*args, **kwargs), e.g.
+        measure_working_set(BHPTNRSur1dq1e4.generate_surrogate, q=8); returns (peak bytes,
+        output of func) """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    try:
+        output = func(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1] - start
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return peak, output
+
+#----------------------------------------------------------------------------------------------------
+def probe_working_set(func, *args, **kwargs):
+    """
+    Memory allocated by one call of func(*args, **kwargs) (e.g. generate_surrogate() at a
+    reference point, with the options of interest), in addition to the loaded data (see
+    inventory()). func is called once beforehand so that the caches filled on first use (e.g.
+    the evaluation arrays of the GPR nodes) are not counted. The memory depends on the options
+    and on the number of time samples, not on the point at which the waveform is evaluated.
+
+    Outputs
+    =======
+        working_set : dictionary {'peak_bytes': largest memory in use (measure_working_set()),
+                      'output_bytes': memory of the returned arrays}
+    """
+    func(*args, **kwargs)
+    peak, output = measure_working_set(func, *args, **kwargs)
+    return {'peak_bytes': peak, 'output_bytes': array_report(output)['bytes']}
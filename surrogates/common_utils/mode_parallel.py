@@ -0,0 +1,85 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : evaluation of the modes of one waveform on a persistent thread pool
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Pools of threads evaluating the work of each mode in parallel (generate_surrogate(...,
+n_threads=N)). While they run, BLAS is limited to one thread if threadpoolctl is installed.
+"""
+
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# persistent pools {n_threads: ThreadPoolExecutor}
+_pools = {}
+_pools_lock = threading.Lock()
+
+# threadpoolctl controller, looked up once; False if threadpoolctl is not installed
+_blas_controller = None
+# limiter shared by the concurrent callers of map_modes() and their number
+_blas_lock = threading.Lock()
+_blas_limiter = None
+_blas_users = 0
+
+#----------------------------------------------------------------------------------------------------
+def get_pool(n_threads):
+    """ persistent thread pool with n_threads threads """
+    pool = _pools.get(n_threads)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(n_threads)
+            if pool is None:
+                pool = ThreadPoolExecutor(max_workers=n_threads,
+                                          thread_name_prefix='bhptnrsur-modes-%d'%n_threads)
+                _pools[n_threads] = pool
+    return pool
+
+#----------------------------------------------------------------------------------------------------
+@contextlib.contextmanager
+def _blas_limit():
+    """ context manager limiting BLAS to one thread (does nothing without threadpoolctl).
+        threadpoolctl limits are process-wide and cannot be nested across threads : the limit
+        is applied by the first caller and restored by the last one """
+    global _blas_controller, _blas_limiter, _blas_users
+    with _blas_lock:
+        if _blas_controller is None:
+            try:
+                from threadpoolctl import ThreadpoolController
+                _blas_controller = ThreadpoolController()
+            except ImportError:
+                _blas_controller = False
+        if _blas_controller is not False:
+            if _blas_users == 0:
+                _blas_limiter = _blas_controller.limit(limits=1, user_api='blas')
+            _blas_users += 1
+    if _blas_controller is False:
+        yield
+        return
+    try:
+        yield
+    finally:
+        with _blas_lock:
+            _blas_users -= 1
+            if _blas_users == 0:
+                _blas_limiter.restore_original_limits()
+                _blas_limiter = None
+
+#----------------------------------------------------------------------------------------------------
+def map_modes(func, modes, n_threads=None):
+    """
+    {mode: func(mode)} for all modes (in the order of modes), evaluated on the persistent pool
+    of n_threads threads if n_threads > 1 and serially otherwise. Exceptions raised by func are
+    raised again here.
+    """
+    if n_threads is None or n_threads <= 1 or len(modes) <= 1:
+        return {mode: func(mode) for mode in modes}
+    if int(n_threads) != n_threads:
+        raise ValueError("n_threads must be an integer")
+
+    pool = get_pool(int(n_threads))
+    with _blas_limit():
+        futures = [pool.submit(func, mode) for mode in modes]
+        return {mode: future.result() for mode, future in zip(modes, futures)}
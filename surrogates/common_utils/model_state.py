@@ -0,0 +1,159 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : serialization of the loaded data of the models for worker processes
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+A ModelState holds the data a model loaded from its h5 file, so that it can be sent to worker
+processes instead of reading and hashing the file again in each of them:
+
+    state = BHPTNRSur1dq1e4.get_state()
+    with ProcessPoolExecutor(initializer=model_state.install, initargs=(state,)) as executor:
+        ...
+
+install() makes the models of a process use the state; unpickling or loading a state does not
+install it. dumps() pickles the arrays as out-of-band buffers; save() / load_state() write and
+memory map a file, and a mapped state is pickled as its path. Cached evaluation arrays and the
+settings of compress_basis(), enable_node_table() and enable_local_emulator() are not included.
+"""
+
+import sys
+import pickle
+import struct
+import threading
+import numpy as np
+
+# file layout : magic, number of buffers, size of the pickle, then the pickle and the buffers,
+# each one starting at a multiple of _ALIGNMENT bytes; the offsets and sizes of the buffers
+# follow the header
+_MAGIC = b'BHPTSTAT'
+_ALIGNMENT = 64
+
+# keys under which arrays are cached in the fit data during evaluations : GPR node arrays
+# (gpr_fits.node_arrays()), stacked node arrays and squared basis matrices (gpr_uncertainty)
+_cache_keys = ('_arrays', '_std_stack', '_B_squared')
+
+# installed states {model name: ModelState}
+_installed = {}
+_installed_lock = threading.Lock()
+
+#----------------------------------------------------------------------------------------------------
+class ModelState:
+    """
+    Loaded data of a model; see the description at the top of this module
+
+    Inputs
+    ======
+        model_name : name of the model module, e.g. 'BHPTNRSur1dq1e4'
+        data : dictionary of the loaded data, as returned by the get_state() of the model
+        h5_hash : hash of the h5 file the data was read from
+        path : file the state was loaded from (see save()), None otherwise
+    """
+
+    def __init__(self, model_name, data, h5_hash, path=None):
+        self.model_name = model_name
+        self.data = data
+        self.h5_hash = h5_hash
+        self.path = path
+
+    def __reduce__(self):
+        if self.path is not None:
+            return (load_state, (self.path,))
+        return (ModelState, (self.model_name, self.data, self.h5_hash))
+
+    def save(self, path):
+        """ writes the state to path; returns the state mapped from the file """
+        stream, buffers = dumps(self)
+        with open(path, 'wb') as f:
+            offsets = []
+            position = _header_size(len(buffers)) + len(stream)
+            for buffer in buffers:
+                position = -(-position//_ALIGNMENT)*_ALIGNMENT
+                offsets.append(position)
+                position += buffer.raw().nbytes
+            f.write(_MAGIC + struct.pack('<QQ', len(buffers), len(stream)))
+            for offset, buffer in zip(offsets, buffers):
+                f.write(struct.pack('<QQ', offset, buffer.raw().nbytes))
+            f.write(stream)
+            for offset, buffer in zip(offsets, buffers):
+                f.seek(offset)
+                f.write(buffer.raw())
+        return load_state(path)
+
+    @property
+    def nbytes(self):
+        """ bytes of the arrays of the state """
+        return sum(buffer.raw().nbytes for buffer in dumps(self)[1])
+
+#----------------------------------------------------------------------------------------------------
+def without_caches(data):
+    """ copy of nested dictionaries and lists (e.g. fit data) without the arrays cached during
+        evaluations (see _cache_keys); the other values and the arrays are not copied """
+    if isinstance(data, dict):
+        return {key: without_caches(value) for key, value in data.items()
+                if key not in _cache_keys}
+    if type(data) in (list, tuple):
+        return type(data)(without_caches(value) for value in data)
+    return data
+
+#----------------------------------------------------------------------------------------------------
+def _header_size(n_buffers):
+    return len(_MAGIC) + 16 + 16*n_buffers
+
+#----------------------------------------------------------------------------------------------------
+def dumps(state):
+    """ pickle (protocol 5) of a state with its arrays as out-of-band buffers; returns the
+        pickle and the list of pickle.PickleBuffer (see loads()) """
+    buffers = []
+    # the data is pickled rather than the state, which may be pickled as its path
+    stream = pickle.dumps((state.model_name, state.data, state.h5_hash), protocol=5,
+                          buffer_callback=buffers.append)
+    return stream, buffers
+
+#----------------------------------------------------------------------------------------------------
+def loads(stream, buffers):
+    """ state from the output of dumps(); buffers can be any objects exposing the buffers
+        (e.g. bytes or memoryviews received from another process) """
+    model_name, data, h5_hash = pickle.loads(stream, buffers=buffers)
+    return ModelState(model_name, data, h5_hash)
+
+#----------------------------------------------------------------------------------------------------
+def load_state(path):
+    """ state written by ModelState.save(), with its arrays mapped from the file (read-only) """
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    if bytes(mapped[:len(_MAGIC)]) != _MAGIC:
+        raise ValueError("%s is not a model state file"%path)
+    n_buffers, n_stream = struct.unpack('<QQ', bytes(mapped[len(_MAGIC):len(_MAGIC)+16]))
+    table = np.frombuffer(mapped, dtype='<u8', count=2*n_buffers,
+                          offset=len(_MAGIC) + 16).reshape(-1, 2)
+    start = _header_size(n_buffers)
+    stream = bytes(mapped[start:start + n_stream])
+    buffers = [memoryview(mapped[offset:offset + size]) for offset, size in table]
+    state = loads(stream, buffers)
+    state.path = path
+    return state
+
+#----------------------------------------------------------------------------------------------------
+def install(state):
+    """ installs a state : used by the model when it is imported, or given to the model right
+        away if it is already imported """
+    with _installed_lock:
+        _installed[state.model_name] = state
+    for name in (state.model_name, 'surrogates.' + state.model_name):
+        module = sys.modules.get(name)
+        if module is not None and hasattr(module, '_install_state'):
+            module._install_state(state)
+
+#----------------------------------------------------------------------------------------------------
+def installed(model_name, h5_hash):
+    """ data of the state installed for a model (None if there is none); raises a ValueError
+        if it does not come from the h5 file with hash h5_hash """
+    with _installed_lock:
+        state = _installed.get(model_name)
+    if state is None:
+        return None
+    if state.h5_hash != h5_hash:
+        raise ValueError("the installed state of %s comes from another version of its h5 file"
+                         %model_name)
+    return state.data
@@ -0,0 +1,293 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : multibanded frequency-domain output and likelihood weights
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Multibanded frequency-domain inner products of long waveforms : the frequencies are split into
+bands (octaves by default) and each band is transformed from the tapered part of the modes
+radiating in it, sampled only as finely as the band needs. The data side is precomputed once
+per band (Morisaki 2021, arXiv:2104.07813).
+
+    layout = MultibandLayout(t, h, duration=64, t_data_start=-60, f_min=20)
+    w, v = layout.data_weights(d_f, psd_f), layout.hh_weights(psd_f)
+    bands = layout.transform(t, h).polarizations(inclination, orb_phase)
+    s = [F_plus*hp + F_cross*hc for hp, hc in bands]
+    log_l = inner_product(w, s) - 0.5*norm_squared(v, s)
+
+The layout is fixed by a reference waveform; build it from the longest waveform of a run.
+"""
+
+import numpy as np
+import scipy.fft
+from scipy.interpolate import CubicSpline
+from . import utils
+
+#----------------------------------------------------------------------------------------------------
+def frequency_22(t, h22):
+    """ frequency of the (2,2) mode at the times t, from its unwrapped phase; made
+        non-decreasing so that each frequency is reached at a single time """
+    phase = np.unwrap(np.angle(h22))
+    freq = np.abs(CubicSpline(t, phase)(t, 1))/(2*np.pi)
+    return np.maximum.accumulate(freq)
+
+#----------------------------------------------------------------------------------------------------
+def band_edges(f_min, f_max, ratio=2.0):
+    """ frequency edges f_min, ratio f_min, ratio^2 f_min, ..., f_max """
+    edges = [f_min]
+    while edges[-1]*ratio < f_max*(1 - 1e-12):
+        edges.append(edges[-1]*ratio)
+    edges.append(f_max)
+    return np.array(edges)
+
+#----------------------------------------------------------------------------------------------------
+def _crossing_time(t, freq, f):
+    """ first time at which the non-decreasing freq reaches f (None if it never does) """
+    index = np.searchsorted(freq, f)
+    if index == len(t):
+        return None
+    return t[index]
+
+#----------------------------------------------------------------------------------------------------
+def _segment_times(t, freq, f_low, f_high, margin, cycles):
+    """ times (t_0, t_1, t_2, t_3) of the part of a mode of frequency freq(t) in the band
+        [f_low, f_high) : complete over the band and its relative frequency margin [t_1, t_2],
+        and tapered over [t_0, t_1] and [t_2, t_3], which span another margin and at least
+        cycles/f_low; None if the mode does not reach the band """
+    t_0 = _crossing_time(t, freq, f_low*(1 - 2*margin))
+    if t_0 is None:
+        return None
+    times = [_crossing_time(t, freq, f) for f in (f_low*(1 - margin), f_high*(1 + margin),
+                                                  f_high*(1 + 2*margin))]
+    t_1, t_2, t_3 = [t[-1] if time is None else time for time in times]
+    taper = cycles/f_low
+    return max(min(t_0, t_1 - taper), t[0]), t_1, t_2, min(max(t_3, t_2 + taper), t[-1])
+
+#----------------------------------------------------------------------------------------------------
+def _taper(times, t_0, t_1, rising):
+    """ sin^2 ramp from 0 to 1 over [t_0, t_1] (or from 1 to 0 if not rising) """
+    if t_1 <= t_0:
+        x = (times >= t_0).astype(float)
+    else:
+        x = np.sin(0.5*np.pi*np.clip((times - t_0)/(t_1 - t_0), 0, 1))**2
+    return x if rising else 1 - x
+
+#----------------------------------------------------------------------------------------------------
+def _with_negative_modes(h):
+    """ dictionary of modes including the m<0 modes """
+    if not isinstance(h, dict):
+        raise ValueError("multibanding needs the modes (generate_surrogate(..., mode_sum=False))")
+    if all(m > 0 for (l,m) in h.keys()):
+        return utils.generate_negative_m_mode(h)
+    return h
+
+#----------------------------------------------------------------------------------------------------
+class MultibandLayout:
+    """
+    Frequency bands, time steps and time windows of the multibanded waveforms; see the
+    description at the top of this module
+
+    Inputs
+    ======
+        t, h : reference waveform : times (s) and dictionary of modes, e.g. the output of
+               generate_surrogate(..., M_tot=..., dist_mpc=...)
+        duration : duration T (s) of the analysed data segment
+        t_data_start : time of the first data sample, in the time coordinate of t
+        f_min, f_max : frequency range (Hz). Default f_max: largest frequency of the modes
+        ratio : ratio of the edges of consecutive bands
+        margin : relative frequency margin on each side of a band, followed by a taper
+        cycles : smallest length of the tapers, in cycles of the lower edge of a band
+        padding : relative extension of the time windows (for waveforms longer than the
+                  reference)
+    """
+
+    def __init__(self, t, h, duration, t_data_start, f_min, f_max=None, ratio=2.0, margin=0.1,
+                 cycles=4, padding=0.1):
+        h = _with_negative_modes(h)
+        t = np.asarray(t, dtype=float)
+        f_22 = frequency_22(t, h[(2,2)])
+        ms = sorted(set(abs(m) for (l,m) in h.keys()))
+        if f_max is None:
+            f_max = ms[-1]/2*f_22[-1]
+        self.duration = duration
+        self.t_data_start = t_data_start
+        self.margin = margin
+        self.cycles = cycles
+        self.edges = band_edges(f_min, f_max, ratio)
+
+        self.bands = []
+        for f_low, f_high in zip(self.edges[:-1], self.edges[1:]):
+            # time step dividing the duration, resolving the band and its margins
+            n_steps = 1 << int(np.ceil(np.log2(1.25*f_high*(1 + 2*margin)*duration)))
+            dt = duration/n_steps
+            # window spanning the parts of all the modes in the band
+            segments = [_segment_times(t, m/2*f_22, f_low, f_high, margin, cycles) for m in ms]
+            segments = [segment for segment in segments if segment is not None]
+            if not segments:
+                continue
+            starts = [segment[0] for segment in segments]
+            ends = [segment[3] for segment in segments]
+            extension = padding*(max(ends) - min(starts))
+            n_0 = max(int(np.floor((min(starts) - extension - t_data_start)/dt)), 0)
+            n_1 = min(int(np.ceil((max(ends) + extension - t_data_start)/dt)) + 1, n_steps)
+            n_window = scipy.fft.next_fast_len(n_1 - n_0)
+            df = 1/(n_window*dt)
+            k_0 = int(np.ceil(f_low*(1 - margin)/df))
+            k_1 = min(int(np.floor(f_high*(1 + margin)/df)) + 1, n_window)
+            self.bands.append({'f_low': f_low, 'f_high': f_high, 'dt': dt, 'n_steps': n_steps,
+                               'n_0': n_0, 'n_window': n_window, 'df': df,
+                               'bins': slice(k_0, k_1),
+                               'frequencies': np.arange(k_0, k_1)*df})
+
+    @property
+    def n_frequencies(self):
+        """ total number of frequencies of the bands """
+        return sum(len(band['frequencies']) for band in self.bands)
+
+    def _times(self, band):
+        return self.t_data_start + (band['n_0'] + np.arange(band['n_window']))*band['dt']
+
+    def transform(self, t, h):
+        """
+        Multibanded transforms of the modes of a waveform (dictionary of modes with the same
+        time coordinate as the reference); returns a MultibandWaveform
+        """
+        h = _with_negative_modes(h)
+        t = np.asarray(t, dtype=float)
+        f_22 = frequency_22(t, h[(2,2)])
+        splines = {mode: CubicSpline(t, h_mode) for mode, h_mode in h.items()}
+
+        spectra = {mode: [] for mode in h.keys()}
+        for band in self.bands:
+            times = self._times(band)
+            f_low, f_high = band['f_low'], band['f_high']
+            for (l,m), spline in splines.items():
+                segment_times = _segment_times(t, abs(m)/2*f_22, f_low, f_high, self.margin,
+                                               self.cycles)
+                if segment_times is None:
+                    spectra[(l,m)].append(np.zeros(len(band['frequencies']), dtype=complex))
+                    continue
+                t_0, t_1, t_2, t_3 = segment_times
+                inside = (times >= t_0) & (times <= t_3)
+                segment = np.zeros(len(times), dtype=complex)
+                segment[inside] = spline(times[inside])*_taper(times[inside], t_0, t_1, True) \
+                                  *_taper(times[inside], t_2, t_3, False)
+                # spectrum at the frequencies where the mode radiates : h_lm(f) for m<0 and
+                # h_lm(-f) = conj(FT[conj(h_lm)](f)) for m>0, with the window start as origin
+                if m < 0:
+                    spectrum = scipy.fft.fft(segment)*band['dt']
+                else:
+                    spectrum = np.conj(scipy.fft.fft(np.conj(segment)))*band['dt']
+                spectra[(l,m)].append(spectrum[band['bins']])
+        return MultibandWaveform(self, spectra)
+
+    def data_weights(self, data, psd):
+        """
+        Weights w_bk such that (d, h) = Re sum_b sum_k w_bk h_b(f_k) (see inner_product())
+
+        Inputs
+        ======
+            data : frequency-domain data on the frequencies np.arange(len(data))/duration,
+                   with the convention d(f) = dt sum_j d_j exp(-2 pi i f (t_j - t_data_start))
+                   (e.g. np.fft.rfft(d)*dt)
+            psd : one-sided noise power spectral density on the same frequencies
+
+        Outputs
+        =======
+            weights : list of the arrays w_b of the bands
+        """
+        data, psd = np.asarray(data), np.asarray(psd)
+        freqs = np.arange(len(data))/self.duration
+        whitened = np.zeros(len(data), dtype=complex)
+        valid = psd > 0
+        whitened[valid] = data[valid]/psd[valid]
+        weights = []
+        for band in self.bands:
+            # analytic band-limited whitened data at the band time samples (the band is
+            # narrower than 1/dt, so the frequencies fold into distinct bins)
+            in_band = (freqs >= band['f_low']) & (freqs < band['f_high'])
+            folded = np.zeros(band['n_steps'], dtype=complex)
+            np.add.at(folded, np.flatnonzero(in_band)%band['n_steps'], whitened[in_band])
+            a = scipy.fft.ifft(folded)*band['n_steps']/self.duration
+            a = np.concatenate([a, np.zeros(band['n_window'], dtype=complex)])
+            window = a[band['n_0']:band['n_0'] + band['n_window']]
+            Q = scipy.fft.fft(window)*band['dt']
+            weights.append(4*band['df']*np.conj(Q[band['bins']]))
+        return weights
+
+    def hh_weights(self, psd):
+        """
+        Weights v_bk such that (h, h) = sum_b sum_k v_bk |h_b(f_k)|^2 (see norm_squared()),
+        from the linear interpolation of |h|^2 at the data frequencies of each band
+
+        psd : one-sided noise power spectral density on np.arange(len(psd))/duration
+        """
+        psd = np.asarray(psd)
+        freqs = np.arange(len(psd))/self.duration
+        weights = []
+        for band in self.bands:
+            in_band = (freqs >= band['f_low']) & (freqs < band['f_high']) & (psd > 0)
+            f, inv_psd = freqs[in_band], 1/psd[in_band]
+            x = (f - band['frequencies'][0])/band['df']
+            k = np.clip(np.floor(x).astype(int), 0, len(band['frequencies']) - 2)
+            u = x - k
+            v = np.zeros(len(band['frequencies']))
+            np.add.at(v, k, (1 - u)*inv_psd)
+            np.add.at(v, k + 1, u*inv_psd)
+            weights.append(4*v/self.duration)
+        return weights
+
+#----------------------------------------------------------------------------------------------------
+class MultibandWaveform:
+    """
+    Multibanded transforms of the modes of a waveform, returned by MultibandLayout.transform()
+
+    Attributes
+    ==========
+        layout : the MultibandLayout
+        spectra : dictionary {mode: list of arrays on the frequencies of the bands}; for m<0
+                  the transform h_lm(f), for m>0 h_lm(-f), where the mode radiates
+    """
+
+    def __init__(self, layout, spectra):
+        self.layout = layout
+        self.spectra = spectra
+
+    @property
+    def frequencies(self):
+        """ list of the frequencies of the bands """
+        return [band['frequencies'] for band in self.layout.bands]
+
+    def polarizations(self, inclination=None, orb_phase=None):
+        """
+        Transforms of h_plus and h_cross on the frequencies of the bands, summing the modes
+        with the spin-weighted spherical harmonics at (inclination, orb_phase) if given
+        (otherwise the modes are summed as they are, e.g. if they are already evaluated on the
+        sphere). Returns a list of (h_plus, h_cross) arrays, one per band.
+        """
+        bands = []
+        for b in range(len(self.layout.bands)):
+            # h(f) from the m<0 modes, h(-f) from the m>0 modes
+            h_pos, h_neg = 0, 0
+            for (l,m), spectra in self.spectra.items():
+                weight = 1.0 if inclination is None else \
+                         utils._sYlm(-2, ll=l, mm=m, theta=inclination, phi=orb_phase)
+                if m < 0:
+                    h_pos = h_pos + weight*spectra[b]
+                else:
+                    h_neg = h_neg + weight*spectra[b]
+            # h = h_plus - i h_cross
+            bands.append((0.5*(h_pos + np.conj(h_neg)), 0.5j*(h_pos - np.conj(h_neg))))
+        return bands
+
+#----------------------------------------------------------------------------------------------------
+def inner_product(weights, spectra):
+    """ (d, h) from the data weights of MultibandLayout.data_weights() and the transforms of the
+        strain h on the bands (e.g. F_plus h_plus + F_cross h_cross) """
+    return sum(np.real(np.dot(w, s)) for w, s in zip(weights, spectra))
+
+#----------------------------------------------------------------------------------------------------
+def norm_squared(weights, spectra):
+    """ (h, h) from the weights of MultibandLayout.hh_weights() and the transforms of h """
+    return sum(np.dot(v, np.abs(s)**2) for v, s in zip(weights, spectra))
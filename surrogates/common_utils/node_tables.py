@@ -0,0 +1,209 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : dense tabulation of the EIM node fits of 1d (spline) surrogates
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Tabulates all EIM node fits of a one-parameter surrogate (e.g. X=log10(q)) on a uniform grid
+and interpolates them with local 4-point Lagrange interpolation, much cheaper than one splev
+per node. A table is a dictionary with keys X_min, dX, n_grid (grid), values (n_grid, n_total),
+slices {(mode, datapiece): (start, stop)} (columns of values), tol, max_error and model_hash.
+"""
+
+import os
+import numpy as np
+from scipy.interpolate import splev
+from . import fits
+from .locking import FileLock
+
+#----------------------------------------------------------------------------------------------------
+def _lagrange_stencil(X, X_min, dX, n_grid):
+    """
+    Returns the first grid index of the 4-point stencil and the 4 interpolation weights
+    for each value of X (arrays of shape (n_X,) and (4, n_X))
+    """
+    s = (np.atleast_1d(np.asarray(X, dtype=float)) - X_min)/dX
+    indx = np.clip(np.floor(s).astype(int), 1, n_grid-3)
+    u = s - indx
+    weights = np.array([-u*(u-1)*(u-2)/6,
+                        (u+1)*(u-1)*(u-2)/2,
+                        -(u+1)*u*(u-2)/2,
+                        (u+1)*u*(u-1)/6])
+    return indx - 1, weights
+
+#----------------------------------------------------------------------------------------------------
+def interpolate_table(values, X_min, dX, X):
+    """
+    Local cubic interpolation of tabulated values (n_grid, n_cols) at X (scalar or array)
+    Returns an array of shape (n_cols,) for scalar X and (n_X, n_cols) otherwise
+    """
+    start, weights = _lagrange_stencil(X, X_min, dX, values.shape[0])
+    interp = sum(weights[k][:,None]*values[start+k] for k in range(4))
+    if np.ndim(X) == 0:
+        return interp[0]
+    return interp
+
+#----------------------------------------------------------------------------------------------------
+def _tabulate(fit_data_dict_1, fit_data_dict_2, modes, X):
+    """ Evaluates all the spline node fits on the array X; returns values and column slices """
+    columns, slices = [], {}
+    start = 0
+    for mode in modes:
+        for datapiece, fit_data_dict in [(1, fit_data_dict_1), (2, fit_data_dict_2)]:
+            [h_eim_spline, eim_indicies] = fit_data_dict[mode]
+            for j in range(len(eim_indicies)):
+                columns.append(splev(X, h_eim_spline[j]))
+            slices[(mode, datapiece)] = (start, start + len(eim_indicies))
+            start += len(eim_indicies)
+    return np.array(columns).T, slices
+
+#----------------------------------------------------------------------------------------------------
+def _relative_errors(approx, exact):
+    """ max absolute error of each column relative to the largest value of the column """
+    scale = np.max(np.abs(exact), axis=0)
+    scale[scale == 0] = 1.0
+    return np.max(np.abs(approx - exact), axis=0)/scale
+
+#----------------------------------------------------------------------------------------------------
+def build_node_table(fit_data_dict_1, fit_data_dict_2, modes, X_min, X_max, tol=1e-10,
+                     n_start=129, n_max=2**17+1, model_hash=None):
+    """
+    Tabulates the spline fits of all EIM nodes on a uniform grid which is refined (by
+    halving the spacing) until the interpolation error at the midpoints of the grid cells
+    is below tol for every node. The error of a node is measured relative to the largest
+    absolute value of that node over the grid.
+
+    Inputs
+    ======
+        fit_data_dict_1, fit_data_dict_2 : spline fit data, as returned by
+                                           load_splines.load_surrogate()
+        modes : modes to tabulate
+        X_min, X_max : range of the surrogate parameter
+        tol : tolerance on the relative interpolation error
+        n_start : number of grid points of the first (coarsest) grid
+        n_max : maximum number of grid points; a warning is printed if tol is not
+                reached with n_max points
+        model_hash : hash of the h5 file, stored with the table to validate cached tables
+
+    Outputs
+    =======
+        table : dictionary; see the description at the top of this module
+    """
+    n_grid = n_start
+    while True:
+        grid, dX = np.linspace(X_min, X_max, n_grid, retstep=True)
+        values, slices = _tabulate(fit_data_dict_1, fit_data_dict_2, modes, grid)
+
+        # check the interpolation error at the cell midpoints
+        midpoints = grid[:-1] + 0.5*dX
+        exact, _ = _tabulate(fit_data_dict_1, fit_data_dict_2, modes, midpoints)
+        max_error = np.max(_relative_errors(interpolate_table(values, X_min, dX, midpoints), exact))
+
+        if max_error <= tol:
+            break
+        if 2*n_grid - 1 > n_max:
+            print("**** warning **** : node table tolerance %.1e not reached with %d points "
+                  "(max error %.1e)"%(tol, n_grid, max_error))
+            break
+        n_grid = 2*n_grid - 1
+
+    return {'X_min': X_min, 'dX': dX, 'n_grid': n_grid, 'values': values, 'slices': slices,
+            'tol': tol, 'max_error': max_error, 'model_hash': model_hash}
+
+#----------------------------------------------------------------------------------------------------
+def save_node_table(fname, table, lock_timeout=None):
+    """ writes a node table to a .npz file (.npz is appended to fname if needed). The table is
+        written to a temporary file which then replaces fname, under an inter-process lock, so
+        that processes reading the file never see a partially written table """
+    if not fname.endswith('.npz'):
+        fname = fname + '.npz'
+    slices = np.array([[mode[0], mode[1], datapiece, start, stop]
+                       for (mode, datapiece), (start, stop) in table['slices'].items()])
+    part_file = fname + '.part'
+    with FileLock(fname + '.lock', timeout=lock_timeout):
+        with open(part_file, 'wb') as f:
+            np.savez(f, X_min=table['X_min'], dX=table['dX'], n_grid=table['n_grid'],
+                     values=table['values'], slices=slices, tol=table['tol'],
+                     max_error=table['max_error'], model_hash=str(table['model_hash']))
+        os.replace(part_file, fname)
+
+#----------------------------------------------------------------------------------------------------
+def load_node_table(fname):
+    """ reads a node table written by save_node_table() """
+    with np.load(fname) as data:
+        slices = {((int(l), int(m)), int(datapiece)): (int(start), int(stop))
+                  for l, m, datapiece, start, stop in data['slices']}
+        model_hash = str(data['model_hash'])
+        return {'X_min': float(data['X_min']), 'dX': float(data['dX']),
+                'n_grid': int(data['n_grid']), 'values': data['values'], 'slices': slices,
+                'tol': float(data['tol']), 'max_error': float(data['max_error']),
+                'model_hash': None if model_hash == 'None' else model_hash}
+
+#----------------------------------------------------------------------------------------------------
+def evaluate_node_table(table, X, modes=None):
+    """
+    Node values of all (or the given) modes at X, which can be a scalar or an array.
+    Returns a dictionary {mode: [values_1, values_2]} where values_i has shape (n_nodes,)
+    for scalar X and (n_X, n_nodes) otherwise.
+    """
+    all_values = interpolate_table(table['values'], table['X_min'], table['dX'], X)
+    if modes is None:
+        modes = sorted(set(mode for (mode, datapiece) in table['slices'].keys()))
+    node_values = {}
+    for mode in modes:
+        node_values[mode] = []
+        for datapiece in [1, 2]:
+            (start, stop) = table['slices'][(mode, datapiece)]
+            node_values[mode].append(all_values[...,start:stop])
+    return node_values
+
+#----------------------------------------------------------------------------------------------------
+def tabulated_fit_data(table, fit_data_dict_1, fit_data_dict_2):
+    """
+    Fit data to be used with fit_func='tabulated_1d' in fits.all_modes_surrogate().
+    Each entry is [table values of the datapiece, (X_min, dX, X_max), spline fit data]; the
+    spline fit data is used outside of the tabulated range.
+    """
+    X_max = table['X_min'] + (table['n_grid'] - 1)*table['dX']
+    tab_fit_data_dict_1, tab_fit_data_dict_2 = {}, {}
+    for (mode, datapiece), (start, stop) in table['slices'].items():
+        if datapiece == 1:
+            tab_fit_data_dict_1[mode] = [table['values'][:,start:stop],
+                                         (table['X_min'], table['dX'], X_max), fit_data_dict_1[mode]]
+        else:
+            tab_fit_data_dict_2[mode] = [table['values'][:,start:stop],
+                                         (table['X_min'], table['dX'], X_max), fit_data_dict_2[mode]]
+    return tab_fit_data_dict_1, tab_fit_data_dict_2
+
+#----------------------------------------------------------------------------------------------------
+def node_table_accuracy_report(table, fit_data_dict_1, fit_data_dict_2, n_test=1000, seed=0):
+    """
+    Compares the tabulated node values with fits._evaluate_splines_at_EIM_nodes() at n_test
+    random points of the tabulated range.
+
+    Outputs
+    =======
+        report : dictionary {mode: {'max_abs_err_1', 'max_rel_err_1', 'max_abs_err_2',
+                 'max_rel_err_2'}} plus the key 'max_rel_err' with the largest relative
+                 error over all modes. Relative errors are measured with respect to the
+                 largest absolute value of each node over the test points.
+    """
+    rng = np.random.default_rng(seed)
+    X_max = table['X_min'] + (table['n_grid'] - 1)*table['dX']
+    X_test = rng.uniform(table['X_min'], X_max, n_test)
+    tabulated = evaluate_node_table(table, X_test)
+
+    report = {}
+    for mode in tabulated.keys():
+        report[mode] = {}
+        for datapiece, fit_data_dict in [(1, fit_data_dict_1), (2, fit_data_dict_2)]:
+            exact = np.array([fits._evaluate_splines_at_EIM_nodes(X, fit_data_dict[mode])
+                              for X in X_test])
+            abs_err = np.abs(tabulated[mode][datapiece-1] - exact)
+            report[mode]['max_abs_err_%d'%datapiece] = np.max(abs_err)
+            report[mode]['max_rel_err_%d'%datapiece] = np.max(_relative_errors(
+                                                        tabulated[mode][datapiece-1], exact))
+    report['max_rel_err'] = max(max(report[mode]['max_rel_err_1'], report[mode]['max_rel_err_2'])
+                                for mode in tabulated.keys())
+    return report
@@ -110,3 +110,59 @@ def generate_calibrated_ppBHPT(X_input, raw_time, h_raw_dict, coefs_alpha, coefs
     
     return t_calib, hcal_dict
     
+
+
+#----------------------------------------------------------------------------------------------------
+def _complex_step_derivative(func, X, dX, step=1e-30):
+    """ Directional derivative of a real analytic function func(X) along dX, computed
+        to machine precision with the complex step d func = Im[func(X + i step dX)]/step
+    """
+    X_complex = np.asarray(X, dtype=complex) + 1j*step*np.asarray(dX, dtype=float)
+    return np.imag(func(X_complex))/step
+
+
+#----------------------------------------------------------------------------------------------------
+def generate_calibrated_ppBHPT_derivatives(X_input, raw_time, h_raw_dict, dh_raw_dict, coefs_alpha, 
+                                           coefs_beta, alpha_beta_functional_form, param_derivatives):
+    """
+    rescales all raw ppBHPT waveform modes to match NR and propagates the derivatives of the 
+    modes with respect to the waveform parameters through the alpha-beta scaling
+    
+    Inputs
+    ======
+        
+        X_input, raw_time, h_raw_dict, coeffs_alpha, coeffs_beta, alpha_beta_functional_form : 
+                   as in generate_calibrated_ppBHPT()
+        dh_raw_dict : dictionary {parameter name: dictionary of derivatives of the raw modes}
+        param_derivatives : dictionary {parameter name: {'X_calib': dX_input/dparameter, ...}}
+    
+    Outputs
+    =======
+    
+        t_calib : rescaled time array
+        hcal_dict : dictiornary of rescaled modes 
+        dhcal_dict : dictionary {parameter name: dictionary of the derivatives of the rescaled
+                     modes at fixed sample index}
+        dt_calib : dictionary {parameter name: derivative of t_calib}
+        
+    """
+    t_calib, hcal_dict = generate_calibrated_ppBHPT(X_input, raw_time, h_raw_dict, coefs_alpha, 
+                                                    coefs_beta, alpha_beta_functional_form)
+
+    dhcal_dict, dt_calib = {}, {}
+    for p, dh_raw in dh_raw_dict.items():
+        dX = param_derivatives[p]['X_calib']
+        dhcal_dict[p] = {}
+        for mode in h_raw_dict.keys():
+            (l,m)=mode
+            alpha = evaluate_alpha(X_input, l, coefs_alpha, alpha_beta_functional_form) 
+            dalpha = _complex_step_derivative(lambda X: evaluate_alpha(X, l, coefs_alpha, 
+                                              alpha_beta_functional_form), X_input, dX)
+            # d(alpha h) = dalpha h + alpha dh
+            dhcal_dict[p][mode] = alpha_scaling_h(h_raw_dict[mode], dalpha) \
+                                  + alpha_scaling_h(dh_raw[mode], alpha)
+        dbeta = _complex_step_derivative(lambda X: evaluate_beta(X, coefs_beta, 
+                                         alpha_beta_functional_form), X_input, dX)
+        dt_calib[p] = beta_scaling_time(raw_time, dbeta)
+
+    return t_calib, hcal_dict, dhcal_dict, dt_calib
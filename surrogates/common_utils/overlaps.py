@@ -0,0 +1,229 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : noise weighted overlaps and mismatches against a fixed target waveform
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Overlaps between a fixed target waveform and many other waveforms, maximized over a relative
+time shift with one inverse FFT per waveform. polarizations='both' uses h_plus - i h_cross
+over positive and negative frequencies, polarizations='plus' uses h_plus only; with
+maximize_phase=True the overlap is |z|, maximized over the polarization angle ('both') or
+the phase of the signal ('plus'). Dictionaries of modes are maximized over the orbital
+phase on a grid of n_phase values. Without a PSD the noise is white.
+"""
+
+import numpy as np
+import scipy.fft
+from scipy.interpolate import CubicSpline
+
+#----------------------------------------------------------------------------------------------------
+def resample(t, h, dt):
+    """ resamples a waveform (array or dictionary of modes) onto a uniform grid of step dt
+        starting at t[0]; returns the new times and waveform """
+    t = np.asarray(t, dtype=float)
+    t_uniform = t[0] + dt*np.arange(int(np.floor((t[-1] - t[0])/dt + 1e-9)) + 1)
+    if len(t) == len(t_uniform) and np.allclose(t, t_uniform, rtol=0, atol=1e-9*dt):
+        return t_uniform, h
+    if isinstance(h, dict):
+        return t_uniform, {mode: CubicSpline(t, h_mode)(t_uniform) for mode, h_mode in h.items()}
+    return t_uniform, CubicSpline(t, h)(t_uniform)
+
+#----------------------------------------------------------------------------------------------------
+def _refine_peak(values, index):
+    """ value and fractional index of the maximum of the parabola through the samples around
+        the largest sample values[index] (the array is periodic) """
+    before, peak, after = values[index - 1], values[index], values[(index + 1)%len(values)]
+    curvature = before - 2*peak + after
+    if curvature >= 0:
+        return peak, index
+    delta = 0.5*(before - after)/curvature
+    return peak - 0.25*(before - after)*delta, index + delta
+
+#----------------------------------------------------------------------------------------------------
+class OverlapEngine:
+    """
+    Overlaps of waveforms against a fixed target; see the description at the top of this module
+
+    Inputs
+    ======
+        t, h : target waveform (complex array h_plus - i h_cross or dictionary of modes), on any
+               time grid; its smallest time step sets the sampling
+        psd : None (white noise), a function S(f) of positive frequencies, or a tuple of arrays
+              (f, S) interpolated linearly. Frequencies in the inverse units of t
+        f_min, f_max : frequency band of the inner product. Default: all frequencies
+        polarizations : 'both' or 'plus'
+        maximize_phase : maximize over the phase (see the top of this module)
+        n_phase : number of orbital phases tried for dictionaries of modes
+        dt : time step of the resampled waveforms. Default: smallest time step of the target
+    """
+
+    def __init__(self, t, h, psd=None, f_min=None, f_max=None, polarizations='both',
+                 maximize_phase=True, n_phase=64, dt=None):
+        if polarizations not in ('both', 'plus'):
+            raise ValueError("polarizations must be 'both' or 'plus'")
+        if isinstance(h, dict) and polarizations != 'both':
+            raise ValueError("dictionaries of modes are compared with polarizations='both'")
+        self.psd = psd
+        self.f_min = f_min
+        self.f_max = f_max
+        self.polarizations = polarizations
+        self.maximize_phase = maximize_phase
+        self.n_phase = n_phase
+        self.dt = np.min(np.diff(t)) if dt is None else dt
+        t_uniform, self.h = resample(t, h, self.dt)
+        self.t0 = t_uniform[0]
+        self.is_modes = isinstance(h, dict)
+        self.n_target = len(next(iter(self.h.values()))) if self.is_modes else len(self.h)
+        # {n_fft: (weights, target transform, target norm)}
+        self._cache = {}
+
+    def _weights(self, n_fft):
+        """ noise weights of the FFT frequencies """
+        freqs = np.abs(scipy.fft.fftfreq(n_fft, self.dt))
+        band = np.ones(n_fft, dtype=bool)
+        if self.f_min is not None:
+            band &= freqs >= self.f_min
+        if self.f_max is not None:
+            band &= freqs <= self.f_max
+        if self.polarizations == 'plus':
+            band &= scipy.fft.fftfreq(n_fft) > 0
+        weights = np.zeros(n_fft)
+        if self.psd is None:
+            weights[band] = 1.0
+        else:
+            band &= freqs > 0
+            if callable(self.psd):
+                weights[band] = 1.0/self.psd(freqs[band])
+            else:
+                weights[band] = 1.0/np.interp(freqs[band], self.psd[0], self.psd[1])
+        # a real signal has the same power at -f : counts the positive frequencies twice
+        return 2*weights if self.polarizations == 'plus' else weights
+
+    def _transform(self, h, n_fft):
+        """ FFT of a waveform (array of shape (..., n)) or of each mode, zero padded to n_fft """
+        if isinstance(h, dict):
+            return {mode: scipy.fft.fft(h_mode, n_fft) for mode, h_mode in h.items()}
+        if self.polarizations == 'plus':
+            h = np.real(h)
+        return scipy.fft.fft(h, n_fft, axis=-1)
+
+    def _target(self, n_fft):
+        """ cached weights, transform and norm of the target for an FFT length """
+        if n_fft not in self._cache:
+            weights = self._weights(n_fft)
+            H = self._transform(self.h, n_fft)
+            if self.is_modes:
+                norm = sum(np.sum(np.abs(H_mode)**2*weights) for H_mode in H.values())
+            else:
+                norm = np.sum(np.abs(H)**2*weights)
+            self._cache[n_fft] = (weights, H, norm)
+        return self._cache[n_fft]
+
+    def _fft_length(self, n):
+        return 1 << int(np.ceil(np.log2(self.n_target + n)))
+
+    def _time_shift(self, index, n_fft, t0):
+        """ shift to add to the times of a waveform starting at t0 to align it with the target,
+            given the index of the maximum of the cross-correlation """
+        lag = index if index < n_fft/2 else index - n_fft
+        return self.t0 - t0 + lag*self.dt
+
+    def _maximize(self, z, norm):
+        """ overlap, (fractional) index of the best time shift and phase from a 
+            cross-correlation z (n_fft,) """
+        values = np.abs(z) if self.maximize_phase else np.real(z)
+        index = int(np.argmax(values))
+        phase = np.angle(z[index]) if self.maximize_phase else 0.0
+        value, index = _refine_peak(values, index)
+        return value/norm, index, phase
+
+    def _overlap_modes(self, t, h):
+        t, h = resample(t, h, self.dt)
+        n_fft = self._fft_length(len(t))
+        weights, H_target, norm_target = self._target(n_fft)
+        modes = [mode for mode in h.keys() if mode in H_target]
+        if not modes:
+            raise ValueError("no mode in common with the target")
+        H = self._transform({mode: h[mode] for mode in modes}, n_fft)
+        norm = np.sqrt(norm_target*sum(np.sum(np.abs(H[mode])**2*weights) for mode in modes))
+
+        # cross-correlations summed over l for each m
+        ms = sorted(set(m for (l,m) in modes))
+        z = np.zeros((len(ms), n_fft), dtype=complex)
+        for (l,m) in modes:
+            z[ms.index(m)] += H_target[(l,m)]*np.conj(H[(l,m)])*weights
+        z = scipy.fft.ifft(z, axis=-1)*n_fft
+
+        if not self.maximize_phase:
+            overlap, index, _ = self._maximize(np.sum(z, axis=0), norm)
+            return overlap, self._time_shift(index, n_fft, t[0]), 0.0
+        # h_lm exp(i m phi) matches the target if sum_m z_m exp(-i m phi) is largest
+        phases = np.linspace(0, 2*np.pi, self.n_phase, endpoint=False)
+        values = np.real(np.exp(-1j*np.outer(phases, ms)) @ z)
+        i_phase, index = np.unravel_index(np.argmax(values), values.shape)
+        value, index = _refine_peak(values[i_phase], index)
+        return value/norm, self._time_shift(index, n_fft, t[0]), phases[i_phase]
+
+    def overlaps(self, waveforms):
+        """
+        Overlaps of a list of waveforms [(t, h), ...] with the target, maximized over the time
+        shift (and phase if maximize_phase). Waveforms that are arrays are transformed together.
+
+        Outputs
+        =======
+            overlaps, time_shifts, phases : arrays; the waveform best matches the target after
+            adding time_shift to its times and multiplying it by exp(i phase) (by exp(i m phase)
+            for its modes)
+        """
+        results = [None]*len(waveforms)
+        if self.is_modes:
+            for i, (t, h) in enumerate(waveforms):
+                results[i] = self._overlap_modes(t, h)
+        else:
+            resampled = [resample(t, h, self.dt) for t, h in waveforms]
+            n_fft = self._fft_length(max(len(t) for t, _ in resampled))
+            weights, H_target, norm_target = self._target(n_fft)
+            batch = np.zeros((len(resampled), n_fft), dtype=complex)
+            for i, (t, h) in enumerate(resampled):
+                batch[i,:len(t)] = h
+            H = self._transform(batch, n_fft)
+            norms = np.sqrt(norm_target*np.sum(np.abs(H)**2*weights, axis=-1))
+            z = scipy.fft.ifft(H_target*np.conj(H)*weights, axis=-1)*n_fft
+            for i, (t, _) in enumerate(resampled):
+                overlap, index, phase = self._maximize(z[i], norms[i])
+                results[i] = (overlap, self._time_shift(index, n_fft, t[0]), phase)
+        return tuple(np.array(values) for values in zip(*results))
+
+    def overlap(self, t, h):
+        """ overlap, time shift and phase of one waveform; see overlaps() """
+        return tuple(values[0] for values in self.overlaps([(t, h)]))
+
+    def mismatch(self, t, h):
+        """ 1 - overlap of one waveform """
+        return 1.0 - self.overlap(t, h)[0]
+
+    def sweep(self, model, params, batch_size=64, **kwargs):
+        """
+        Overlaps of the surrogate waveforms over a set of parameters with the target
+
+        Inputs
+        ======
+            model : model module, e.g. BHPTNRSur1dq1e4
+            params : dictionary {argument name: array of values}, e.g. {'q': q_values}
+            batch_size : number of waveforms generated and compared together
+            kwargs : arguments of generate_surrogate() common to all waveforms
+
+        Outputs
+        =======
+            overlaps, time_shifts, phases : arrays, see overlaps()
+        """
+        params = {name: np.atleast_1d(values) for name, values in params.items()}
+        n = len(next(iter(params.values())))
+        results = []
+        for start in range(0, n, batch_size):
+            waveforms = [model.generate_surrogate(**kwargs, **{name: values[i].item()
+                                                               for name, values in params.items()})
+                         for i in range(start, min(start + batch_size, n))]
+            results.append(self.overlaps(waveforms))
+        return tuple(np.concatenate(values) for values in zip(*results))
@@ -0,0 +1,169 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : opt-in per-stage timing and memory instrumentation
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Timings (and optionally memory) of the stages of a surrogate evaluation : fits, matmul,
+decomposition, pruning, frame_transform, calibration, negative_modes, SI_conversion,
+harmonics and summation.
+
+    prof = profiling.StageProfiler(track_memory=True)
+    t, h = generate_surrogate(q=8, profiler=prof)
+    prof.to_dict() / prof.to_json('timings.json')
+"""
+
+import json
+import time
+import tracemalloc
+
+#----------------------------------------------------------------------------------------------------
+class _NullStage:
+    """ Context manager that does nothing - used when profiling is disabled """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+#----------------------------------------------------------------------------------------------------
+class _NullProfiler:
+    """ Profiler used when profiling is disabled; every stage is a shared no-op """
+
+    def stage(self, name, mode=None):
+        return _NULL_STAGE
+
+NULL_PROFILER = _NullProfiler()
+
+#----------------------------------------------------------------------------------------------------
+def get_profiler(profiler):
+    """ Returns the profiler to be used in the evaluation chain """
+    if profiler is None:
+        return NULL_PROFILER
+    return profiler
+
+#----------------------------------------------------------------------------------------------------
+class _StageTimer:
+    """ Times a single stage and hands the record over to the profiler on exit """
+
+    def __init__(self, profiler, name, mode):
+        self.profiler = profiler
+        self.name = name
+        self.mode = mode
+
+    def __enter__(self):
+        if self.profiler.track_memory:
+            tracemalloc.reset_peak()
+            self.mem_start = tracemalloc.get_traced_memory()[0]
+        self.t_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall_time = time.perf_counter() - self.t_start
+        record = {'stage': self.name, 'mode': self.mode, 'wall_time': wall_time}
+        if self.profiler.track_memory:
+            mem_now, mem_peak = tracemalloc.get_traced_memory()
+            record['allocated_bytes'] = mem_now - self.mem_start
+            record['peak_bytes'] = mem_peak - self.mem_start
+        self.profiler._add_record(record)
+        return False
+
+#----------------------------------------------------------------------------------------------------
+class StageProfiler:
+    """
+    Records the wall time (and optionally the allocated bytes) of each stage of the
+    surrogate evaluation, per mode where the stage is evaluated mode-by-mode.
+
+    Inputs
+    ======
+        track_memory : if True, numpy/python allocations are traced with tracemalloc.
+                       tracemalloc is started if it is not already running and stopped
+                       again in close(). Tracing adds noticeable overhead to the timings.
+        callback : optional function called with each record (a dictionary with keys
+                   'stage', 'mode', 'wall_time' and, if tracked, 'allocated_bytes'
+                   and 'peak_bytes') as soon as the stage finishes
+
+    The profiler can be used as a context manager, in which case close() is called on exit.
+    The same profiler can be passed to several calls; records accumulate until reset().
+    """
+
+    def __init__(self, track_memory=False, callback=None):
+        self.track_memory = track_memory
+        self.callback = callback
+        self.records = []
+        self._started_tracemalloc = False
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        """ stops tracemalloc if it was started by this profiler """
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        self.track_memory = False
+
+    def reset(self):
+        """ discards all records """
+        self.records = []
+
+    def stage(self, name, mode=None):
+        """ returns a context manager timing the stage 'name' (for the given mode) """
+        return _StageTimer(self, name, mode)
+
+    def _add_record(self, record):
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def to_dict(self):
+        """
+        Returns the accumulated records as a dictionary with
+            'stages' : totals per stage
+            'modes'  : totals per mode and stage (mode keys written as 'l,m')
+            'records': list of all individual records
+        """
+        stages, modes = {}, {}
+        for record in self.records:
+            _accumulate(stages, record['stage'], record)
+            if record['mode'] is not None:
+                mode_key = '%d,%d'%tuple(record['mode'])
+                _accumulate(modes.setdefault(mode_key, {}), record['stage'], record)
+
+        records = []
+        for record in self.records:
+            record = dict(record)
+            if record['mode'] is not None:
+                record['mode'] = '%d,%d'%tuple(record['mode'])
+            records.append(record)
+
+        return {'stages': stages, 'modes': modes, 'records': records}
+
+    def to_json(self, fname=None, indent=2):
+        """ Returns the output of to_dict() as a JSON string; also writes it to fname if given """
+        out = json.dumps(self.to_dict(), indent=indent)
+        if fname is not None:
+            with open(fname, 'w') as f:
+                f.write(out)
+        return out
+
+#----------------------------------------------------------------------------------------------------
+def _accumulate(totals, key, record):
+    """ adds a record to the running totals of a stage """
+    entry = totals.setdefault(key, {'calls': 0, 'wall_time': 0.0})
+    entry['calls'] += 1
+    entry['wall_time'] += record['wall_time']
+    if 'allocated_bytes' in record:
+        entry['allocated_bytes'] = entry.get('allocated_bytes', 0) + record['allocated_bytes']
+        entry['peak_bytes'] = max(entry.get('peak_bytes', 0), record['peak_bytes'])
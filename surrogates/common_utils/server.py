@@ -0,0 +1,276 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : local waveform server
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+HTTP server of the surrogate models (on a TCP port or a Unix socket), loading them once :
+
+    python -m common_utils.server --models BHPTNRSur1dq1e4 BHPTNRSur2dq1e3 --port 8765
+
+    POST /<model>  JSON arguments of generate_surrogate() -> npz archive ('t', 'h' or 'h_<l>_<m>')
+    GET /models, GET /health
+
+Modes are given as lists [[l,m], ...]; derivatives=True and uncertainty=True are rejected.
+Errors are returned as plain text with status 400 (malformed request or arguments), 404
+(unknown model or path) or 500 (evaluation error). Client : request_waveform().
+"""
+
+import io
+import json
+import inspect
+import socket
+import asyncio
+import argparse
+import http.client
+import numpy as np
+from .async_api import AsyncSurrogate
+
+# largest accepted request body, in bytes
+_max_body_size = 1024*1024
+
+_reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+#----------------------------------------------------------------------------------------------------
+def waveform_to_bytes(t, h):
+    """ serializes the output of generate_surrogate() into an npz archive """
+    arrays = {'t': np.asarray(t)}
+    if isinstance(h, dict):
+        for (l, m), h_mode in h.items():
+            arrays['h_%d_%d'%(l, m)] = h_mode
+    else:
+        arrays['h'] = h
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+#----------------------------------------------------------------------------------------------------
+def waveform_from_bytes(data):
+    """ inverse of waveform_to_bytes() : returns t, h """
+    with np.load(io.BytesIO(data)) as archive:
+        t = archive['t']
+        if 'h' in archive.files:
+            return t, archive['h']
+        h = {}
+        for name in archive.files:
+            if name.startswith('h_'):
+                l, m = name[2:].split('_')
+                h[(int(l), int(m))] = archive[name]
+    return t, h
+
+#----------------------------------------------------------------------------------------------------
+def _parse_arguments(body):
+    """ generate_surrogate() arguments from the JSON body of a request """
+    kwargs = json.loads(body.decode('utf-8')) if body else {}
+    if not isinstance(kwargs, dict):
+        raise ValueError("the request body must be a JSON object")
+    if kwargs.get('modes') is not None:
+        kwargs['modes'] = [tuple(mode) for mode in kwargs['modes']]
+    # objects cannot be sent over the wire
+    kwargs.pop('profiler', None)
+    kwargs.pop('sparse_step', None)
+    # only (t, h) outputs are served
+    for name in ('derivatives', 'uncertainty'):
+        if kwargs.get(name):
+            raise ValueError("%s=True is not supported by the server"%name)
+    return kwargs
+
+#----------------------------------------------------------------------------------------------------
+class WaveformServer:
+    """
+    HTTP server evaluating waveforms of the loaded models
+
+    Inputs
+    ======
+        models : list of model names, e.g. ['BHPTNRSur1dq1e4', 'BHPTNRSur2dq1e3']
+        max_workers : number of evaluation threads per model
+        max_concurrency : maximum number of requests evaluated at the same time per model
+    """
+
+    def __init__(self, models, max_workers=None, max_concurrency=None):
+        self.surrogates = {model: AsyncSurrogate(model, max_workers=max_workers,
+                                                 max_concurrency=max_concurrency)
+                           for model in models}
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=8765, unix_socket=None):
+        """ loads the models and starts listening on host:port, or on unix_socket if given """
+        for surrogate in self.surrogates.values():
+            await surrogate.load()
+        if unix_socket is not None:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=unix_socket)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host=host, port=port)
+        return self._server
+
+    async def serve_forever(self, host='127.0.0.1', port=8765, unix_socket=None):
+        await self.start(host=host, port=port, unix_socket=unix_socket)
+        print("**** Serving %s on %s ****"%(', '.join(self.surrogates.keys()),
+                                            unix_socket if unix_socket is not None
+                                            else '%s:%d'%(host, port)))
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for surrogate in self.surrogates.values():
+            surrogate.close(wait=False)
+
+    async def _handle_connection(self, reader, writer):
+        """ serves the requests of one (keep-alive) connection in turn """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version, headers, length = \
+                                            await self._read_head(request_line, reader)
+                except ValueError as err:
+                    await self._respond(writer, 400, ('malformed request : %s'%err).encode(),
+                                        close=True)
+                    break
+                if length > _max_body_size:
+                    await self._respond(writer, 413, b'request body too large', close=True)
+                    break
+                body = await reader.readexactly(length) if length > 0 else b''
+
+                status, content_type, payload = await self._dispatch(method, target, body)
+                close = headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0'
+                await self._respond(writer, status, payload, content_type, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_head(self, request_line, reader):
+        """ method, target, version, headers and body length of a request; raises ValueError
+            if the request line or the headers are malformed """
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise ValueError("invalid request line")
+        method, target, version = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if b':' not in line:
+                raise ValueError("invalid header line")
+            name, value = line.decode('latin-1').split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length < 0:
+            raise ValueError("invalid content-length")
+        return method, target, version, headers, length
+
+    async def _dispatch(self, method, target, body):
+        """ returns status, content type and payload of the response to a request """
+        path = target.split('?', 1)[0].strip('/')
+        if method == 'GET' and path == 'health':
+            return 200, 'text/plain', b'ok'
+        if method == 'GET' and path == 'models':
+            return 200, 'application/json', json.dumps(list(self.surrogates.keys())).encode()
+        if path not in self.surrogates:
+            return 404, 'text/plain', ('unknown model or path : %s'%path).encode()
+        if method != 'POST':
+            return 405, 'text/plain', b'waveforms are requested with POST'
+
+        surrogate = self.surrogates[path]
+        try:
+            kwargs = _parse_arguments(body)
+        except ValueError as err:
+            return 400, 'text/plain', str(err).encode()
+        try:
+            module = await surrogate.load()
+            # unknown or missing arguments are an invalid request; errors raised by the
+            # evaluation itself (including TypeErrors) are not
+            try:
+                inspect.signature(module.generate_surrogate).bind(**kwargs)
+            except TypeError as err:
+                return 400, 'text/plain', str(err).encode()
+            t, h = await surrogate.generate(**kwargs)
+        except Exception as err:
+            return 500, 'text/plain', ('%s: %s'%(type(err).__name__, err)).encode()
+        return 200, 'application/octet-stream', waveform_to_bytes(t, h)
+
+    async def _respond(self, writer, status, payload, content_type='text/plain', close=False):
+        header = ('HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n%s\r\n'
+                  %(status, _reasons[status], content_type, len(payload),
+                    'Connection: close\r\n' if close else ''))
+        writer.write(header.encode('latin-1') + payload)
+        await writer.drain()
+
+#----------------------------------------------------------------------------------------------------
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """ HTTP connection over a Unix socket """
+
+    def __init__(self, unix_socket, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_socket = unix_socket
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_socket)
+
+#----------------------------------------------------------------------------------------------------
+def request_waveform(model, host='127.0.0.1', port=8765, unix_socket=None, timeout=None,
+                     connection=None, **kwargs):
+    """
+    Requests a waveform from a running WaveformServer and returns t, h as generate_surrogate()
+    would. kwargs are the arguments of generate_surrogate(). An open http.client connection
+    can be passed (and re-used across calls) through connection.
+    """
+    if connection is None:
+        if unix_socket is not None:
+            conn = _UnixHTTPConnection(unix_socket, timeout=timeout)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    else:
+        conn = connection
+
+    if kwargs.get('modes') is not None:
+        kwargs['modes'] = [list(mode) for mode in kwargs['modes']]
+    try:
+        conn.request('POST', '/' + model, body=json.dumps(kwargs).encode(),
+                     headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        data = response.read()
+    finally:
+        if connection is None:
+            conn.close()
+
+    if response.status != 200:
+        raise ValueError("waveform request failed (%d) : %s"%(response.status, data.decode()))
+    return waveform_from_bytes(data)
+
+#----------------------------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="local BHPTNRSurrogate waveform server")
+    parser.add_argument('--models', nargs='+', default=['BHPTNRSur1dq1e4'],
+                        help="models to load (default: BHPTNRSur1dq1e4)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help="path of a Unix socket to listen on instead")
+    parser.add_argument('--workers', type=int, default=None, help="evaluation threads per model")
+    parser.add_argument('--max-concurrency', type=int, default=None,
+                        help="maximum number of requests evaluated at the same time per model")
+    args = parser.parse_args(argv)
+
+    server = WaveformServer(args.models, max_workers=args.workers,
+                            max_concurrency=args.max_concurrency)
+    try:
+        asyncio.run(server.serve_forever(host=args.host, port=args.port, unix_socket=args.unix))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
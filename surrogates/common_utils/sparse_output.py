@@ -0,0 +1,189 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : sparse-time amplitude/phase output with deferred dense reconstruction
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Evaluates the smooth datapieces of the surrogate modes only at every step-th time sample and
+returns them as a SparseWaveform, whose dense() method interpolates them at any times before
+building the complex modes (as utils.obtain_processed_output()).
+"""
+
+import numpy as np
+from scipy.interpolate import CubicSpline
+from . import utils
+from . import fits
+from . import nr_calibration as nrcalib
+from . import basis_compression
+
+#----------------------------------------------------------------------------------------------------
+def _basis_columns(B, indices):
+    """ columns of a dense or compressed basis matrix at the given time indices """
+    if isinstance(B, basis_compression.LowRankBasis):
+        return basis_compression.LowRankBasis(B.left, B.right[:,indices])
+    return B[:,indices]
+
+#----------------------------------------------------------------------------------------------------
+def sparse_indices(n_times, step):
+    """ every step-th index of a time grid of n_times samples, always including the last one """
+    indices = np.arange(0, n_times, step)
+    if indices[-1] != n_times - 1:
+        indices = np.append(indices, n_times - 1)
+    return indices
+
+#----------------------------------------------------------------------------------------------------
+class SparseWaveform:
+    """
+    Surrogate modes represented by their datapieces on a sparse time grid
+
+    Attributes
+    ==========
+        t : sparse times (calibrated and in SI units if requested, as the output of
+            generate_surrogate())
+        datapieces : dictionary {mode: (datapiece_1, datapiece_2)} for the m>0 modes, already
+                     multiplied by the normalization, the NR calibration and the SI scaling
+                     of the strain
+        kinds : dictionary {mode: 'amp_phase' or 'coorbital_re_im'}
+        t_dense : times of the full surrogate grid (same units as t)
+        orb_phase, inclination, neg_modes, mode_sum : default arguments of dense(), i.e. those
+                                                      given to generate_surrogate()
+        phase_offset : added to the unwrapped phase of h22, see utils.coorbital_to_inertial()
+
+    For 'amp_phase' modes, h = datapiece_1 exp(-i datapiece_2). For 'coorbital_re_im'
+    modes, h = (datapiece_1 - i datapiece_2) exp(i m Phi) where Phi is the orbital phase,
+    i.e. half the phase of h22.
+    """
+
+    def __init__(self, t, datapieces, kinds, t_dense, orb_phase=None, inclination=None,
+                 neg_modes=True, mode_sum=False, phase_offset=0.0):
+        self.t = t
+        self.datapieces = datapieces
+        self.kinds = kinds
+        self.t_dense = t_dense
+        self.orb_phase = orb_phase
+        self.inclination = inclination
+        self.neg_modes = neg_modes
+        self.mode_sum = mode_sum
+        self.phase_offset = phase_offset
+        self._splines = {}
+
+    def _spline(self, mode, i):
+        if (mode, i) not in self._splines:
+            self._splines[(mode, i)] = CubicSpline(self.t, self.datapieces[mode][i])
+        return self._splines[(mode, i)]
+
+    def amp_phase(self, mode, times=None):
+        """ amplitude and phase of an 'amp_phase' mode, interpolated at times (default: sparse
+            times) """
+        if times is None:
+            return self.datapieces[mode]
+        return self._spline(mode, 0)(times), self._spline(mode, 1)(times)
+
+    def dense(self, times=None, orb_phase=None, inclination=None, neg_modes=None, mode_sum=None):
+        """
+        Reconstructs the complex modes at the given times, as generate_surrogate() would
+        return them on that time grid
+
+        Inputs
+        ======
+            times : array of times in the units of t. Default: t_dense
+            orb_phase, inclination : if both are given, the modes are evaluated on the sphere
+            neg_modes : if True, the m<0 modes are added using the orbital plane symmetry
+            mode_sum : if True (needs orb_phase and inclination), the modes are summed
+            The defaults of orb_phase, inclination, neg_modes and mode_sum are the attributes
+            of the same name.
+
+        Outputs
+        =======
+            times, h : h is a dictionary of modes, or the summed waveform if mode_sum=True
+        """
+        times = self.t_dense if times is None else np.asarray(times)
+        orb_phase = self.orb_phase if orb_phase is None else orb_phase
+        inclination = self.inclination if inclination is None else inclination
+        neg_modes = self.neg_modes if neg_modes is None else neg_modes
+        mode_sum = self.mode_sum if mode_sum is None else mode_sum
+
+        h = {}
+        # orbital phase for the coorbital modes, with the same 2pi branch as
+        # utils.coorbital_to_inertial() which unwraps the phase of h22 from its first sample
+        if 'coorbital_re_im' in self.kinds.values():
+            phase_22 = self.datapieces[(2,2)][1]
+            offset = np.angle(np.exp(-1j*phase_22[0])) + phase_22[0] + self.phase_offset
+            orbital_phase = (offset - self.amp_phase((2,2), times)[1])/2
+        for mode, kind in self.kinds.items():
+            (l,m) = mode
+            if kind == 'amp_phase':
+                amp, phase = self.amp_phase(mode, times)
+                h[mode] = amp*np.exp(-1j*phase)
+            else:
+                re, im = self._spline(mode, 0)(times), self._spline(mode, 1)(times)
+                h[mode] = (re - 1j*im)*np.exp(1j*m*orbital_phase)
+
+        if neg_modes:
+            h = utils.generate_negative_m_mode(h)
+        if orb_phase is not None and inclination is not None:
+            h = utils.evaluate_on_sphere(inclination, orb_phase, h)
+            if mode_sum:
+                return times, utils.sum_modes(h)
+        elif mode_sum:
+            raise ValueError("mode_sum needs orb_phase and inclination")
+        return times, h
+
+#----------------------------------------------------------------------------------------------------
+def evaluate_sparse(X_sur, X_calib, time, modes, alpha_coeffs, beta_coeffs,
+                    alpha_beta_functional_form, calibrated, M_tot, dist_mpc, orb_phase, inclination,
+                    fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, fit_func,
+                    decomposition_funcs, norm, mode_sum, neg_modes, lmax, CoorbToInert, step,
+                    phase_offset=0.0):
+    """
+    Evaluates the datapieces of the modes every step-th time sample and returns a
+    SparseWaveform. The inputs are those of eval_surrogates.evaluate_surrogate(), phase_offset
+    that of utils.obtain_processed_output().
+    """
+    time = np.asarray(time)
+    indices = sparse_indices(len(time), step)
+
+    # NR calibration : alpha rescales the modes, beta the time
+    if calibrated:
+        beta = nrcalib.evaluate_beta(X_calib, beta_coeffs, alpha_beta_functional_form)
+        if lmax>5:
+            print('**** warning **** : only modes up to \ell=5 are NR calibrated')
+    else:
+        beta = 1.0
+        print('**** warning **** : modes are NOT NR calibrated - waveforms only have 0PA contribution')
+
+    # SI units
+    t_unit, h_unit = 1.0, 1.0
+    if M_tot is not None and dist_mpc is not None:
+        t_unit, h_unit = utils.geo_to_SI_units(M_tot, dist_mpc)
+
+    datapieces, kinds = {}, {}
+    for mode in modes:
+        (l,m) = mode
+        if l>lmax:
+            continue
+        alpha = nrcalib.evaluate_alpha(X_calib, l, alpha_coeffs, alpha_beta_functional_form) \
+                if calibrated else 1.0
+        scale = norm*alpha*h_unit
+
+        decomposition_func = decomposition_funcs[0] if mode==(2,2) else decomposition_funcs[1]
+        d_1 = fits._EIM_B_to__waveform_datapiece(_basis_columns(B_dict_1[mode], indices),
+                        fits._evaluate_EIM_nodes(X_sur, fit_data_dict_1[mode], fit_func))
+        d_2 = fits._EIM_B_to__waveform_datapiece(_basis_columns(B_dict_2[mode], indices),
+                        fits._evaluate_EIM_nodes(X_sur, fit_data_dict_2[mode], fit_func))
+
+        if decomposition_func is utils.amp_ph_to_comp:
+            datapieces[mode] = (d_1*scale, d_2)
+            kinds[mode] = 'amp_phase'
+        elif decomposition_func is utils.re_im_to_comp and CoorbToInert:
+            datapieces[mode] = (d_1*scale, d_2*scale)
+            kinds[mode] = 'coorbital_re_im'
+        else:
+            raise ValueError("sparse output is not available for this decomposition")
+
+    if 'coorbital_re_im' in kinds.values() and (2,2) not in datapieces:
+        raise ValueError("the (2,2) mode is needed to transform the coorbital modes")
+
+    return SparseWaveform(time[indices]*beta*t_unit, datapieces, kinds, time*beta*t_unit,
+                          orb_phase, inclination, neg_modes, mode_sum, phase_offset)
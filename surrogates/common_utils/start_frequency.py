@@ -0,0 +1,103 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : start time of the waveform from a starting GW frequency (f_low)
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Locates the first time sample at which the frequency of the (2,2) mode reaches f_low, from
+its phase datapiece evaluated on a coarse subset of the time samples, so that the surrogate
+only evaluates the samples from there on. f_low is in Hz in physical units, otherwise in 1/M.
+"""
+
+import numpy as np
+from scipy.interpolate import CubicSpline
+from . import utils
+from . import fits
+from . import nr_calibration as nrcalib
+from . import basis_compression
+
+# number of coarse samples on which the (2,2) phase is evaluated
+_n_coarse = 256
+
+#----------------------------------------------------------------------------------------------------
+def _basis_columns(B, start, stop=None, step=None):
+    """ columns start:stop:step of a dense or compressed basis matrix """
+    columns = slice(start, stop, step)
+    if isinstance(B, basis_compression.LowRankBasis):
+        return basis_compression.LowRankBasis(B.left, B.right[:,columns])
+    return B[:,columns]
+
+#----------------------------------------------------------------------------------------------------
+def frequency_22(X_sur, time, fit_data_22, B_22, fit_func):
+    """
+    Frequency of the uncalibrated (2,2) mode in units of 1/M, from its phase datapiece evaluated
+    on a coarse time grid
+
+    Inputs
+    ======
+        X_sur : surrogate parameterization
+        time : time samples of the surrogate
+        fit_data_22, B_22 : fit data and basis matrix of the (2,2) phase datapiece
+        fit_func : 'spline_1d', 'GPR_fits' or 'tabulated_1d'
+
+    Outputs
+    =======
+        cubic spline of the frequency (a function of the uncalibrated time)
+    """
+    step = max(1, len(time)//_n_coarse)
+    coarse = np.arange(0, len(time), step)
+    eim_values = fits._evaluate_EIM_nodes(X_sur, fit_data_22, fit_func)
+    phase = fits._EIM_B_to__waveform_datapiece(_basis_columns(B_22, 0, None, step), eim_values)
+    # h22 = amp exp(-i phase) (see fits._combine_datapieces)
+    return CubicSpline(np.asarray(time)[coarse], phase).derivative()
+
+#----------------------------------------------------------------------------------------------------
+def start_index(f_low, X_sur, X_calib, time, fit_data_22, B_22, fit_func, beta_coeffs,
+                alpha_beta_functional_form, calibrated, M_tot, dist_mpc):
+    """
+    Index of the last time sample at which the frequency of the (2,2) mode is below f_low, so
+    that the waveform from that index on starts at f_low. Returns 0 (with a warning) if the
+    waveform starts above f_low.
+    """
+    time = np.asarray(time)
+    omega = frequency_22(X_sur, time, fit_data_22, B_22, fit_func)
+    freq = np.abs(omega(time))/(2*np.pi)
+
+    if calibrated:
+        freq = freq/nrcalib.evaluate_beta(X_calib, beta_coeffs, alpha_beta_functional_form)
+    if M_tot is not None and dist_mpc is not None:
+        freq = freq/utils.geo_to_SI_units(M_tot, dist_mpc)[0]
+
+    above = np.flatnonzero(freq >= f_low)
+    if len(above) == 0:
+        raise ValueError("f_low=%g is above the largest frequency of the (2,2) mode (%g)"
+                         %(f_low, np.max(freq)))
+    if above[0] == 0:
+        print('**** warning **** : the waveform starts above f_low=%g (at %g). Returning the '
+              'full waveform.'%(f_low, freq[0]))
+        return 0
+    return above[0] - 1
+
+#----------------------------------------------------------------------------------------------------
+def truncate(index, time, B_dict_1, B_dict_2):
+    """ time samples and basis matrices from index on """
+    return np.asarray(time)[index:], \
+           {mode: _basis_columns(B, index) for mode, B in B_dict_1.items()}, \
+           {mode: _basis_columns(B, index) for mode, B in B_dict_2.items()}
+
+#----------------------------------------------------------------------------------------------------
+def phase_offset(index, X_sur, fit_data_22, B_22, fit_func):
+    """
+    Offset (a multiple of 2pi) between the phase of h22 unwrapped from the first sample of the
+    full time grid and that unwrapped from the sample index, from columns 0 and index of the
+    basis matrix of the (2,2) phase datapiece. Adding it to the unwrapped phase of the
+    truncated h22 gives the orbital phase of the full waveform, see utils.coorbital_to_inertial()
+    """
+    if index == 0:
+        return 0.0
+    eim_values = fits._evaluate_EIM_nodes(X_sur, fit_data_22, fit_func)
+    phase = fits._EIM_B_to__waveform_datapiece(_basis_columns(B_22, 0, index+1, index), eim_values)
+    # h22 = amp exp(-i phase) : np.unwrap(np.angle(h22)) = offset - phase
+    offsets = np.angle(np.exp(-1j*phase)) + phase
+    return offsets[0] - offsets[1]
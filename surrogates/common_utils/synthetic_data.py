@@ -0,0 +1,308 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : writes small synthetic h5 files with the same layout as the
+##               BHPTNRSur1dq1e4 and BHPTNRSur2dq1e3 data files
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Writes small synthetic h5 files with the layout of BHPTNRSur1dq1e4.h5 (splines) and
+BHPTNRSur2dq1e3.h5 (GPRs), built from a toy family of chirping waveforms, which the loaders
+and evaluators read as the real data (see tests/conftest.py). They are NOT physical waveforms.
+
+    python synthetic_data.py PATH-TO/test_data --model both
+"""
+
+import argparse
+import numpy as np
+import h5py
+from scipy.interpolate import splrep
+from scipy.linalg import cho_solve
+
+# modes stored in each of the data files
+BHPTNRSur1dq1e4_modes = [(2,2),(2,1),(3,1),(3,2),(3,3),(4,2),(4,3),(4,4),
+                         (5,3),(5,4),(5,5),(6,4),(6,5),(6,6),(7,5),(7,6),(7,7),
+                         (8,6),(8,7),(8,8),(9,7),(9,8),(9,9),(10,8),(10,9)]
+BHPTNRSur1dq1e4_nrcalib_modes = [(2,2),(3,3),(4,4),(5,5)]
+
+BHPTNRSur2dq1e3_modes = [(2,2),(2,1),(3,1),(3,2),(3,3),(4,2),(4,3),(4,4)]
+BHPTNRSur2dq1e3_nrcalib_modes = [(2,2),(3,3),(4,4)]
+
+#----------------------------------------------------------------------------------------------------
+def string_to_chars(string):
+    """ inverse of utils.chars_to_string() : string to array of unicode code points """
+    return np.array([ord(c) for c in string])
+
+#----------------------------------------------------------------------------------------------------
+def _toy_mode_datapieces(times, X, mode, mode_params):
+    """
+    Toy model for a single mode as a function of the surrogate parameters X
+    (X = [log10(q)] or [log10(q), chi1]).
+    Returns the amplitude, the phase of the 22 mode and a slowly varying coorbital
+    phase offset for the higher modes.
+    """
+    x = np.atleast_1d(X)
+    chi = x[1] if len(x) > 1 else 0.0
+    (l,m) = mode
+
+    # orbital frequency increasing towards t=0 and constant during the ringdown
+    tau0 = 300.0 * (1.0 + 0.3*x[0]) * (1.0 - 0.2*chi)
+    omega_merger = 0.25 * (1.0 + 0.1*chi)
+    tau = np.clip(-times, 0.0, None)
+    omega = omega_merger * (1.0 + tau/tau0)**(-0.375)
+    # orbital phase obtained with trapezoidal integration
+    phase = np.concatenate(([0.0], np.cumsum(0.5*(omega[1:] + omega[:-1])*np.diff(times))))
+
+    # amplitude follows the frequency during the inspiral and decays after the merger
+    amp = omega**(2.0/3.0) * np.exp(-np.clip(times, 0.0, None)/(8.0 + 2.0*chi))
+    amp = amp * mode_params['amp_scale'] * (1.0 + mode_params['amp_slope']*x[0])
+
+    # coorbital phase offset of the higher modes
+    offset = mode_params['offset'] + 0.05*x[0] + 0.1*chi + 0.02*times/np.abs(times[0])
+
+    return amp, 2.0*phase, offset
+
+#----------------------------------------------------------------------------------------------------
+def _reduced_basis_and_eim(training_data, n_nodes):
+    """
+    Builds an orthonormal basis (SVD) of the training data (n_train, n_times) and selects
+    n_nodes EIM nodes greedily.
+    Returns B (n_nodes, n_times) such that data ~ B.T @ data[eim_indices], and the nodes.
+    """
+    n_nodes = min(n_nodes, training_data.shape[0])
+    _, _, Vh = np.linalg.svd(training_data, full_matrices=False)
+    V = Vh[:n_nodes].T
+
+    eim_indices = [int(np.argmax(np.abs(V[:,0])))]
+    for j in range(1, n_nodes):
+        coefs = np.linalg.solve(V[eim_indices,:j], V[eim_indices,j])
+        residual = V[:,j] - np.dot(V[:,:j], coefs)
+        eim_indices.append(int(np.argmax(np.abs(residual))))
+    eim_indices = np.array(eim_indices)
+
+    B = np.dot(V, np.linalg.inv(V[eim_indices,:])).T
+    return B, eim_indices
+
+#----------------------------------------------------------------------------------------------------
+def _random_mode_params(rng, mode):
+    """ random (but reproducible) amplitude scale and coorbital offset of a mode """
+    (l,m) = mode
+    return {'amp_scale': (1.0 if mode==(2,2) else 0.3/(l-1)**2/(1+l-m)) * rng.uniform(0.8, 1.2),
+            'amp_slope': rng.uniform(-0.05, 0.05),
+            'offset': rng.uniform(-np.pi, np.pi)}
+
+#----------------------------------------------------------------------------------------------------
+def _mode_training_data(times, X_train, mode, mode_params, decomposition):
+    """
+    Training datapieces of a mode : amplitude/phase or coorbital real/imag parts
+    Returns two arrays of shape (n_train, n_times)
+    """
+    data_1, data_2 = [], []
+    for X in X_train:
+        amp, phase, offset = _toy_mode_datapieces(times, X, mode, mode_params)
+        if decomposition == 'amp_phase':
+            data_1.append(amp)
+            data_2.append(phase*mode[1]/2.0 + offset*(mode!=(2,2)))
+        else:
+            data_1.append(amp*np.cos(offset))
+            data_2.append(amp*np.sin(offset))
+    return np.array(data_1), np.array(data_2)
+
+#----------------------------------------------------------------------------------------------------
+def _write_spline_datapiece(group, suffix, B_name, eim_name, times, X_train, data, n_nodes):
+    """ writes basis, EIM nodes and spline fits of one datapiece in BHPTNRSur1dq1e4 layout """
+    B, eim_indices = _reduced_basis_and_eim(data, n_nodes)
+    knots, coefs = [], []
+    for indx in eim_indices:
+        t, c, k = splrep(X_train, data[:,indx], k=3, s=0)
+        knots.append(t)
+        coefs.append(c)
+    # the spline loader transposes B on read
+    group.create_dataset(B_name, data=B.T)
+    group.create_dataset(eim_name, data=eim_indices)
+    group.create_dataset('spline_knots_%s'%suffix, data=np.array(knots))
+    group.create_dataset('fitparams_%s'%suffix, data=np.array(coefs))
+
+#----------------------------------------------------------------------------------------------------
+def write_BHPTNRSur1dq1e4_like(fname, n_times=2000, duration=2000.0, n_nodes=8, n_train=16,
+                               wf_modes=None, nrcalib_modes=None, seed=0):
+    """
+    Writes a synthetic spline surrogate file with the layout of BHPTNRSur1dq1e4.h5
+
+    Inputs
+    ======
+        fname : output h5 file
+        n_times : number of time samples
+        duration : length of the waveforms in M (merger at t=0, ringdown up to t=100M)
+        n_nodes : number of EIM nodes per datapiece
+        n_train : number of training values of log10(q) between log10(2.5) and 4
+        wf_modes : modes to write. Default: all BHPTNRSur1dq1e4 modes
+        nrcalib_modes : modes with NR calibration coefficients. Default: (2,2),(3,3),(4,4),(5,5)
+        seed : seed of the random number generator
+    """
+    if wf_modes is None:
+        wf_modes = BHPTNRSur1dq1e4_modes
+    if nrcalib_modes is None:
+        nrcalib_modes = BHPTNRSur1dq1e4_nrcalib_modes
+
+    rng = np.random.default_rng(seed)
+    times = np.linspace(-duration, 100.0, n_times)
+    X_train = np.linspace(np.log10(2.5), np.log10(10000), n_train)
+
+    with h5py.File(fname, 'w') as f:
+        for mode in wf_modes:
+            group = f.create_group('l%s_m%s'%(mode[0], mode[1]))
+            group.create_dataset('times', data=times)
+            group.create_dataset('degree', data=np.array([3]))
+            mode_params = _random_mode_params(rng, mode)
+            # 22 mode in amplitude/phase, higher modes in coorbital real/imag parts
+            if mode==(2,2):
+                data_1, data_2 = _mode_training_data(times, X_train, mode, mode_params, 'amp_phase')
+                _write_spline_datapiece(group, 'amp', 'B', 'eim_indices', times, X_train, data_1, n_nodes)
+                _write_spline_datapiece(group, 'phase', 'B_phase', 'eim_indices_phase', times, X_train,
+                                        data_2, n_nodes)
+            else:
+                data_1, data_2 = _mode_training_data(times, X_train, mode, mode_params, 're_im')
+                _write_spline_datapiece(group, 're', 'B', 'eim_indices', times, X_train, data_1, n_nodes)
+                _write_spline_datapiece(group, 'im', 'B_im', 'eim_indices_im', times, X_train,
+                                        data_2, n_nodes)
+
+        # nr calibration coefficients of 1 + a x + b x^2 + c x^3 + d x^4
+        for mode in nrcalib_modes:
+            group = f.create_group('nr_calib_params/(%d,%d)'%(mode[0], mode[1]))
+            group.create_dataset('alpha', data=rng.uniform(-0.2, 0.2, 4))
+        f['nr_calib_params/(2,2)'].create_dataset('beta', data=rng.uniform(-0.2, 0.2, 4))
+
+#----------------------------------------------------------------------------------------------------
+def _write_kernel(group, constant_value, length_scale, noise_level):
+    """ writes the kernel_ group of a ConstantKernel*RBF + WhiteKernel GPR as pySurrogate does """
+    c_bounds, l_bounds, n_bounds = np.array([1e-3, 1e3]), np.array([[1e-2, 1e2]]*len(length_scale)), \
+                                   np.array([1e-12, 1e-2])
+    names = {'name': 'Sum', 'k1/name': 'Product', 'k1/k1/name': 'ConstantKernel',
+             'k1/k2/name': 'RBF', 'k1__k1/name': 'ConstantKernel', 'k1__k2/name': 'RBF',
+             'k2/name': 'WhiteKernel'}
+    for key, name in names.items():
+        group.create_dataset(key, data=string_to_chars(name))
+    values = {'k2__noise_level': noise_level, 'k2__noise_level_bounds': n_bounds,
+              'k1__k2__length_scale': length_scale, 'k1__k2__length_scale_bounds': l_bounds,
+              'k1__k1__constant_value': constant_value, 'k1__k1__constant_value_bounds': c_bounds,
+              'k1/k1__constant_value': constant_value, 'k1/k1__constant_value_bounds': c_bounds,
+              'k1/k2__length_scale': length_scale, 'k1/k2__length_scale_bounds': l_bounds,
+              'k1/k1/constant_value': constant_value, 'k1/k1/constant_value_bounds': c_bounds,
+              'k1/k2/length_scale': length_scale, 'k1/k2/length_scale_bounds': l_bounds,
+              'k1__k1/constant_value': constant_value, 'k1__k1/constant_value_bounds': c_bounds,
+              'k1__k2/length_scale': length_scale, 'k1__k2/length_scale_bounds': l_bounds,
+              'k2/noise_level': noise_level, 'k2/noise_level_bounds': n_bounds}
+    for key, value in values.items():
+        group.create_dataset(key, data=value)
+
+#----------------------------------------------------------------------------------------------------
+def _write_gpr_node(group, X_train, y_train, length_scale, noise_level):
+    """
+    Fits one EIM node with a linear model plus a GPR of the normalized residual and writes
+    the result in the pySurrogate layout
+    """
+    # linear fit subtracted before the GPR fit
+    design = np.hstack([X_train, np.ones((len(X_train), 1))])
+    lin_coefs = np.linalg.lstsq(design, y_train, rcond=None)[0]
+    residual = y_train - np.dot(design, lin_coefs)
+    data_mean, data_std = np.mean(residual), np.std(residual)
+    if data_std == 0:
+        data_std = 1.0
+    y_normed = (residual - data_mean)/data_std
+
+    # GPR with kernel C*RBF + White; hyperparameters are fixed, not optimized
+    constant_value = 1.0
+    diff = (X_train[:,None,:] - X_train[None,:,:])/length_scale
+    K = constant_value*np.exp(-0.5*np.sum(diff**2, axis=-1)) + noise_level*np.eye(len(X_train))
+    L = np.linalg.cholesky(K)
+    alpha = cho_solve((L, True), y_normed)
+
+    group.create_dataset('data_mean', data=data_mean)
+    group.create_dataset('data_std', data=data_std)
+    group.create_dataset('lin_reg_params/coef_', data=lin_coefs[:-1])
+    group.create_dataset('lin_reg_params/intercept_', data=lin_coefs[-1])
+    group.create_dataset('GPR_params/X_train_', data=X_train)
+    group.create_dataset('GPR_params/alpha_', data=alpha)
+    group.create_dataset('GPR_params/_y_train_mean', data=0.0)
+    group.create_dataset('GPR_params/L_', data=L)
+    _write_kernel(group.create_group('GPR_params/kernel_'), constant_value, length_scale, noise_level)
+
+#----------------------------------------------------------------------------------------------------
+def _write_gpr_datapiece(group, suffix, times, X_train, data, n_nodes, length_scale, noise_level):
+    """ writes basis, EIM nodes and GPR fits of one datapiece in BHPTNRSur2dq1e3 layout """
+    B, eim_indices = _reduced_basis_and_eim(data, n_nodes)
+    group.create_dataset('B_%s'%suffix, data=B)
+    group.create_dataset('eim_indicies_%s'%suffix, data=eim_indices)
+    gpr_group = group.create_group('gpr_%s'%suffix)
+    gpr_group.create_dataset('fitType', data=string_to_chars('GPR'))
+    for node_indx, indx in enumerate(eim_indices):
+        _write_gpr_node(gpr_group.create_group('node%s'%node_indx), X_train, data[:,indx],
+                        length_scale, noise_level)
+
+#----------------------------------------------------------------------------------------------------
+def write_BHPTNRSur2dq1e3_like(fname, n_times=2000, duration=2000.0, n_nodes=6, n_train_q=5,
+                               n_train_chi=4, wf_modes=None, nrcalib_modes=None, seed=0):
+    """
+    Writes a synthetic GPR surrogate file with the layout of BHPTNRSur2dq1e3.h5, including
+    the separate 'negative_spin' and 'positive_spin' sub-surrogates
+
+    Inputs
+    ======
+        fname : output h5 file
+        n_times : number of time samples of the positive spin sub-surrogate; the negative spin
+                  sub-surrogate is slightly shorter, as in the real data
+        duration : length of the waveforms in M (merger at t=0, ringdown up to t=100M)
+        n_nodes : number of EIM nodes per datapiece
+        n_train_q, n_train_chi : size of the training grid in log10(q) and chi1 for each
+                                 sub-surrogate
+        wf_modes : modes to write. Default: all BHPTNRSur2dq1e3 modes
+        nrcalib_modes : modes with NR calibration coefficients. Default: (2,2),(3,3),(4,4)
+        seed : seed of the random number generator
+    """
+    if wf_modes is None:
+        wf_modes = BHPTNRSur2dq1e3_modes
+    if nrcalib_modes is None:
+        nrcalib_modes = BHPTNRSur2dq1e3_nrcalib_modes
+
+    rng = np.random.default_rng(seed)
+    mode_params = {mode: _random_mode_params(rng, mode) for mode in wf_modes}
+    length_scale = np.array([1.0, 0.8])
+    noise_level = 1e-8
+
+    with h5py.File(fname, 'w') as f:
+        for spin_sign, chi_range, n_sign in [('negative_spin', (-0.8, 0.0), n_times - n_times//10),
+                                             ('positive_spin', (0.0, 0.8), n_times)]:
+            times = np.linspace(-duration*n_sign/n_times, 100.0, n_sign)
+            q_train, chi_train = np.meshgrid(np.linspace(np.log10(3), np.log10(1000), n_train_q),
+                                             np.linspace(chi_range[0], chi_range[1], n_train_chi))
+            X_train = np.array([q_train.flatten(), chi_train.flatten()]).T
+            for mode in wf_modes:
+                group = f.create_group('%s/l%s_m%s'%(spin_sign, mode[0], mode[1]))
+                group.create_dataset('times', data=times)
+                # all modes are modelled in amplitude/phase
+                data_1, data_2 = _mode_training_data(times, X_train, mode, mode_params[mode], 'amp_phase')
+                _write_gpr_datapiece(group, 'amp', times, X_train, data_1, n_nodes, length_scale, noise_level)
+                _write_gpr_datapiece(group, 'phase', times, X_train, data_2, n_nodes, length_scale,
+                                     noise_level)
+
+        # nr calibration coefficients [a1, a2, a3, a4, b1, b2]
+        for mode in nrcalib_modes:
+            group = f.create_group('nr_calib_params/(%d,%d)'%(mode[0], mode[1]))
+            group.create_dataset('alpha', data=rng.uniform(-0.2, 0.2, 6))
+        f['nr_calib_params/(2,2)'].create_dataset('beta', data=rng.uniform(-0.2, 0.2, 6))
+
+#----------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Write synthetic BHPTNRSurrogate h5 files for "
+                                                 "offline testing")
+    parser.add_argument('h5_data_dir', help='directory in which the h5 files are written')
+    parser.add_argument('--model', default='both', choices=['BHPTNRSur1dq1e4', 'BHPTNRSur2dq1e3', 'both'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.model in ['BHPTNRSur1dq1e4', 'both']:
+        write_BHPTNRSur1dq1e4_like('%s/BHPTNRSur1dq1e4.h5'%args.h5_data_dir, seed=args.seed)
+    if args.model in ['BHPTNRSur2dq1e3', 'both']:
+        write_BHPTNRSur2dq1e3_like('%s/BHPTNRSur2dq1e3.h5'%args.h5_data_dir, seed=args.seed)
@@ -0,0 +1,270 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : template bank generation with streaming HDF5 output and checkpoints
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+Generates the waveforms of a list of parameters chunk by chunk (optionally in parallel
+processes) and streams each chunk into a chunked HDF5 file; an interrupted run is resumed by
+running the same command again.
+
+    python -m common_utils.template_bank params.csv bank.h5 --model BHPTNRSur1dq1e4 --workers 8
+
+The parameter file has a header line naming its columns (e.g. 'q, spin1'); columns named
+after an argument of generate_surrogate() set it per waveform. The file holds params/<name>,
+t, h or h_<l>_<m> (one row per waveform, zero padded to the longest), length (valid samples
+of each row) and chunk_done, with the model and arguments as attributes.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import importlib
+import numpy as np
+import h5py
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# largest number of time samples of an HDF5 storage chunk (1 MB of complex samples)
+_time_chunk = 65536
+
+#----------------------------------------------------------------------------------------------------
+def read_parameter_file(fname):
+    """ Reads a parameter file with a header line; returns a dictionary {column: array} """
+    delimiter = ',' if fname.endswith('.csv') else None
+    with open(fname) as f:
+        header = f.readline()
+    delimiter = ',' if ',' in header else delimiter
+    names = [name.strip() for name in header.lstrip('#').split(delimiter) if name.strip()]
+    data = np.loadtxt(fname, delimiter=delimiter, skiprows=1, ndmin=2)
+    if data.shape[1] != len(names):
+        raise ValueError("%s : %d columns in the header and %d in the data"
+                         %(fname, len(names), data.shape[1]))
+    return {name: data[:,i] for i, name in enumerate(names)}
+
+#----------------------------------------------------------------------------------------------------
+def _bank_hash(params, kwargs):
+    """ hash identifying the content of a bank (parameters and generation arguments) """
+    hash_md5 = hashlib.md5(json.dumps(kwargs, sort_keys=True, default=str).encode())
+    for name in sorted(params.keys()):
+        hash_md5.update(name.encode())
+        hash_md5.update(np.ascontiguousarray(params[name], dtype=float).tobytes())
+    return hash_md5.hexdigest()
+
+#----------------------------------------------------------------------------------------------------
+# model module and waveform cache of a worker process, set once by _init_worker()
+_worker_model = None
+_worker_cache = None
+
+def _init_worker(model_name, surrogates_dir, cache_dir=None, cache_bytes=None):
+    global _worker_model, _worker_cache
+    if surrogates_dir not in sys.path:
+        sys.path.insert(0, surrogates_dir)
+    _worker_model = importlib.import_module(model_name)
+    if cache_dir is not None:
+        from .waveform_cache import WaveformCache
+        _worker_cache = WaveformCache(cache_dir, **({} if cache_bytes is None 
+                                                    else {'max_bytes': cache_bytes}))
+
+#----------------------------------------------------------------------------------------------------
+def _generate_chunk(chunk_index, rows, kwargs):
+    """ Generates the waveforms of one chunk; rows is a list of per waveform arguments """
+    ts, hs = [], []
+    for row in rows:
+        if _worker_cache is not None:
+            t, h = _worker_cache.generate(_worker_model, **kwargs, **row)
+        else:
+            t, h = _worker_model.generate_surrogate(**kwargs, **row)
+        ts.append(t)
+        hs.append(h)
+    return chunk_index, ts, hs
+
+#----------------------------------------------------------------------------------------------------
+def _dataset_names(h):
+    """ names of the output datasets of a waveform and the corresponding keys of h """
+    if isinstance(h, dict):
+        return {'h_%d_%d'%mode: mode for mode in h.keys()}
+    return {'h': None}
+
+#----------------------------------------------------------------------------------------------------
+def _write_chunk(f, chunk_index, chunk_size, ts, hs):
+    """ writes the waveforms of a chunk into the bank and marks the chunk as complete """
+    start = chunk_index*chunk_size
+    stop = start + len(ts)
+    n_times = max(len(t) for t in ts)
+
+    names = _dataset_names(hs[0])
+    if 't' not in f:
+        n_waveforms = len(f['length'])
+        # storage chunks of one waveform, so that reading a waveform reads no other one
+        storage_chunk = (1, min(n_times, _time_chunk))
+        f.create_dataset('t', shape=(n_waveforms, n_times), maxshape=(n_waveforms, None),
+                         dtype=float, chunks=storage_chunk)
+        for name in names.keys():
+            f.create_dataset(name, shape=(n_waveforms, n_times), maxshape=(n_waveforms, None),
+                             dtype=complex, chunks=storage_chunk)
+    if n_times > f['t'].shape[1]:
+        for name in ['t'] + list(names.keys()):
+            f[name].resize(n_times, axis=1)
+
+    # written row by row, zero padded, to avoid a copy of the whole chunk
+    for name, key in [('t', None)] + list(names.items()):
+        row = np.zeros(f[name].shape[1], dtype=f[name].dtype)
+        for i in range(len(ts)):
+            values = ts[i] if name == 't' else (hs[i] if key is None else hs[i][key])
+            row[:len(values)] = values
+            row[len(values):] = 0
+            f[name][start + i] = row
+    f['length'][start:stop] = [len(t) for t in ts]
+
+    # the chunk is only flagged once its data is on disk
+    f.flush()
+    f['chunk_done'][chunk_index] = True
+    f.flush()
+
+#----------------------------------------------------------------------------------------------------
+def _open_bank(output, model, params, kwargs, chunk_size, n_waveforms):
+    """ creates the bank file, or re-opens it to resume if it holds the same bank """
+    bank_hash = _bank_hash(params, dict(kwargs, model=model, chunk_size=chunk_size))
+    if os.path.isfile(output):
+        f = h5py.File(output, 'a')
+        if f.attrs.get('bank_hash') != bank_hash:
+            f.close()
+            raise ValueError("%s holds a different bank (parameters or arguments differ); "
+                             "remove it or choose another output file"%output)
+        return f
+
+    f = h5py.File(output, 'w')
+    f.attrs['model'] = model
+    f.attrs['chunk_size'] = chunk_size
+    f.attrs['generate_surrogate_kwargs'] = json.dumps(kwargs, default=str)
+    f.attrs['bank_hash'] = bank_hash
+    for name, values in params.items():
+        f.create_dataset('params/%s'%name, data=values)
+    f.create_dataset('length', shape=(n_waveforms,), dtype=int)
+    f.create_dataset('chunk_done', shape=((n_waveforms + chunk_size - 1)//chunk_size,), dtype=bool)
+    f.flush()
+    return f
+
+#----------------------------------------------------------------------------------------------------
+def generate_bank(model, params, output, chunk_size=16, workers=1, verbose=True, cache_dir=None,
+                  cache_bytes=None, **kwargs):
+    """
+    Generates the waveforms of all parameters and streams them into an HDF5 file.
+    If output already exists and holds the same bank, only the missing chunks are generated.
+
+    Inputs
+    ======
+        model : name of the model module, e.g. 'BHPTNRSur1dq1e4'
+        params : dictionary {argument name: array of values}, e.g. {'q': q_values}
+        output : path of the HDF5 file
+        chunk_size : number of waveforms generated and written together; up to 2 chunks per
+                     worker are held in memory
+        workers : number of worker processes; 1 generates the waveforms in this process
+        verbose : print the progress
+        cache_dir : directory of a waveform_cache.WaveformCache shared by the workers; waveforms
+                    found there are not evaluated again. Default: None (no cache)
+        cache_bytes : size limit of the cache. Default: None (WaveformCache default)
+        kwargs : arguments of generate_surrogate() common to all waveforms
+
+    Outputs
+    =======
+        number of chunks generated by this call
+    """
+    params = {name: np.asarray(values) for name, values in params.items()}
+    n_waveforms = len(next(iter(params.values())))
+    if any(len(values) != n_waveforms for values in params.values()):
+        raise ValueError("all parameter arrays must have the same length")
+    if kwargs.get('modes') is not None:
+        kwargs['modes'] = [tuple(int(x) for x in mode) for mode in kwargs['modes']]
+
+    def chunk_rows(chunk_index):
+        indices = range(chunk_index*chunk_size, min((chunk_index + 1)*chunk_size, n_waveforms))
+        return [{name: values[i].item() for name, values in params.items()} for i in indices]
+
+    surrogates_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    n_generated = 0
+    with _open_bank(output, model, params, kwargs, chunk_size, n_waveforms) as f:
+        todo = [i for i, done in enumerate(f['chunk_done'][()]) if not done]
+        if verbose:
+            print("**** %d of %d chunks to generate ****"%(len(todo), len(f['chunk_done'])))
+
+        if workers == 1:
+            _init_worker(model, surrogates_dir, cache_dir, cache_bytes)
+            for chunk_index in todo:
+                _, ts, hs = _generate_chunk(chunk_index, chunk_rows(chunk_index), kwargs)
+                _write_chunk(f, chunk_index, chunk_size, ts, hs)
+                n_generated += 1
+                if verbose:
+                    print("... chunk %d written (%d/%d)"%(chunk_index, n_generated, len(todo)))
+            return n_generated
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model, surrogates_dir, cache_dir, 
+                                           cache_bytes)) as executor:
+            # at most 2 chunks per worker are in flight, which bounds the memory use
+            pending = set()
+            todo = iter(todo)
+            while True:
+                for chunk_index in todo:
+                    pending.add(executor.submit(_generate_chunk, chunk_index,
+                                                chunk_rows(chunk_index), kwargs))
+                    if len(pending) >= 2*workers:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_index, ts, hs = future.result()
+                    _write_chunk(f, chunk_index, chunk_size, ts, hs)
+                    n_generated += 1
+                    if verbose:
+                        print("... chunk %d written (%d generated)"%(chunk_index, n_generated))
+    return n_generated
+
+#----------------------------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BHPTNRSurrogate template bank generation")
+    parser.add_argument('params', help="parameter file with a header line, e.g. 'q' or 'q, spin1'")
+    parser.add_argument('output', help="output HDF5 file; an existing file is resumed")
+    parser.add_argument('--model', default='BHPTNRSur1dq1e4')
+    parser.add_argument('--chunk-size', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--modes', default=None, help="modes to generate, e.g. '2,2 3,3'")
+    parser.add_argument('--M-tot', type=float, default=None)
+    parser.add_argument('--dist-mpc', type=float, default=None)
+    parser.add_argument('--orb-phase', type=float, default=None)
+    parser.add_argument('--inclination', type=float, default=None)
+    parser.add_argument('--lmax', type=int, default=None)
+    parser.add_argument('--mode-sum', action='store_true')
+    parser.add_argument('--mode-tolerance', type=float, default=None)
+    parser.add_argument('--uncalibrated', action='store_true')
+    parser.add_argument('--no-neg-modes', action='store_true')
+    parser.add_argument('--cache-dir', default=None, help="directory of an on-disk waveform cache")
+    parser.add_argument('--cache-gb', type=float, default=None, help="size limit of the cache in GB")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    kwargs = {'M_tot': args.M_tot, 'dist_mpc': args.dist_mpc, 'orb_phase': args.orb_phase,
+              'inclination': args.inclination, 'mode_sum': args.mode_sum,
+              'calibrated': not args.uncalibrated, 'neg_modes': not args.no_neg_modes}
+    if args.modes is not None:
+        kwargs['modes'] = [tuple(int(x) for x in mode.split(',')) for mode in args.modes.split()]
+    if args.lmax is not None:
+        kwargs['lmax'] = args.lmax
+    if args.mode_tolerance is not None:
+        kwargs['mode_tolerance'] = args.mode_tolerance
+
+    params = read_parameter_file(args.params)
+    # per waveform columns override the common arguments
+    for name in params.keys():
+        kwargs.pop(name, None)
+
+    cache_bytes = None if args.cache_gb is None else int(args.cache_gb*1024**3)
+    generate_bank(args.model, params, args.output, chunk_size=args.chunk_size, workers=args.workers,
+                  verbose=not args.quiet, cache_dir=args.cache_dir, cache_bytes=cache_bytes, **kwargs)
+
+if __name__ == '__main__':
+    main()
@@ -5,9 +5,12 @@
 ##==============================================================================
 
 import numpy as np
+from scipy.interpolate import CubicSpline
 from gwtools import gwtools as _gwtools
 from gwtools.harmonics import sYlm as _sYlm
 from . import nr_calibration as nrcalib
+from . import profiling
+from . import mode_parallel
 from gwtools.gwtools import geo_to_SI
 
 #----------------------------------------------------------------------------------------------------
@@ -16,7 +19,8 @@ def chars_to_string(chars):
             - Copied from gwsurrogate: surrogatIO.py
             - Needed for reading in hdf5 file data.
     """
-    return "".join(chr(cc) for cc in chars)
+    # decode all characters at once from their utf-32 representation
+    return np.asarray(chars).astype('<u4').tobytes().decode('utf-32-le')
 
 #----------------------------------------------------------------------------------------------------
 def amp_ph_to_comp(amp,phase):
@@ -35,8 +39,11 @@ def re_im_to_comp(re, im):
     return full_wf
 
 #----------------------------------------------------------------------------------------------------
-def coorbital_to_inertial(h_coorb):
-    """ Transform the coorbital frame wf into the inertial frame"""
+def coorbital_to_inertial(h_coorb, phase_offset=0.0):
+    """ Transform the coorbital frame wf into the inertial frame
+        phase_offset : added to the unwrapped phase of h22, e.g. to keep the 2pi branch of the
+                       full time grid on a truncated one (see start_frequency.phase_offset())
+    """
     
     h_inertial = {}
     # 22 mode is in inertial frame and HMs are in coorbital phase
@@ -44,7 +51,7 @@ def coorbital_to_inertial(h_coorb):
         (l,m)=mode
         if mode==(2,2):
             # compute orbital phase
-            orbital_phase = np.unwrap(np.angle(h_coorb[mode]))/2
+            orbital_phase = (np.unwrap(np.angle(h_coorb[mode])) + phase_offset)/2
             h_inertial[mode] = h_coorb[mode]
         else:
             # transform HMs to inertial frame
@@ -52,6 +59,43 @@ def coorbital_to_inertial(h_coorb):
             
     return h_inertial
 
+#----------------------------------------------------------------------------------------------------
+def coorbital_to_inertial_derivatives(h_coorb, dh_coorb, phase_offset=0.0):
+    """ Derivatives of the inertial frame modes given the coorbital frame modes h_coorb and 
+        their derivatives dh_coorb (same keys) with respect to one parameter; phase_offset as in
+        coorbital_to_inertial() """
+
+    # the orbital phase is half the phase of the 22 mode : dphase = Im(dh22/h22)/2
+    orbital_phase = (np.unwrap(np.angle(h_coorb[(2,2)])) + phase_offset)/2
+    d_orbital_phase = np.imag(dh_coorb[(2,2)]/h_coorb[(2,2)])/2
+
+    dh_inertial = {}
+    for mode in h_coorb.keys():
+        (l,m)=mode
+        if mode==(2,2):
+            dh_inertial[mode] = dh_coorb[mode]
+        else:
+            dh_inertial[mode] = (dh_coorb[mode] + 1j*m*d_orbital_phase*h_coorb[mode]) \
+                                *np.exp(1j*m*orbital_phase)
+
+    return dh_inertial
+
+#----------------------------------------------------------------------------------------------------
+def time_derivative(t, h):
+    """ dh/dt of a complex mode sampled at times t, from the derivatives of its amplitude and 
+        unwrapped phase which are smooth (unlike its real and imaginary parts) """
+
+    amp = np.abs(h)
+    phase = np.unwrap(np.angle(h))
+    return h*(CubicSpline(t, amp)(t, 1)/amp + 1j*CubicSpline(t, phase)(t, 1))
+
+#---------------------------------------------------------------------------------------------------- 
+def geo_to_SI_units(M_tot, dist_mpc):
+    """ time and strain units (in SI) of a geometric waveform, as applied by geo_to_SI() """
+    
+    t_unit, h_unit = geo_to_SI(np.ones(1), {(2,2): np.ones(1)}, M_tot, dist_mpc)
+    return t_unit[0], h_unit[(2,2)][0]
+
 #---------------------------------------------------------------------------------------------------- 
 def phase_rotation(h, delta_orb_phase):
     """
@@ -89,7 +133,7 @@ def evaluate_on_sphere(theta, phi, h_dict):
 def sum_modes(h_dict):
     """sum all the modes on a point in the sky"""
     
-    h = np.zeros(len(h_dict[(2,2)]))
+    h = np.zeros(len(next(iter(h_dict.values()))))
     for mode in h_dict.keys():
         h = h + h_dict[mode]
     return h
@@ -123,7 +167,9 @@ def generate_negative_m_mode(h_dict):
 #----------------------------------------------------------------------------------------------------
 def obtain_processed_output(X_calib, time, hsur_raw_dict, alpha_coeffs, beta_coeffs, 
                             alpha_beta_functional_form, calibrated, M_tot, dist_mpc, 
-                            orb_phase, inclination, mode_sum, neg_modes, lmax, CoorbToInert=False):
+                            orb_phase, inclination, mode_sum, neg_modes, lmax, CoorbToInert=False,
+                            profiler=None, dhsur_raw_dict=None, param_derivatives=None,
+                            n_threads=None, phase_offset=0.0):
     """
     Function to process the output of raw surrogate to apply :
     (i) NR calibration;
@@ -150,23 +196,54 @@ def obtain_processed_output(X_calib, time, hsur_raw_dict, alpha_coeffs, beta_coe
         lmax :--: maximum value of l upto which modes should be returned.
         CoorbToInert :--: indicate whether higher modes have been modelled in coorbital frame. In that
                           case, additional processing will be performed.
+        profiler :--: optional common_utils.profiling.StageProfiler recording the time spent in 
+                      each of the processing stages. Default: None
+        dhsur_raw_dict :--: optional dictionary {parameter name: dictionary of the derivatives of
+                            the raw modes}, as returned by fits.all_modes_surrogate(). The 
+                            derivatives go through the same processing as the modes.
+        param_derivatives :--: derivatives of the parameterizations, see 
+                               fits.all_modes_surrogate(); needed with dhsur_raw_dict
+        n_threads :--: if > 1, the modes are processed on a persistent pool of n_threads
+                       threads (see common_utils.mode_parallel); not used with dhsur_raw_dict.
+                       Default: None (serial processing)
+        phase_offset :--: added to the unwrapped phase of the (2,2) mode before the coorbital
+                          frame transformation, see coorbital_to_inertial(). Default: 0
     
     Outputs
     =======
     
         t_surrogate : time array 
         h_surrogate : dictiornary of modes
+        dh_surrogate : dictionary {parameter name: derivatives of h_surrogate}; only returned if
+                       dhsur_raw_dict is given. The derivatives are those of h(t) at fixed t, 
+                       evaluated at the times t_surrogate. 
     
      
     """
     
+    profiler = profiling.get_profiler(profiler)
+
+    if dhsur_raw_dict is not None:
+        return _obtain_processed_output_derivatives(X_calib, time, hsur_raw_dict, dhsur_raw_dict, 
+                                    alpha_coeffs, beta_coeffs, alpha_beta_functional_form, calibrated,
+                                    M_tot, dist_mpc, orb_phase, inclination, mode_sum, neg_modes, lmax,
+                                    CoorbToInert, profiler, param_derivatives, phase_offset)
+
+    if n_threads is not None and n_threads > 1:
+        return _obtain_processed_output_parallel(X_calib, time, hsur_raw_dict, alpha_coeffs, 
+                                    beta_coeffs, alpha_beta_functional_form, calibrated, M_tot, 
+                                    dist_mpc, orb_phase, inclination, mode_sum, neg_modes, lmax,
+                                    CoorbToInert, profiler, n_threads, phase_offset)
+
     # transform higher modes from coorbital to inertial frame if asked
     if CoorbToInert==True:
-        hsur_raw_dict = coorbital_to_inertial(hsur_raw_dict)
+        with profiler.stage('frame_transform'):
+            hsur_raw_dict = coorbital_to_inertial(hsur_raw_dict, phase_offset)
         
     # when nr calibration is applied
     if calibrated==True:
-        t_sur, hsur_dict = nrcalib.generate_calibrated_ppBHPT(X_calib, time, hsur_raw_dict, alpha_coeffs, 
+        with profiler.stage('calibration'):
+            t_sur, hsur_dict = nrcalib.generate_calibrated_ppBHPT(X_calib, time, hsur_raw_dict, alpha_coeffs, 
                                                                   beta_coeffs, alpha_beta_functional_form)
         if lmax>5:
             print('**** warning **** : only modes up to \ell=5 are NR calibrated')
@@ -178,21 +255,166 @@ def obtain_processed_output(X_calib, time, hsur_raw_dict, alpha_coeffs, beta_coe
 
     # get all the negative m modes from postive m modes using symmetry
     if neg_modes:
-        hsur_dict = generate_negative_m_mode(hsur_dict)
+        with profiler.stage('negative_modes'):
+            hsur_dict = generate_negative_m_mode(hsur_dict)
 
     # relevant for obtaining physical waveforms
     if M_tot is not None and dist_mpc is not None:
-        t_sur, hsur_dict = geo_to_SI(t_sur, hsur_dict, M_tot, dist_mpc)
+        with profiler.stage('SI_conversion'):
+            t_sur, hsur_dict = geo_to_SI(t_sur, hsur_dict, M_tot, dist_mpc)
         # evaluate on the sphere
         if orb_phase is not None and inclination is not None:
-            hsur_dict = evaluate_on_sphere(inclination, orb_phase, hsur_dict)
+            with profiler.stage('harmonics'):
+                hsur_dict = evaluate_on_sphere(inclination, orb_phase, hsur_dict)
 
     # sum up the modes if it is asked
     if mode_sum==False:
         return t_sur, hsur_dict
     else:
         if M_tot is not None and dist_mpc is not None and orb_phase is not None and inclination is not None:
-            h_summed = sum_modes(hsur_dict)
+            with profiler.stage('summation'):
+                h_summed = sum_modes(hsur_dict)
             return t_sur, h_summed
         
-        
\ No newline at end of file
+        
+
+
+#----------------------------------------------------------------------------------------------------
+def _obtain_processed_output_parallel(X_calib, time, hsur_raw_dict, alpha_coeffs, beta_coeffs, 
+                                      alpha_beta_functional_form, calibrated, M_tot, dist_mpc, 
+                                      orb_phase, inclination, mode_sum, neg_modes, lmax, 
+                                      CoorbToInert, profiler, n_threads, phase_offset=0.0):
+    """
+    obtain_processed_output() with the processing of each mode (frame transformation, 
+    calibration, m<0 modes, SI units, harmonics and its share of the mode sum) running on a 
+    pool of n_threads threads. The time axis, the orbital phase and the unit factors are 
+    computed once.
+    """
+
+    if CoorbToInert==True:
+        with profiler.stage('frame_transform'):
+            orbital_phase = (np.unwrap(np.angle(hsur_raw_dict[(2,2)])) + phase_offset)/2
+
+    t_sur = np.array(time)
+    if calibrated==True:
+        with profiler.stage('calibration'):
+            beta = nrcalib.evaluate_beta(X_calib, beta_coeffs, alpha_beta_functional_form)
+            t_sur = nrcalib.beta_scaling_time(time, beta)
+        if lmax>5:
+            print('**** warning **** : only modes up to \ell=5 are NR calibrated')
+    else:
+        print('**** warning **** : modes are NOT NR calibrated - waveforms only have 0PA contribution')
+
+    SI_units = M_tot is not None and dist_mpc is not None
+    on_sphere = SI_units and orb_phase is not None and inclination is not None
+    if SI_units:
+        t_unit, h_unit = geo_to_SI_units(M_tot, dist_mpc)
+        t_sur = t_sur*t_unit
+
+    def process(mode):
+        (l,m) = mode
+        h = hsur_raw_dict[mode]
+        if CoorbToInert==True and mode!=(2,2):
+            with profiler.stage('frame_transform', mode):
+                h = h*np.exp(1j*m*np.array(orbital_phase))
+        if calibrated==True:
+            with profiler.stage('calibration', mode):
+                alpha = nrcalib.evaluate_alpha(X_calib, l, alpha_coeffs, alpha_beta_functional_form)
+                h = nrcalib.alpha_scaling_h(h, alpha)
+        h_dict = {mode: h}
+        if neg_modes:
+            with profiler.stage('negative_modes', mode):
+                h_dict = generate_negative_m_mode(h_dict)
+        if SI_units:
+            with profiler.stage('SI_conversion', mode):
+                h_dict = {key: np.array(value)*h_unit for key, value in h_dict.items()}
+            if on_sphere:
+                with profiler.stage('harmonics', mode):
+                    h_dict = evaluate_on_sphere(inclination, orb_phase, h_dict)
+        if mode_sum==True and on_sphere:
+            with profiler.stage('summation', mode):
+                return sum(h_dict.values())
+        return h_dict
+
+    processed = mode_parallel.map_modes(process, list(hsur_raw_dict.keys()), n_threads)
+
+    if mode_sum==False:
+        hsur_dict = {}
+        for h_dict in processed.values():
+            hsur_dict.update(h_dict)
+        return t_sur, hsur_dict
+    elif on_sphere:
+        with profiler.stage('summation'):
+            h_summed = np.zeros(len(t_sur))
+            for h in processed.values():
+                h_summed = h_summed + h
+        return t_sur, h_summed
+
+#----------------------------------------------------------------------------------------------------
+def _obtain_processed_output_derivatives(X_calib, time, hsur_raw_dict, dhsur_raw_dict, alpha_coeffs, 
+                                         beta_coeffs, alpha_beta_functional_form, calibrated, M_tot,
+                                         dist_mpc, orb_phase, inclination, mode_sum, neg_modes, lmax,
+                                         CoorbToInert, profiler, param_derivatives, phase_offset=0.0):
+    """
+    Same as obtain_processed_output() for the modes and their derivatives; all the stages after 
+    the calibration are linear and are applied to the derivatives as they are to the modes
+    """
+
+    params = list(dhsur_raw_dict.keys())
+
+    # transform higher modes from coorbital to inertial frame if asked
+    if CoorbToInert==True:
+        with profiler.stage('frame_transform'):
+            dhsur_raw_dict = {p: coorbital_to_inertial_derivatives(hsur_raw_dict, dhsur_raw_dict[p],
+                                                                 phase_offset)
+                              for p in params}
+            hsur_raw_dict = coorbital_to_inertial(hsur_raw_dict, phase_offset)
+
+    # when nr calibration is applied
+    if calibrated==True:
+        with profiler.stage('calibration'):
+            t_sur, hsur_dict, dhsur_dict, dt_sur = nrcalib.generate_calibrated_ppBHPT_derivatives(
+                                    X_calib, time, hsur_raw_dict, dhsur_raw_dict, alpha_coeffs, 
+                                    beta_coeffs, alpha_beta_functional_form, param_derivatives)
+            # the time samples move with the parameters : dh(t)/dp = dh_i/dp - dh/dt dt_i/dp
+            for mode in hsur_dict.keys():
+                hdot = time_derivative(t_sur, hsur_dict[mode])
+                for p in params:
+                    dhsur_dict[p][mode] = dhsur_dict[p][mode] - hdot*dt_sur[p]
+        if lmax>5:
+            print('**** warning **** : only modes up to \ell=5 are NR calibrated')
+    # when no nr calibration is applied
+    else:
+        t_sur=np.array(time)
+        hsur_dict = hsur_raw_dict
+        dhsur_dict = dhsur_raw_dict
+        print('**** warning **** : modes are NOT NR calibrated - waveforms only have 0PA contribution')
+
+    # get all the negative m modes from postive m modes using symmetry
+    if neg_modes:
+        with profiler.stage('negative_modes'):
+            hsur_dict = generate_negative_m_mode(hsur_dict)
+            dhsur_dict = {p: generate_negative_m_mode(dhsur_dict[p]) for p in params}
+
+    # relevant for obtaining physical waveforms
+    if M_tot is not None and dist_mpc is not None:
+        with profiler.stage('SI_conversion'):
+            t_geo = t_sur
+            t_sur, hsur_dict = geo_to_SI(t_geo, hsur_dict, M_tot, dist_mpc)
+            dhsur_dict = {p: geo_to_SI(t_geo, dhsur_dict[p], M_tot, dist_mpc)[1] for p in params}
+        # evaluate on the sphere
+        if orb_phase is not None and inclination is not None:
+            with profiler.stage('harmonics'):
+                hsur_dict = evaluate_on_sphere(inclination, orb_phase, hsur_dict)
+                dhsur_dict = {p: evaluate_on_sphere(inclination, orb_phase, dhsur_dict[p]) 
+                              for p in params}
+
+    # sum up the modes if it is asked
+    if mode_sum==False:
+        return t_sur, hsur_dict, dhsur_dict
+    else:
+        if M_tot is not None and dist_mpc is not None and orb_phase is not None and inclination is not None:
+            with profiler.stage('summation'):
+                h_summed = sum_modes(hsur_dict)
+                dh_summed = {p: sum_modes(dhsur_dict[p]) for p in params}
+            return t_sur, h_summed, dh_summed
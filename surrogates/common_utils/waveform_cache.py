@@ -0,0 +1,245 @@
+##==============================================================================
+## BHPTNRSurrogate module
+## Description : persistent content-addressed on-disk waveform cache
+## Author : Black Hole Perturbation Toolkit Team, Oct 2026
+##==============================================================================
+
+"""
+On-disk cache of generate_surrogate() outputs, read back as memory maps of .npy files:
+
+    cache = WaveformCache('/path/to/cache', max_bytes=10*1024**3)
+    t, h = cache.generate(BHPTNRSur1dq1e4, q=8, modes=[(2,2)])
+
+Entries are keyed on the model file hash, cache_version, the arguments and the compression and
+node table settings of the model. They are written to a temporary directory and renamed;
+insertions and least recently used evictions take a file lock shared by all processes. Calls
+with a profiler, derivatives, sparse_step, uncertainty or a local emulator are not cached.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import inspect
+import importlib
+import numpy as np
+from .locking import FileLock
+import model_utils.load_surrogates as load
+
+# bump when a change of the code changes the waveforms for the same arguments
+cache_version = 1
+
+# arguments for which the output is not a plain (t, h) waveform or which cannot be hashed
+_uncached_arguments = ['profiler', 'derivatives', 'sparse_step', 'uncertainty']
+
+# arguments which do not change the waveform and are left out of the keys
+_ignored_arguments = ['n_threads']
+
+# fraction of max_bytes the cache is reduced to when it grows beyond max_bytes
+evict_fraction = 0.9
+
+#----------------------------------------------------------------------------------------------------
+def _normalize(value):
+    """ JSON compatible representation of an argument (tuples, numpy scalars and arrays) """
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_normalize(x) for x in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+#----------------------------------------------------------------------------------------------------
+def _arguments(func, kwargs):
+    """ all arguments of func (defaults included) with numbers as floats, so that equivalent
+        calls have the same key """
+    bound = inspect.signature(func).bind(**kwargs)
+    bound.apply_defaults()
+    arguments = {}
+    for name, value in bound.arguments.items():
+        if name in _ignored_arguments:
+            continue
+        value = _normalize(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        arguments[name] = value
+    return arguments
+
+#----------------------------------------------------------------------------------------------------
+def _model_settings(model):
+    """ settings of a model module which change its waveforms : compressed basis matrices and
+        tabulated node values """
+    settings = {}
+    compression = getattr(model, 'basis_compression_settings', None)
+    if compression is not None:
+        # keep_dense does not change the waveforms
+        tol, shared, keep_dense = compression
+        settings['basis_compression'] = [float(tol), bool(shared)]
+    node_table = getattr(model, 'node_table', None)
+    if node_table is not None:
+        settings['node_table_tol'] = float(node_table['tol'])
+    return settings
+
+#----------------------------------------------------------------------------------------------------
+class WaveformCache:
+    """
+    On-disk cache of generate_surrogate() outputs; see the description at the top of this module
+
+    Inputs
+    ======
+        cache_dir : directory of the cache, shared by all processes. Default: the environment
+                    variable BHPTNRSUR_CACHE_DIR, or ~/.cache/bhptnrsurrogate
+        max_bytes : size above which the least recently used entries are evicted
+        lock_timeout : maximum time in seconds to wait for the cache lock; None waits forever
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=4*1024**3, lock_timeout=None):
+        if cache_dir is None:
+            cache_dir = os.environ.get('BHPTNRSUR_CACHE_DIR',
+                                       os.path.join(os.path.expanduser('~'), '.cache',
+                                                    'bhptnrsurrogate'))
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _lock(self):
+        return FileLock(os.path.join(self.cache_dir, '.lock'), timeout=self.lock_timeout)
+
+    def key(self, model, kwargs):
+        """ content hash of the waveform generate_surrogate(**kwargs) of a model module """
+        content = {'model': model.__name__,
+                   'data_md5': load.zenodo_hashes['%s.h5'%model.__name__],
+                   'cache_version': cache_version,
+                   'settings': _model_settings(model),
+                   'kwargs': _arguments(model.generate_surrogate, kwargs)}
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        """ (t, h) of an entry as read-only memory maps, or None if it is not cached """
+        entry = os.path.join(self.cache_dir, key)
+        try:
+            names = os.listdir(entry)
+            t = np.load(os.path.join(entry, 't.npy'), mmap_mode='r')
+            if 'h.npy' in names:
+                h = np.load(os.path.join(entry, 'h.npy'), mmap_mode='r')
+            else:
+                h = {}
+                for name in names:
+                    if name.startswith('h_'):
+                        l, m = name[2:-4].split('_')
+                        h[(int(l), int(m))] = np.load(os.path.join(entry, name), mmap_mode='r')
+            # least recently used order
+            os.utime(entry)
+        except (FileNotFoundError, NotADirectoryError):
+            # not cached, or evicted by another process meanwhile
+            return None
+        return t, h
+
+    def _index(self):
+        return os.path.join(self.cache_dir, '.size')
+
+    def _tracked_size(self):
+        """ total size of the entries tracked in the index file, or listed if there is no index
+            file yet; called with the lock held """
+        try:
+            with open(self._index()) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return self.size()
+
+    def _set_tracked_size(self, total):
+        """ writes the index file; called with the lock held """
+        tmp = self._index() + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write('%d'%total)
+        os.replace(tmp, self._index())
+
+    def put(self, key, t, h):
+        """ stores (t, h) under key and evicts old entries if the cache is too large """
+        tmp = os.path.join(self.cache_dir, '.tmp-%s-%s'%(key, uuid.uuid4().hex))
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, 't.npy'), np.asarray(t))
+        if isinstance(h, dict):
+            for (l, m), h_mode in h.items():
+                np.save(os.path.join(tmp, 'h_%d_%d.npy'%(l, m)), np.asarray(h_mode))
+        else:
+            np.save(os.path.join(tmp, 'h.npy'), np.asarray(h))
+        entry_size = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+
+        with self._lock():
+            total = self._tracked_size()
+            try:
+                os.rename(tmp, os.path.join(self.cache_dir, key))
+                total += entry_size
+            except OSError:
+                # stored by another process meanwhile
+                shutil.rmtree(tmp, ignore_errors=True)
+            if total > self.max_bytes:
+                total = self._evict(evict_fraction*self.max_bytes)
+            self._set_tracked_size(total)
+
+    def _entries(self):
+        """ list of (last use time, size in bytes, path) of all entries """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def _evict(self, target_bytes):
+        """ removes the least recently used entries until the cache is below target_bytes;
+            returns the size of the remaining entries. Called with the lock held """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target_bytes:
+                break
+            self._remove(path)
+            total -= size
+        return total
+
+    def _remove(self, path):
+        """ removes an entry; it is first renamed so that readers never see it partially removed.
+            Memory maps of its files stay valid until they are closed """
+        trash = os.path.join(self.cache_dir, '.evicted-%s'%uuid.uuid4().hex)
+        try:
+            os.rename(path, trash)
+        except FileNotFoundError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def size(self):
+        """ total size of the entries in bytes """
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        """ removes all entries """
+        with self._lock():
+            for _, _, path in self._entries():
+                self._remove(path)
+            self._set_tracked_size(0)
+
+    def generate(self, model, **kwargs):
+        """
+        generate_surrogate(**kwargs) of a model (module or name), read from the cache if
+        possible; otherwise evaluated and stored
+        """
+        if isinstance(model, str):
+            model = importlib.import_module(model)
+        if any(kwargs.get(name) not in (None, False) for name in _uncached_arguments) or \
+           getattr(model, 'local_emulator_settings', None) is not None:
+            return model.generate_surrogate(**kwargs)
+
+        key = self.key(model, kwargs)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        t, h = model.generate_surrogate(**kwargs)
+        self.put(key, t, h)
+        return t, h
@@ -4,7 +4,7 @@
 ## Author : Tousif Islam, Nov 2022 [tislam@umassd.edu / tousifislam24@gmail.com]
 ##==============================================================================
 
-from common_utils import utils, fits
+from common_utils import utils, fits, profiling, sparse_output, start_frequency
 import common_utils.check_inputs as checks
 
 #----------------------------------------------------------------------------------------------------
@@ -12,7 +12,9 @@ def evaluate_surrogate(X_sur, X_calib, X_bounds, time, modes, modes_available, a
                        beta_coeffs, alpha_beta_functional_form, calibrated, M_tot, dist_mpc, 
                        orb_phase, inclination, fit_data_dict_1, fit_data_dict_2, B_dict_1, \
                        B_dict_2, fit_func, decomposition_funcs, norm, mode_sum, neg_modes, \
-                       lmax, CoorbToInert):
+                       lmax, CoorbToInert, profiler=None, mode_tolerance=None,\
+                       param_derivatives=None, sparse_step=None, f_low=None, n_threads=None,
+                       eim_values_out=None):
     """
     Inputs
     ======
@@ -57,7 +59,7 @@ def evaluate_surrogate(X_sur, X_calib, X_bounds, time, modes, modes_available, a
         B_dict_1, B_dict_2 : dictionary of the basis matrices obtained from h5 file.
                              Modes used as keys.
 
-        fit_func : form of fitting function. options : 'spline_1d' or 'GPR_fits'
+        fit_func : form of fitting function. options : 'spline_1d', 'GPR_fits' or 'tabulated_1d'
 
         decomposition_funcs : form of data decomposition function to combine datapieces for 22 and
                               higher modes respectively. e.g. Amp/Phase to full or real/imag to full
@@ -74,6 +76,34 @@ def evaluate_surrogate(X_sur, X_calib, X_bounds, time, modes, modes_available, a
 
         CoorbToInert : indicate whether higher modes have been modelled in coorbital frame. In that
                        case, additional processing will be performed.
+
+        profiler : optional common_utils.profiling.StageProfiler recording wall time (and allocated 
+                   bytes if requested) of each evaluation stage. Default: None (no instrumentation)
+
+        mode_tolerance : relative threshold below which modes are skipped in the mode-summed 
+                         waveform; see fits.prune_modes(). Only used with mode_sum=True.
+                         Default: None (all modes are evaluated)
+
+        param_derivatives : dictionary {parameter name: {'X_sur': dX_sur/dparameter, 
+                            'X_calib': dX_calib/dparameter, 'norm': dnorm/dparameter}}. If given,
+                            the derivatives of the waveform with respect to these parameters
+                            are computed along with the waveform. Default: None
+
+        sparse_step : if given, the datapieces are only evaluated every sparse_step-th time sample
+                      and a common_utils.sparse_output.SparseWaveform is returned instead of the
+                      waveform. Default: None
+
+        f_low : starting frequency of the (2,2) mode, in Hz if M_tot and dist_mpc are given and
+                in units of 1/M otherwise. If given, only the time samples from the one at which 
+                the (2,2) mode reaches f_low are evaluated; see common_utils.start_frequency. 
+                Default: None (full waveform)
+
+        n_threads : if > 1, the modes are evaluated and processed on a persistent pool of 
+                    n_threads threads; see common_utils.mode_parallel. Not used with 
+                    param_derivatives or sparse_step. Default: None (serial evaluation)
+
+        eim_values_out : optional dictionary filled with the EIM node values of the modes, see
+                         fits.all_modes_surrogate(). Default: None
     
     Outputs
     =======
@@ -82,21 +112,68 @@ def evaluate_surrogate(X_sur, X_calib, X_bounds, time, modes, modes_available, a
         
         h_surrogate : dictiornary of modes if mode_sum not requested
                       full waveform if mode_sum is requested
+
+        dh_surrogate : dictionary {parameter name: derivative of h_surrogate at fixed time}; 
+                       only returned if param_derivatives is given
+
+        sparse_waveform : SparseWaveform returned instead of the above if sparse_step is given
     
      
     """
     
+    profiler = profiling.get_profiler(profiler)
+
     # check inputs
     checks.check_user_inputs(X_sur, X_bounds, modes, modes_available, M_tot, dist_mpc, 
                       orb_phase, inclination, mode_sum)
     
+    # modes can only be pruned when they are summed on the sphere
+    if mode_tolerance is not None and not (mode_sum and inclination is not None):
+        print('**** warning **** : mode_tolerance is only used with mode_sum=True. Ignoring it.')
+        mode_tolerance = None
+
+    # drop the time samples before the (2,2) mode reaches f_low; the orbital phase keeps the
+    # 2pi branch of the full time grid
+    phase_offset = 0.0
+    if f_low is not None:
+        with profiler.stage('f_low'):
+            index = start_frequency.start_index(f_low, X_sur, X_calib, time, fit_data_dict_2[(2,2)],
+                                    B_dict_2[(2,2)], fit_func, beta_coeffs, alpha_beta_functional_form,
+                                    calibrated, M_tot, dist_mpc)
+            if CoorbToInert:
+                phase_offset = start_frequency.phase_offset(index, X_sur, fit_data_dict_2[(2,2)],
+                                                            B_dict_2[(2,2)], fit_func)
+            time, B_dict_1, B_dict_2 = start_frequency.truncate(index, time, B_dict_1, B_dict_2)
+
+    # datapieces on a sparse time grid; the dense waveform is built on demand
+    if sparse_step is not None:
+        if param_derivatives is not None or mode_tolerance is not None:
+            raise ValueError("sparse output cannot be combined with derivatives or mode_tolerance")
+        return sparse_output.evaluate_sparse(X_sur, X_calib, time, modes, alpha_coeffs, beta_coeffs,
+                                    alpha_beta_functional_form, calibrated, M_tot, dist_mpc, 
+                                    orb_phase, inclination, fit_data_dict_1, fit_data_dict_2, 
+                                    B_dict_1, B_dict_2, fit_func, decomposition_funcs, norm, 
+                                    mode_sum, neg_modes, lmax, CoorbToInert, sparse_step,
+                                    phase_offset)
+
     # uncalibrated waveforms in geometric units
     hsur_raw_dict = fits.all_modes_surrogate(modes, X_sur, fit_data_dict_1, fit_data_dict_2, \
-                           B_dict_1, B_dict_2, lmax, fit_func, decomposition_funcs, norm)
+                           B_dict_1, B_dict_2, lmax, fit_func, decomposition_funcs, norm, profiler,
+                           mode_tolerance, inclination, neg_modes, param_derivatives, n_threads,
+                           eim_values_out)
     
-    # process the raw surrogate output depending on the user inputs
+    # process the raw surrogate output (and derivatives) depending on the user inputs
+    if param_derivatives is not None:
+        hsur_raw_dict, dhsur_raw_dict = hsur_raw_dict
+        return utils.obtain_processed_output(X_calib, time, hsur_raw_dict, alpha_coeffs, 
+                                    beta_coeffs, alpha_beta_functional_form, calibrated, M_tot, dist_mpc, 
+                                    orb_phase, inclination, mode_sum, neg_modes, lmax, CoorbToInert,
+                                    profiler, dhsur_raw_dict, param_derivatives, 
+                                    phase_offset=phase_offset)
+
     t_surrogate, h_surrogate = utils.obtain_processed_output(X_calib, time, hsur_raw_dict, alpha_coeffs, 
                                     beta_coeffs, alpha_beta_functional_form, calibrated, M_tot, dist_mpc, 
-                                    orb_phase, inclination, mode_sum, neg_modes, lmax, CoorbToInert)
+                                    orb_phase, inclination, mode_sum, neg_modes, lmax, CoorbToInert,
+                                    profiler, n_threads=n_threads, phase_offset=phase_offset)
     
     return t_surrogate, h_surrogate
@@ -42,6 +42,10 @@ have been constrcuted using splines or GPR).
         beta_coeffs : beta value obtain from calibration - used in time rescaling
 """
 
+# current zenodo hash of each h5 file; a loaded model always comes from a file with this hash
+zenodo_hashes = {'BHPTNRSur1dq1e4.h5': "58a3a75e8fd18786ecc88cf98f694d4a",
+                 'BHPTNRSur2dq1e3.h5': "404db59dbfc49e88ebd7d5e258f25f3c"}
+
 #----------------------------------------------------------------------------------------------------
 def load_BHPTNRSur1dq1e4_surrogate(h5_data_dir):
 
@@ -52,14 +56,14 @@ def load_BHPTNRSur1dq1e4_surrogate(h5_data_dir):
     # h5 file name
     fname = 'BHPTNRSur1dq1e4.h5'
     # provide current zenodo hash
-    zenodo_current_hash = "58a3a75e8fd18786ecc88cf98f694d4a"
+    zenodo_current_hash = zenodo_hashes[fname]
     # zenodo url
     url = 'https://zenodo.org/records/13340319'
     # obtain zenodo ID
     zenodo_ID = url.rsplit("/")[-1]
     # obtain the hash for the current file; also downloads the file
     # if it doesn't exist in h5_data_dir
-    file_hash = filehash.md5(fname, h5_data_dir, zenodo_ID)
+    file_hash = filehash.md5(fname, h5_data_dir, zenodo_ID, zenodo_current_hash)
     # check hash is the most recent
     filehash.check_current_hash(file_hash, zenodo_current_hash, url, fname)
 
@@ -79,27 +83,35 @@ def load_BHPTNRSur1dq1e4_surrogate(h5_data_dir):
 
 
 #----------------------------------------------------------------------------------------------------
-def load_BHPTNRSur2dq1e3_surrogate(h5_data_dir):
+def load_BHPTNRSur2dq1e3_surrogate(h5_data_dir, spin_signs=['negative_spin', 'positive_spin'],
+                                   check_hash=True):
 
     """
     Assumes the file BHPTNRSur2dq1e3.h5 is located in the h5_data_dir directory.
 
-    NOTE: times is dictionary with times.keys() = ['negative_spin', 'positive_spin']
+    spin_signs : sub-surrogates to load. Each sub-surrogate can be loaded independently;
+                 with spin_signs=[] only the nr calibration info is read.
+    check_hash : whether to check (and download if needed) the h5 file. Can be set to False
+                 when the file has already been checked, e.g. when loading a second 
+                 sub-surrogate later on.
+
+    NOTE: times is dictionary with times.keys() = spin_signs
     """
 
     # h5 file name
     fname = 'BHPTNRSur2dq1e3.h5'
     # provide current zenodo hash
-    zenodo_current_hash = "404db59dbfc49e88ebd7d5e258f25f3c"
+    zenodo_current_hash = zenodo_hashes[fname]
     # zenodo url
     url = 'https://zenodo.org/records/13340319'
     # obtain zenodo ID
     zenodo_ID = url.rsplit("/")[-1]
-    # obtain the hash for the current file; also downloads the file
-    # if it doesn't exist in h5_data_dir
-    file_hash = filehash.md5(fname, h5_data_dir, zenodo_ID)
-    # check hash is the most recent
-    filehash.check_current_hash(file_hash, zenodo_current_hash, url, fname)
+    if check_hash:
+        # obtain the hash for the current file; also downloads the file
+        # if it doesn't exist in h5_data_dir
+        file_hash = filehash.md5(fname, h5_data_dir, zenodo_ID, zenodo_current_hash)
+        # check hash is the most recent
+        filehash.check_current_hash(file_hash, zenodo_current_hash, url, fname)
     
 
     # modes to read fit data for
@@ -110,6 +122,6 @@ def load_BHPTNRSur2dq1e3_surrogate(h5_data_dir):
 
     # obtain all fit data
     times, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, alpha_coeffs, beta_coeffs \
-                    = load_gpr.load_surrogate(h5_data_dir, fname, wf_modes, nrcalib_modes)
+                    = load_gpr.load_surrogate(h5_data_dir, fname, wf_modes, nrcalib_modes, spin_signs)
 
     return times, fit_data_dict_1, fit_data_dict_2, B_dict_1, B_dict_2, alpha_coeffs, beta_coeffs
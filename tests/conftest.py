@@ -0,0 +1,50 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+surrogates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'surrogates')
+if surrogates_dir not in sys.path:
+    sys.path.insert(0, surrogates_dir)
+
+_data_dir = None
+
+
+def pytest_configure(config):
+    """ writes the synthetic h5 files (common_utils.synthetic_data) and points the models to
+        them, before any test imports a model """
+    global _data_dir
+    from common_utils import synthetic_data, download
+    import model_utils.load_surrogates as load
+
+    _data_dir = tempfile.mkdtemp(prefix='bhptnrsur-test-data-')
+    synthetic_data.write_BHPTNRSur1dq1e4_like(os.path.join(_data_dir, 'BHPTNRSur1dq1e4.h5'), seed=0)
+    synthetic_data.write_BHPTNRSur2dq1e3_like(os.path.join(_data_dir, 'BHPTNRSur2dq1e3.h5'), seed=0)
+    for fname in load.zenodo_hashes:
+        load.zenodo_hashes[fname] = download.file_md5(os.path.join(_data_dir, fname)).hexdigest()
+    os.environ['BHPTNRSUR_DATA_DIR'] = _data_dir
+
+
+def pytest_unconfigure(config):
+    if _data_dir is not None:
+        shutil.rmtree(_data_dir, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def data_dir():
+    return _data_dir
+
+
+@pytest.fixture(scope='session')
+def model_1d():
+    import BHPTNRSur1dq1e4
+    return BHPTNRSur1dq1e4
+
+
+@pytest.fixture(scope='session')
+def model_2d():
+    import BHPTNRSur2dq1e3
+    return BHPTNRSur2dq1e3
+
@@ -0,0 +1,19 @@
+import numpy as np
+
+
+def assert_waveforms_equal(a, b, rtol=0.0):
+    """ compares two outputs (t, h) of generate_surrogate(), with h a mode dictionary or an
+        array, to a relative tolerance of the largest |h| (exactly if rtol=0) """
+    t_a, h_a = a[0], a[1]
+    t_b, h_b = b[0], b[1]
+    np.testing.assert_array_equal(t_a, t_b)
+    if isinstance(h_a, dict):
+        assert sorted(h_a.keys()) == sorted(h_b.keys())
+        pairs = [(h_a[mode], h_b[mode]) for mode in h_a.keys()]
+    else:
+        pairs = [(h_a, h_b)]
+    for x, y in pairs:
+        if rtol == 0.0:
+            np.testing.assert_array_equal(x, y)
+        else:
+            assert np.max(np.abs(x - y)) <= rtol*np.max(np.abs(y))
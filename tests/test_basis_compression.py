@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from helpers import assert_waveforms_equal
+
+
+@pytest.mark.parametrize('shared', [False, True])
+def test_compressed_1d_output_matches_dense(model_1d, shared):
+    dense = model_1d.generate_surrogate(q=12.0)
+    try:
+        model_1d.compress_basis(tol=1e-6, shared=shared)
+        compressed = model_1d.generate_surrogate(q=12.0)
+    finally:
+        model_1d.decompress_basis()
+    assert_waveforms_equal(compressed, dense, rtol=1e-5)
+    assert_waveforms_equal(model_1d.generate_surrogate(q=12.0), dense)
+
+
+@pytest.mark.parametrize('shared', [False, True])
+def test_compressed_2d_output_matches_dense(model_2d, shared):
+    dense = model_2d.generate_surrogate(q=12.0, spin1=0.4)
+    try:
+        model_2d.compress_basis(tol=1e-6, shared=shared)
+        compressed = model_2d.generate_surrogate(q=12.0, spin1=0.4)
+        # sub-surrogates loaded after compress_basis() are compressed as they are loaded
+        compressed_negative = model_2d.generate_surrogate(q=12.0, spin1=-0.4)
+    finally:
+        model_2d.decompress_basis()
+    assert_waveforms_equal(compressed, dense, rtol=1e-5)
+    assert_waveforms_equal(compressed_negative, model_2d.generate_surrogate(q=12.0, spin1=-0.4),
+                           rtol=1e-5)
+    assert_waveforms_equal(model_2d.generate_surrogate(q=12.0, spin1=0.4), dense)
+
+
+def test_basis_accuracy_report(model_1d):
+    try:
+        model_1d.compress_basis(tol=1e-6, shared=True)
+        reports = model_1d.basis_accuracy_report(n_test=10)
+    finally:
+        model_1d.decompress_basis()
+    assert sorted(reports.keys()) == [1, 2]
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from scipy.interpolate import CubicSpline
+
+_options = [dict(),
+            dict(calibrated=False),
+            dict(M_tot=60, dist_mpc=100),
+            dict(M_tot=60, dist_mpc=100, orb_phase=0.3, inclination=0.7, mode_sum=True)]
+
+# step of the central differences
+_eps = 1e-4
+
+
+def _at(t, h, times):
+    """ complex waveform h(t) interpolated at times """
+    return CubicSpline(t, h.real)(times) + 1j*CubicSpline(t, h.imag)(times)
+
+
+def _check_central_differences(generate, params, param, options, rtol):
+    t, h, dh = generate(derivatives=True, **params, **options)
+    outputs = []
+    for sign in (1, -1):
+        shifted = dict(params)
+        shifted[param] = params[param] + sign*_eps
+        outputs.append(generate(**shifted, **options))
+    # the calibrated time samples move with the parameters : compare away from the edges
+    inner = slice(len(t)//20, -len(t)//20)
+    if isinstance(h, dict):
+        pairs = [(dh[param][mode], [(t_s, h_s[mode]) for t_s, h_s in outputs]) for mode in h]
+    else:
+        pairs = [(dh[param], outputs)]
+    for dh_p, ((t_plus, h_plus), (t_minus, h_minus)) in pairs:
+        fd = (_at(t_plus, h_plus, t[inner]) - _at(t_minus, h_minus, t[inner]))/(2*_eps)
+        assert np.max(np.abs(fd - dh_p[inner])) <= rtol*np.max(np.abs(dh_p[inner]))
+
+
+@pytest.mark.parametrize('options', _options)
+def test_derivatives_central_differences_1d(model_1d, options):
+    rtol = 1e-6 if options.get('calibrated') is False else 1e-3
+    _check_central_differences(model_1d.generate_surrogate, dict(q=8.0), 'q', options, rtol)
+
+
+@pytest.mark.parametrize('param', ['q', 'spin1'])
+@pytest.mark.parametrize('options', _options)
+def test_derivatives_central_differences_2d(model_2d, options, param):
+    rtol = 1e-4 if options.get('calibrated') is False else 1e-3
+    _check_central_differences(model_2d.generate_surrogate, dict(q=8.0, spin1=0.3), param,
+                               options, rtol)
@@ -0,0 +1,26 @@
+import pytest
+
+from helpers import assert_waveforms_equal
+
+_options = [dict(),
+            dict(modes=[(2,2),(3,3)], calibrated=False),
+            dict(M_tot=60, dist_mpc=100),
+            dict(M_tot=60, dist_mpc=100, orb_phase=0.3, inclination=0.7, mode_sum=True),
+            dict(lmax=3, neg_modes=False)]
+
+
+@pytest.mark.parametrize('options', _options)
+def test_plan_matches_generate_surrogate_1d(model_1d, options):
+    plan = model_1d.plan(**options)
+    for q in [3.0, 40.0]:
+        rtol = 1e-14 if options.get('mode_sum') else 0.0
+        assert_waveforms_equal(plan(q), model_1d.generate_surrogate(q=q, **options), rtol=rtol)
+
+
+@pytest.mark.parametrize('options', _options)
+def test_plan_matches_generate_surrogate_2d(model_2d, options):
+    plan = model_2d.plan(**options)
+    for q, spin1 in [(5.0, -0.3), (40.0, 0.5)]:
+        rtol = 1e-14 if options.get('mode_sum') else 0.0
+        assert_waveforms_equal(plan(q, spin1), model_2d.generate_surrogate(q=q, spin1=spin1, **options),
+                               rtol=rtol)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from common_utils import gpr_fits, gpr_uncertainty, basis_compression
+
+
+def _reference_errors(model, q, spin1):
+    """ error of each uncalibrated m>0 mode on the full time grid, from dense basis matrices and
+        node fits evaluated again """
+    sign = 'negative_spin' if spin1 < 0 else 'positive_spin'
+    X = [np.log10(q), spin1]
+    errors = {}
+    for mode, fit_data_1 in model.fit_data_dict_1_sign[sign].items():
+        fit_data_2 = model.fit_data_dict_2_sign[sign][mode]
+        B_1 = np.asarray(model.B_dict_1_sign[sign][mode])
+        B_2 = np.asarray(model.B_dict_2_sign[sign][mode])
+        sigma_1 = np.sqrt(np.dot((B_1**2).T, gpr_uncertainty.node_std(X, fit_data_1)**2))
+        sigma_2 = np.sqrt(np.dot((B_2**2).T, gpr_uncertainty.node_std(X, fit_data_2)**2))
+        [h_eim_gpr_mode, eim_indicies] = fit_data_1
+        eim_amp = np.array([gpr_fits.evaluate_node(X, h_eim_gpr_mode['node%s'%i])
+                            for i in range(len(eim_indicies))])
+        errors[mode] = np.sqrt(sigma_1**2 + (np.dot(B_1.T, eim_amp)*sigma_2)**2)/q
+    return errors
+
+
+@pytest.mark.parametrize('f_low', [None, 0.06])
+def test_error_envelopes_match_reference(model_2d, f_low):
+    t_full = model_2d.generate_surrogate(q=8.0, spin1=0.3, calibrated=False)[0]
+    t, h, h_err = model_2d.generate_surrogate(q=8.0, spin1=0.3, calibrated=False, f_low=f_low,
+                                              uncertainty=True)
+    start = len(t_full) - len(t)
+    if f_low is not None:
+        assert start > 0
+    for mode, error in _reference_errors(model_2d, 8.0, 0.3).items():
+        for key in (mode, (mode[0], -mode[1])):
+            assert len(h_err[key]) == len(t)
+            np.testing.assert_allclose(h_err[key], error[start:], rtol=1e-10, atol=0)
+
+
+def test_error_envelopes_compressed_basis(model_2d):
+    dense = model_2d.generate_surrogate(q=8.0, spin1=0.3, uncertainty=True, f_low=0.06)
+    try:
+        model_2d.compress_basis(tol=1e-8, shared=True)
+        assert all(isinstance(B, basis_compression.LowRankBasis)
+                   for B in model_2d.B_dict_1_sign['positive_spin'].values())
+        compressed = model_2d.generate_surrogate(q=8.0, spin1=0.3, uncertainty=True, f_low=0.06)
+    finally:
+        model_2d.decompress_basis()
+    for mode in dense[2].keys():
+        np.testing.assert_allclose(compressed[2][mode], dense[2][mode], rtol=0,
+                                   atol=1e-5*np.max(dense[2][mode]))
@@ -0,0 +1,31 @@
+import os
+
+import h5py
+import numpy as np
+
+from common_utils import load_GPRs
+
+
+def _assert_nested_equal(a, b):
+    assert isinstance(a, dict) == isinstance(b, dict)
+    if isinstance(a, dict):
+        assert sorted(a.keys()) == sorted(b.keys())
+        for key in a.keys():
+            _assert_nested_equal(a[key], b[key])
+    elif isinstance(a, str):
+        assert a == b
+    else:
+        np.testing.assert_array_equal(a, b)
+        assert np.asarray(a).dtype == np.asarray(b).dtype
+
+
+def test_read_gpr_fits_matches_per_node_extraction(data_dir):
+    with h5py.File(os.path.join(data_dir, 'BHPTNRSur2dq1e3.h5'), 'r') as f:
+        for spin_sign in ['negative_spin', 'positive_spin']:
+            for mode in ['l2_m2', 'l3_m3', 'l4_m3']:
+                for piece, eim in [('gpr_amp', 'eim_indicies_amp'), ('gpr_phase', 'eim_indicies_phase')]:
+                    group = f[spin_sign][mode]
+                    expected = {}
+                    load_GPRs.extract_h5filegprsettings_to_emptydict(
+                        expected, dict(group[piece]), len(group[eim][()]))
+                    _assert_nested_equal(load_GPRs.read_gpr_fits(group[piece]), expected)
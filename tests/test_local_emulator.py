@@ -0,0 +1,39 @@
+import numpy as np
+
+from common_utils import fits, gpr_fits, local_emulator
+
+
+def _emulator(model_2d, **kwargs):
+    model_2d.load_spin_branch('positive_spin')
+    fit_data = model_2d.fit_data_dict_1_sign['positive_spin'][(2,2)]
+    return fit_data, local_emulator.LocalNodeEmulator(fit_data, 'GPR_fits', trust_radius=0.1,
+                                                      **kwargs)
+
+
+def test_full_evaluation_in_one_pass(model_2d, monkeypatch):
+    fit_data, emulator = _emulator(model_2d)
+    calls = []
+    monkeypatch.setattr(fits, '_evaluate_GPR_at_EIM_nodes',
+                        lambda X, fit_data: calls.append('values'))
+    values = emulator([np.log10(8.0), 0.3])
+    assert calls == []
+    np.testing.assert_allclose(values, gpr_fits.evaluate_nodes_gradient([np.log10(8.0), 0.3],
+                                                                        fit_data)[0])
+    assert emulator.stats['full'] == 1
+
+
+def test_trust_radius_recovers(model_2d):
+    fit_data, emulator = _emulator(model_2d, check_every=1, recover_after=3)
+    X = np.array([np.log10(8.0), 0.3])
+    emulator(X)
+    # failed checks halve the trust radius
+    emulator.tol = 0.0
+    emulator(X + [0.01, 0.0])
+    emulator(X + [0.0, 0.01])
+    assert emulator.trust_radius == 0.025
+    # passed checks grow it back, up to its initial value
+    emulator.tol = np.inf
+    for i in range(12):
+        emulator(X + [0.0, 0.001*(i + 2)])
+    assert emulator.trust_radius == 0.1
+    assert emulator.stats['failed_checks'] == 2
@@ -0,0 +1,31 @@
+import pytest
+
+from common_utils import memory_usage
+
+_options = [dict(),
+            dict(calibrated=False),
+            dict(neg_modes=False),
+            dict(M_tot=60, dist_mpc=100),
+            dict(M_tot=60, dist_mpc=100, orb_phase=0.3, inclination=0.7),
+            dict(M_tot=60, dist_mpc=100, orb_phase=0.3, inclination=0.7, mode_sum=True),
+            dict(calibrated=False, neg_modes=False, M_tot=60, dist_mpc=100)]
+
+
+def _check_working_set(generate, working_set, params, options):
+    estimate = working_set(**options)
+    generate(**params, **options)
+    peak, output = memory_usage.measure_working_set(generate, **params, **options)
+    assert abs(estimate['peak_bytes'] - peak) <= 0.05*peak
+    assert estimate['output_bytes'] == memory_usage.array_report(output)['bytes']
+
+
+@pytest.mark.parametrize('options', _options)
+def test_working_set_within_5_percent_1d(model_1d, options):
+    _check_working_set(model_1d.generate_surrogate, model_1d.working_set, dict(q=25.0), options)
+
+
+@pytest.mark.parametrize('options', _options)
+def test_working_set_within_5_percent_2d(model_2d, options):
+    _check_working_set(model_2d.generate_surrogate,
+                       lambda **kwargs: model_2d.working_set('negative_spin', **kwargs),
+                       dict(q=25.0, spin1=-0.2), options)
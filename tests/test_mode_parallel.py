@@ -0,0 +1,48 @@
+import threading
+
+from common_utils import mode_parallel
+
+
+class _RecordingController:
+    """ stands in for threadpoolctl.ThreadpoolController and records the limit calls """
+
+    def __init__(self):
+        self.events = []
+
+    def limit(self, limits, user_api):
+        self.events.append('limit')
+        controller = self
+
+        class Limiter:
+            def restore_original_limits(self):
+                controller.events.append('restore')
+        return Limiter()
+
+
+def test_blas_limit_overlapping_callers(monkeypatch):
+    controller = _RecordingController()
+    monkeypatch.setattr(mode_parallel, '_blas_controller', controller)
+    entered, release = threading.Event(), threading.Event()
+
+    def first():
+        with mode_parallel._blas_limit():
+            entered.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    entered.wait(10)
+    # the second caller enters and leaves while the first one holds the limit
+    with mode_parallel._blas_limit():
+        pass
+    assert controller.events == ['limit']
+    release.set()
+    thread.join()
+    assert controller.events == ['limit', 'restore']
+    assert mode_parallel._blas_users == 0
+
+
+def test_map_modes_matches_serial():
+    modes = [(2,2), (3,3), (4,4), (2,1)]
+    func = lambda mode: mode[0]*10 + mode[1]
+    assert mode_parallel.map_modes(func, modes, n_threads=3) == {mode: func(mode) for mode in modes}
@@ -0,0 +1,48 @@
+import pickle
+
+from common_utils import model_state
+
+from helpers import assert_waveforms_equal
+
+
+def _outputs(model_1d, model_2d):
+    return [model_1d.generate_surrogate(q=8.0),
+            model_1d.generate_surrogate(q=30.0, M_tot=60, dist_mpc=100, orb_phase=0.3,
+                                        inclination=0.7, mode_sum=True),
+            model_2d.generate_surrogate(q=8.0, spin1=0.3),
+            model_2d.generate_surrogate(q=8.0, spin1=-0.3)]
+
+
+def _check_identical(before, after):
+    for a, b in zip(after, before):
+        assert_waveforms_equal(a, b)
+
+
+def test_out_of_band_round_trip(model_1d, model_2d):
+    model_2d.load_spin_branch('negative_spin')
+    model_2d.load_spin_branch('positive_spin')
+    before = _outputs(model_1d, model_2d)
+    for model in (model_1d, model_2d):
+        stream, buffers = model_state.dumps(model.get_state())
+        state = model_state.loads(stream, [bytes(buffer.raw()) for buffer in buffers])
+        model_state.install(state)
+    _check_identical(before, _outputs(model_1d, model_2d))
+
+
+def test_mapped_state_round_trip(model_1d, model_2d, tmp_path):
+    model_2d.load_spin_branch('negative_spin')
+    model_2d.load_spin_branch('positive_spin')
+    before = _outputs(model_1d, model_2d)
+    for model in (model_1d, model_2d):
+        path = str(tmp_path/model.__name__)
+        model.get_state().save(path)
+        state = model_state.load_state(path)
+        # a mapped state is pickled as its path
+        assert len(pickle.dumps(state)) < 1000
+        # unpickling does not install the state
+        installed = model_state._installed.get(model.__name__)
+        assert pickle.loads(pickle.dumps(state)).path == path
+        assert pickle.loads(pickle.dumps(model.get_state())).model_name == model.__name__
+        assert model_state._installed.get(model.__name__) is installed
+        model_state.install(state)
+    _check_identical(before, _outputs(model_1d, model_2d))
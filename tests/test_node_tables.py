@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+import pytest
+
+from common_utils import node_tables
+from common_utils.locking import FileLock
+
+
+def _table(model_1d):
+    return node_tables.build_node_table(model_1d.fit_data_dict_1, model_1d.fit_data_dict_2,
+                                        [(2,2), (3,3)], np.log10(2.5), np.log10(10000), tol=1e-6,
+                                        n_start=65, model_hash='abc')
+
+
+def test_save_node_table_round_trip(model_1d, tmp_path):
+    table = _table(model_1d)
+    fname = str(tmp_path/'table.npz')
+    node_tables.save_node_table(fname, table)
+    assert sorted(os.listdir(str(tmp_path))) == ['table.npz', 'table.npz.lock']
+    loaded = node_tables.load_node_table(fname)
+    np.testing.assert_array_equal(loaded['values'], table['values'])
+    assert loaded['slices'] == table['slices']
+    assert loaded['model_hash'] == 'abc'
+
+
+def test_save_node_table_waits_for_the_lock(model_1d, tmp_path):
+    table = _table(model_1d)
+    fname = str(tmp_path/'table.npz')
+    node_tables.save_node_table(fname, table)
+    before = open(fname, 'rb').read()
+    with FileLock(fname + '.lock'):
+        with pytest.raises(TimeoutError):
+            node_tables.save_node_table(fname, dict(table, model_hash='other'), lock_timeout=0.2)
+    assert open(fname, 'rb').read() == before
@@ -0,0 +1,79 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from common_utils import server
+
+
+def _serve(tmp_path, client, model='BHPTNRSur1dq1e4'):
+    """ runs client(unix_socket) in a thread while a WaveformServer listens on a Unix socket """
+    unix_socket = os.path.join(str(tmp_path), 'server.sock')
+
+    async def run():
+        waveform_server = server.WaveformServer([model], max_workers=2)
+        await waveform_server.start(unix_socket=unix_socket)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, client, unix_socket)
+        finally:
+            await waveform_server.close()
+
+    return asyncio.run(run())
+
+
+def _raw_request(unix_socket, data):
+    """ sends raw bytes and returns the status code of the response """
+    import socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(30)
+        sock.connect(unix_socket)
+        sock.sendall(data)
+        response = sock.recv(65536)
+    return int(response.split()[1])
+
+
+def test_server_waveform_matches_generate_surrogate(model_1d, tmp_path):
+    t, h = _serve(tmp_path, lambda unix_socket: server.request_waveform(
+                        'BHPTNRSur1dq1e4', unix_socket=unix_socket, q=8.0, modes=[(2,2),(3,3)]))
+    t_ref, h_ref = model_1d.generate_surrogate(q=8.0, modes=[(2,2),(3,3)])
+    np.testing.assert_array_equal(t, t_ref)
+    for mode in h_ref.keys():
+        np.testing.assert_array_equal(h[mode], h_ref[mode])
+
+
+@pytest.mark.parametrize('data', [b'GARBAGE\r\n\r\n',
+                                  b'POST /BHPTNRSur1dq1e4 HTTP/1.1\r\nno colon\r\n\r\n',
+                                  b'POST /BHPTNRSur1dq1e4 HTTP/1.1\r\nContent-Length: x\r\n\r\n'])
+def test_server_malformed_request_is_rejected(model_1d, tmp_path, data):
+    assert _serve(tmp_path, lambda unix_socket: _raw_request(unix_socket, data)) == 400
+
+
+@pytest.mark.parametrize('kwargs', [dict(q=8.0, unknown=1), dict(), dict(q='x')])
+def test_server_invalid_arguments(model_1d, tmp_path, kwargs):
+    def client(unix_socket):
+        with pytest.raises(ValueError) as err:
+            server.request_waveform('BHPTNRSur1dq1e4', unix_socket=unix_socket, **kwargs)
+        return str(err.value)
+    message = _serve(tmp_path, client)
+    # argument binding errors are invalid requests, errors of the evaluation are not
+    expected = '(500)' if kwargs.get('q') == 'x' else '(400)'
+    assert expected in message
+
+
+def test_server_rejects_uncertainty(model_2d, tmp_path):
+    def client(unix_socket):
+        with pytest.raises(ValueError) as err:
+            server.request_waveform('BHPTNRSur2dq1e3', unix_socket=unix_socket, q=8.0,
+                                    uncertainty=True)
+        return str(err.value)
+    assert '(400)' in _serve(tmp_path, client, 'BHPTNRSur2dq1e3')
+
+
+def test_server_rejects_derivatives(model_1d, tmp_path):
+    def client(unix_socket):
+        with pytest.raises(ValueError) as err:
+            server.request_waveform('BHPTNRSur1dq1e4', unix_socket=unix_socket, q=8.0,
+                                    derivatives=True)
+        return str(err.value)
+    assert '(400)' in _serve(tmp_path, client)
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from common_utils import sparse_output
+
+_options = [dict(),
+            dict(M_tot=60, dist_mpc=100, orb_phase=0.3, inclination=0.7, mode_sum=True)]
+
+
+def _check_sparse_samples(generate, options):
+    t, h = generate(**options)
+    sparse = generate(sparse_step=7, **options)
+    indices = sparse_output.sparse_indices(len(t), 7)
+    np.testing.assert_allclose(sparse.t, t[indices], rtol=0, atol=1e-12*np.max(np.abs(t)))
+    t_dense, h_dense = sparse.dense(sparse.t)
+    if isinstance(h, dict):
+        for mode in h.keys():
+            np.testing.assert_allclose(h_dense[mode], h[mode][indices], rtol=0,
+                                       atol=1e-10*np.max(np.abs(h[mode])))
+    else:
+        np.testing.assert_allclose(h_dense, h[indices], rtol=0, atol=1e-10*np.max(np.abs(h)))
+
+
+@pytest.mark.parametrize('options', _options)
+def test_sparse_output_at_sparse_samples_1d(model_1d, options):
+    _check_sparse_samples(lambda **kwargs: model_1d.generate_surrogate(q=8.0, **kwargs), options)
+
+
+@pytest.mark.parametrize('options', _options)
+def test_sparse_output_at_sparse_samples_2d(model_2d, options):
+    _check_sparse_samples(lambda **kwargs: model_2d.generate_surrogate(q=8.0, spin1=0.3, **kwargs),
+                          options)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from common_utils import sparse_output
+from helpers import assert_waveforms_equal
+
+_options = [dict(),
+            dict(calibrated=False),
+            dict(n_threads=2),
+            dict(M_tot=60, dist_mpc=100, orb_phase=0.3, inclination=0.7, mode_sum=True)]
+
+
+def _f_lows(generate, options):
+    """ starting frequencies through the inspiral, in the units of generate() """
+    t, h = generate(neg_modes=False, **{k: v for k, v in options.items()
+                                        if k in ('M_tot', 'dist_mpc', 'calibrated')})
+    freq = np.abs(np.gradient(np.unwrap(np.angle(h[(2,2)])), t))/(2*np.pi)
+    return np.quantile(freq[:len(freq)//2], [0.1, 0.35, 0.6, 0.85])
+
+
+def _check_f_low(generate, options):
+    full = generate(**options)
+    for f_low in _f_lows(generate, options):
+        t, h = generate(f_low=f_low, **options)
+        index = len(full[0]) - len(t)
+        assert index > 0
+        if isinstance(h, dict):
+            sliced = (full[0][index:], {mode: full[1][mode][index:] for mode in h.keys()})
+        else:
+            sliced = (full[0][index:], full[1][index:])
+        assert_waveforms_equal((t, h), sliced, rtol=1e-10)
+
+
+@pytest.mark.parametrize('options', _options)
+def test_f_low_matches_sliced_full_waveform_1d(model_1d, options):
+    _check_f_low(lambda **kwargs: model_1d.generate_surrogate(q=8.0, **kwargs), options)
+
+
+@pytest.mark.parametrize('options', _options)
+def test_f_low_matches_sliced_full_waveform_2d(model_2d, options):
+    _check_f_low(lambda **kwargs: model_2d.generate_surrogate(q=8.0, spin1=0.3, **kwargs), options)
+
+
+def test_f_low_sparse_output_1d(model_1d):
+    t, h = model_1d.generate_surrogate(q=8.0)
+    for f_low in _f_lows(lambda **kwargs: model_1d.generate_surrogate(q=8.0, **kwargs), {}):
+        sparse = model_1d.generate_surrogate(q=8.0, f_low=f_low, sparse_step=7)
+        index = len(t) - len(sparse.t_dense)
+        indices = index + sparse_output.sparse_indices(len(sparse.t_dense), 7)
+        t_dense, h_dense = sparse.dense(sparse.t)
+        for mode in h_dense.keys():
+            np.testing.assert_allclose(h_dense[mode], h[mode][indices], rtol=0,
+                                       atol=1e-10*np.max(np.abs(h[mode])))
@@ -0,0 +1,78 @@
+import os
+import types
+
+import numpy as np
+
+from common_utils.waveform_cache import WaveformCache
+
+
+def _model():
+    """ module standing for BHPTNRSur1dq1e4 without loading its h5 file """
+    model = types.ModuleType('BHPTNRSur1dq1e4')
+    model.generate_surrogate = lambda q, modes=None: None
+    model.basis_compression_settings = None
+    model.node_table = None
+    model.local_emulator_settings = None
+    return model
+
+
+def test_key_changes_with_basis_compression(tmp_path):
+    cache = WaveformCache(str(tmp_path))
+    model = _model()
+    exact = cache.key(model, {'q': 8})
+
+    model.basis_compression_settings = (1e-6, False, True)
+    compressed = cache.key(model, {'q': 8})
+    assert compressed != exact
+
+    # keep_dense does not change the waveforms
+    model.basis_compression_settings = (1e-6, False, False)
+    assert cache.key(model, {'q': 8}) == compressed
+
+    model.basis_compression_settings = (1e-4, False, True)
+    assert cache.key(model, {'q': 8}) not in (exact, compressed)
+
+    model.basis_compression_settings = None
+    assert cache.key(model, {'q': 8}) == exact
+
+
+def test_key_changes_with_node_table(tmp_path):
+    cache = WaveformCache(str(tmp_path))
+    model = _model()
+    exact = cache.key(model, {'q': 8})
+    model.node_table = {'tol': 1e-10}
+    assert cache.key(model, {'q': 8}) != exact
+
+
+def test_local_emulator_is_not_cached(tmp_path):
+    cache = WaveformCache(str(tmp_path))
+    model = _model()
+    calls = []
+    model.generate_surrogate = lambda q, modes=None: calls.append(q) or ([0.0, 1.0], [1.0, 2.0])
+    model.local_emulator_settings = (0.01, 32, 100, 1e-4)
+    cache.generate(model, q=8)
+    cache.generate(model, q=8)
+    assert len(calls) == 2
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_tracked_size_and_eviction(tmp_path):
+    entry = np.arange(1000, dtype=float)
+    cache = WaveformCache(str(tmp_path), max_bytes=10**6)
+    cache.put('a', entry, entry)
+    entry_size = cache.size()
+    cache.max_bytes = int(3.5*entry_size)
+    for key in 'bcd':
+        cache.put(key, entry, entry)
+    with open(os.path.join(str(tmp_path), '.size')) as f:
+        tracked = int(f.read())
+    assert tracked == cache.size() == 3*entry_size
+    # the least recently used entry is evicted
+    assert cache.get('a') is None
+    assert cache.get('d') is not None
+
+    cache.clear()
+    assert cache.size() == 0
+    cache.put('e', entry, entry)
+    with open(os.path.join(str(tmp_path), '.size')) as f:
+        assert int(f.read()) == entry_size